@@ -0,0 +1,117 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+from app.aggregations import distance_factor
+from app.database import cached_activities
+
+# Fields of cached_activities the frontend reads; the rest never leaves Mongo.
+# _id is only kept to build page cursors.
+ACTIVITY_PROJECTION = {
+    "strava_id": 1,
+    "name": 1,
+    "distance": 1,
+    "moving_time": 1,
+    "elapsed_time": 1,
+    "type": 1,
+    "start_date": 1,
+}
+
+# Newest first; _id breaks ties between activities starting at the same moment.
+# Matches the athlete_start_date_id and athlete_type_start_date_id indexes.
+ACTIVITY_SORT = [("start_date", -1), ("_id", -1)]
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Documents per round trip when streaming a whole history
+STREAM_BATCH_SIZE = 500
+
+
+def activity_view(doc: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    """Shape a projected activity for the API, with distance in the requested unit."""
+    return {
+        "id": doc["strava_id"],
+        "name": doc.get("name"),
+        "distance": doc["distance"] * factor,
+        "moving_time": doc["moving_time"],
+        "elapsed_time": doc["elapsed_time"],
+        "type": doc["type"],
+        "start_date": doc["start_date"],
+    }
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past this activity."""
+    raw = orjson.dumps([doc["start_date"].isoformat(), str(doc["_id"])])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_date, object_id = orjson.loads(raw)
+        return datetime.fromisoformat(start_date), ObjectId(object_id)
+    except (binascii.Error, orjson.JSONDecodeError, InvalidId, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    # start_date is stored as naive UTC
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def activity_query(
+    athlete_id: int,
+    before: Optional[datetime] = None,
+    after: Optional[datetime] = None,
+    activity_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filter for an athlete's activities in [after, before), optionally past a page cursor."""
+    query: Dict[str, Any] = {"athlete_id": athlete_id}
+    if activity_type:
+        query["type"] = activity_type
+
+    date_filter = {}
+    if before is not None:
+        date_filter["$lt"] = _naive_utc(before)
+    if after is not None:
+        date_filter["$gte"] = _naive_utc(after)
+    if date_filter:
+        query["start_date"] = date_filter
+
+    if cursor:
+        start_date, object_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"start_date": {"$lt": start_date}},
+            {"start_date": start_date, "_id": {"$lt": object_id}},
+        ]
+    return query
+
+
+async def fetch_activity_page(query: Dict[str, Any], unit: str, limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of activities and the cursor of the next page (None on the last page).
+
+    The page is a range scan of the (athlete, start_date, _id) index starting
+    at the cursor, so deep pages cost the same as the first one.
+    """
+    docs = await cached_activities.find(query, ACTIVITY_PROJECTION).sort(ACTIVITY_SORT).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    factor = distance_factor(unit)
+    return [activity_view(doc, factor) for doc in docs[:limit]], next_cursor
+
+
+async def iter_activities(query: Dict[str, Any], unit: str) -> AsyncIterator[Dict[str, Any]]:
+    """Yield matching activities, newest first, straight from the cursor."""
+    factor = distance_factor(unit)
+    cursor = cached_activities.find(query, ACTIVITY_PROJECTION, batch_size=STREAM_BATCH_SIZE).sort(ACTIVITY_SORT)
+    async for doc in cursor:
+        yield activity_view(doc, factor)
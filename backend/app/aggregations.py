@@ -0,0 +1,211 @@
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+MILES_PER_KM = 0.621371
+
+
+def distance_factor(unit: str) -> float:
+    """Factor that converts stored meters into the requested unit."""
+    factor = 1 / 1000
+    if unit == "mi":
+        factor *= MILES_PER_KM
+    return factor
+
+
+def whole_weeks(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Widen [start, end) to the ISO weeks it overlaps; weekly totals only ever cover whole weeks."""
+    def monday(value: datetime) -> datetime:
+        day = value.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        return day - timedelta(days=day.weekday())
+    return (
+        None if start is None else monday(start),
+        None if end is None else monday(end - timedelta(microseconds=1)) + timedelta(days=7),
+    )
+
+
+def date_range_match(athlete_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+    """$match stage for one athlete's activities in [start, end)."""
+    match = {"athlete_id": athlete_id}
+    date_filter = {}
+    if start is not None:
+        date_filter["$gte"] = start
+    if end is not None:
+        date_filter["$lt"] = end
+    if date_filter:
+        match["start_date"] = date_filter
+    return {"$match": match}
+
+
+def weekly_activity_pipeline(athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Aggregate activities into ISO weeks with per-type totals.
+
+    Weeks overlapping [start, end) are returned whole, like the rollups.
+    Produces one document per week shaped like
+    {"week": "2024-W5", "weekNumber": 5, "year": 2024,
+     "activities": {"Run": {"distance": ..., "moving_time": ..., "count": ...}}}
+    """
+    return [
+        date_range_match(athlete_id, *whole_weeks(start, end)),
+        {"$project": {
+            "_id": 0,
+            "year": {"$isoWeekYear": "$start_date"},
+            "weekNumber": {"$isoWeek": "$start_date"},
+            "type": 1,
+            "distance": {"$multiply": ["$distance", distance_factor(unit)]},
+            "moving_time": 1,
+        }},
+        {"$group": {
+            "_id": {"year": "$year", "weekNumber": "$weekNumber", "type": "$type"},
+            "distance": {"$sum": "$distance"},
+            "moving_time": {"$sum": "$moving_time"},
+            "count": {"$sum": 1},
+        }},
+        {"$group": {
+            "_id": {"year": "$_id.year", "weekNumber": "$_id.weekNumber"},
+            "activities": {"$push": {
+                "k": "$_id.type",
+                "v": {"distance": "$distance", "moving_time": "$moving_time", "count": "$count"},
+            }},
+        }},
+        {"$project": {
+            "_id": 0,
+            "week": {"$concat": [{"$toString": "$_id.year"}, "-W", {"$toString": "$_id.weekNumber"}]},
+            "weekNumber": "$_id.weekNumber",
+            "year": "$_id.year",
+            "activities": {"$arrayToObject": "$activities"},
+        }},
+        {"$sort": {"year": 1, "weekNumber": 1}},
+    ]
+
+
+KM_PER_MILE = 1.60934
+
+
+def goal_progress_pipeline(athlete_id: int, year: int, unit: str, use_rollups: bool) -> List[Dict[str, Any]]:
+    """
+    Aggregate each of the athlete's goals with their totals for its ISO week and activity type.
+
+    Runs on the goals collection. Totals are joined from weekly_rollups, or,
+    before the rollups are built, summed from cached_activities for the week.
+    Distance goals are reported in `unit`, time goals in the goal's own unit
+    (hours or minutes), and session goals as a count.
+    """
+    if use_rollups:
+        totals_lookup = {"$lookup": {
+            "from": "weekly_rollups",
+            "let": {"week": "$week", "type": "$type"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$athlete_id", athlete_id]},
+                    {"$eq": ["$year", year]},
+                    {"$eq": ["$weekNumber", "$$week"]},
+                    {"$eq": ["$type", "$$type"]},
+                ]}}},
+                {"$project": {"_id": 0, "distance": 1, "moving_time": 1, "count": 1}},
+            ],
+            "as": "totals",
+        }}
+    else:
+        totals_lookup = {"$lookup": {
+            "from": "cached_activities",
+            "let": {
+                "type": "$type",
+                "week_start": {"$dateFromParts": {"isoWeekYear": year, "isoWeek": "$week", "isoDayOfWeek": 1}},
+            },
+            "pipeline": [
+                {"$match": {"athlete_id": athlete_id}},
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$type", "$$type"]},
+                    {"$gte": ["$start_date", "$$week_start"]},
+                    {"$lt": ["$start_date", {"$add": ["$$week_start", 7 * 24 * 3600 * 1000]}]},
+                ]}}},
+                {"$group": {
+                    "_id": None,
+                    "distance": {"$sum": "$distance"},
+                    "moving_time": {"$sum": "$moving_time"},
+                    "count": {"$sum": 1},
+                }},
+            ],
+            "as": "totals",
+        }}
+
+    # Targets are stored in the unit they were set in; bring distance targets to `unit`
+    km_target = {"$cond": [{"$eq": ["$unit", "mi"]}, {"$multiply": ["$target", KM_PER_MILE]}, "$target"]}
+    km_factor = MILES_PER_KM if unit == "mi" else 1
+
+    return [
+        {"$match": {"user_id": athlete_id}},
+        {"$sort": {"week": 1, "type": 1}},
+        totals_lookup,
+        {"$set": {"totals": {"$ifNull": [
+            {"$first": "$totals"},
+            {"distance": 0, "moving_time": 0, "count": 0},
+        ]}}},
+        {"$set": {
+            "unit": {"$cond": [{"$eq": ["$goal_type", "distance"]}, unit, "$unit"]},
+            "target": {"$cond": [
+                {"$eq": ["$goal_type", "distance"]},
+                {"$round": [{"$multiply": [km_target, km_factor]}, 2]},
+                "$target",
+            ]},
+            "actual": {"$switch": {
+                "branches": [
+                    {"case": {"$eq": ["$goal_type", "distance"]},
+                     "then": {"$multiply": ["$totals.distance", distance_factor(unit)]}},
+                    {"case": {"$and": [{"$eq": ["$goal_type", "time"]}, {"$eq": ["$unit", "hours"]}]},
+                     "then": {"$divide": ["$totals.moving_time", 3600]}},
+                    {"case": {"$eq": ["$goal_type", "time"]},
+                     "then": {"$divide": ["$totals.moving_time", 60]}},
+                ],
+                "default": "$totals.count",
+            }},
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": {"$toString": "$_id"},
+            "week": 1,
+            "year": {"$literal": year},
+            "type": 1,
+            "goal_type": 1,
+            "target": 1,
+            "unit": 1,
+            "actual": {"$round": ["$actual", 2]},
+            "sessions": "$totals.count",
+            "progress": {"$cond": [
+                {"$gt": ["$target", 0]},
+                {"$round": [{"$multiply": [{"$divide": ["$actual", "$target"]}, 100]}, 1]},
+                None,
+            ]},
+        }},
+    ]
+
+
+def goal_progress_view(goal: Dict[str, Any], totals: Optional[Dict[str, Any]], year: int, unit: str) -> Dict[str, Any]:
+    """
+    One goal with its week's totals, computed like goal_progress_pipeline's
+    projection, for backends that join the totals themselves.
+    """
+    totals = totals or {"distance": 0, "moving_time": 0, "count": 0}
+    target, goal_unit = goal["target"], goal["unit"]
+    if goal["goal_type"] == "distance":
+        km_target = target * KM_PER_MILE if goal_unit == "mi" else target
+        target = round(km_target * (MILES_PER_KM if unit == "mi" else 1), 2)
+        goal_unit = unit
+        actual = totals["distance"] * distance_factor(unit)
+    elif goal["goal_type"] == "time":
+        actual = totals["moving_time"] / (3600 if goal_unit == "hours" else 60)
+    else:
+        actual = totals["count"]
+    return {
+        "id": goal["id"],
+        "week": goal["week"],
+        "year": year,
+        "type": goal["type"],
+        "goal_type": goal["goal_type"],
+        "target": target,
+        "unit": goal_unit,
+        "actual": round(actual, 2),
+        "sessions": totals["count"],
+        "progress": round(actual / target * 100, 1) if target > 0 else None,
+    }
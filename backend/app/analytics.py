@@ -0,0 +1,270 @@
+import argparse
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from app.aggregations import distance_factor
+from app.database import cached_activities, sync_state
+from app.metrics import cache_event
+
+# Time constants (days) of the fitness (CTL) and fatigue (ATL) curves
+CTL_DAYS = 42
+ATL_DAYS = 7
+
+# Rolling volume windows in days
+VOLUME_WINDOWS = (7, 28)
+
+# Days per vectorized step of the exponentially weighted averages; keeps the
+# decay factors well inside float64 range for any history length
+EWMA_BLOCK = 256
+
+# Athletes whose series are kept per process
+ANALYTICS_CACHE_SIZE = 256
+
+
+def activity_load(moving_time: np.ndarray) -> np.ndarray:
+    """
+    Training load per activity.
+
+    Heart rate and power aren't synced, so load is duration based: one point
+    per minute of moving time.
+    """
+    return moving_time / 60.0
+
+
+def ewma(values: np.ndarray, days: int) -> np.ndarray:
+    """
+    Exponentially weighted average y[t] = y[t-1] + (x[t] - y[t-1]) / days, seeded at 0.
+
+    Within a block y[s+j] = d^(j+1) * y[s-1] + a * d^j * sum(x[s+i] * d^-i)
+    (a = 1/days, d = 1 - a), which is one cumsum; only the carry between
+    blocks is sequential.
+    """
+    alpha = 1.0 / days
+    decay = 1.0 - alpha
+    powers = decay ** np.arange(EWMA_BLOCK)  # d^j
+    out = np.empty(len(values), dtype=np.float64)
+    carry = 0.0
+    for start in range(0, len(values), EWMA_BLOCK):
+        block = values[start:start + EWMA_BLOCK]
+        p = powers[:len(block)]
+        out[start:start + len(block)] = p * decay * carry + alpha * p * np.cumsum(block / p)
+        carry = out[start + len(block) - 1]
+    return out
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sum over the last `window` days, including the current one."""
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums
+
+
+class TrainingSeries:
+    """
+    One athlete's history as columnar arrays plus the derived daily series.
+
+    Per-activity columns (day offset, distance in meters, moving time,
+    type) are kept so filtered series can be recomputed without going back
+    to Mongo. Daily series run from the first activity to today.
+    """
+
+    def __init__(self, start_dates: np.ndarray, distances: np.ndarray, moving_times: np.ndarray, types: np.ndarray, today: Optional[date] = None):
+        today = np.datetime64(today or datetime.utcnow().date(), "D")
+        days = start_dates.astype("datetime64[D]")
+        self.first_day = days.min() if len(days) else today
+        # Runs to today, or further if a start date is ahead of UTC today
+        last_day = max(days.max(), today) if len(days) else today
+        self.days = int((last_day - self.first_day).astype(int)) + 1
+        self.day_index = (days - self.first_day).astype(np.int64)
+        self.distances = distances
+        self.moving_times = moving_times
+        self.types = types
+
+        self.load = self._daily(activity_load(moving_times))
+        self.ctl = ewma(self.load, CTL_DAYS)
+        self.atl = ewma(self.load, ATL_DAYS)
+        # Form is yesterday's fitness minus yesterday's fatigue
+        self.tsb = np.concatenate(([0.0], (self.ctl - self.atl)[:-1]))
+
+        week_load = rolling_sum(self.load, 7)
+        mean = week_load / 7
+        std = np.sqrt(np.maximum(rolling_sum(self.load ** 2, 7) / 7 - mean ** 2, 0.0))
+        # Monotony is undefined (null) for a week without any variation
+        self.week_load = week_load
+        self.monotony = np.divide(mean, std, out=np.full(self.days, np.nan), where=std > 1e-9)
+        self.strain = week_load * self.monotony
+
+    def _daily(self, weights: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        index = self.day_index if mask is None else self.day_index[mask]
+        weights = weights if mask is None else weights[mask]
+        return np.bincount(index, weights=weights, minlength=self.days).astype(np.float64)
+
+    def dates(self, start: int, end: int) -> List[str]:
+        return (self.first_day + np.arange(start, end)).astype(str).tolist()
+
+    def window(self, from_date: Optional[date], to_date: Optional[date]) -> slice:
+        """Slice of the daily series covering [from_date, to_date]."""
+        start = 0 if from_date is None else int((np.datetime64(from_date, "D") - self.first_day).astype(int))
+        end = self.days if to_date is None else int((np.datetime64(to_date, "D") - self.first_day).astype(int)) + 1
+        return slice(min(max(start, 0), self.days), min(max(end, 0), self.days))
+
+    def load_series(self, from_date: Optional[date] = None, to_date: Optional[date] = None) -> Dict[str, Any]:
+        s = self.window(from_date, to_date)
+        return {
+            "dates": self.dates(s.start, s.stop),
+            "load": self.load[s].round(1),
+            "ctl": self.ctl[s].round(1),
+            "atl": self.atl[s].round(1),
+            "tsb": self.tsb[s].round(1),
+        }
+
+    def volume_series(self, unit: str, activity_type: Optional[str] = None, from_date: Optional[date] = None, to_date: Optional[date] = None) -> Dict[str, Any]:
+        mask = None if activity_type is None else self.types == activity_type
+        distance = self._daily(self.distances, mask) * distance_factor(unit)
+        hours = self._daily(self.moving_times, mask) / 3600
+        s = self.window(from_date, to_date)
+        series = {
+            "dates": self.dates(s.start, s.stop),
+            "distance": distance[s].round(2),
+            "hours": hours[s].round(2),
+        }
+        for days in VOLUME_WINDOWS:
+            series[f"distance_{days}d"] = rolling_sum(distance, days)[s].round(2)
+            series[f"hours_{days}d"] = rolling_sum(hours, days)[s].round(2)
+        return series
+
+    def monotony_series(self, from_date: Optional[date] = None, to_date: Optional[date] = None) -> Dict[str, Any]:
+        s = self.window(from_date, to_date)
+        return {
+            "dates": self.dates(s.start, s.stop),
+            "week_load": self.week_load[s].round(1),
+            "monotony": self.monotony[s].round(2),
+            "strain": self.strain[s].round(1),
+        }
+
+    def summary(self, unit: str) -> Dict[str, Any]:
+        """Latest value of every series."""
+        distance = self._daily(self.distances) * distance_factor(unit)
+        summary = {
+            "date": self.dates(self.days - 1, self.days)[0],
+            "activities": len(self.day_index),
+            "ctl": round(float(self.ctl[-1]), 1),
+            "atl": round(float(self.atl[-1]), 1),
+            "tsb": round(float(self.tsb[-1]), 1),
+            "monotony": None if np.isnan(self.monotony[-1]) else round(float(self.monotony[-1]), 2),
+            "strain": None if np.isnan(self.strain[-1]) else round(float(self.strain[-1]), 1),
+        }
+        for days in VOLUME_WINDOWS:
+            summary[f"distance_{days}d"] = round(float(distance[-days:].sum()), 2)
+        return summary
+
+
+async def load_training_series(athlete_id: int) -> TrainingSeries:
+    """Read an athlete's activities into columnar arrays and compute the series."""
+    docs = await cached_activities.find(
+        {"athlete_id": athlete_id},
+        {"_id": 0, "start_date": 1, "distance": 1, "moving_time": 1, "type": 1}
+    ).to_list(length=None)
+    return TrainingSeries(
+        np.array([doc["start_date"] for doc in docs], dtype="datetime64[s]"),
+        np.fromiter((doc["distance"] for doc in docs), dtype=np.float64, count=len(docs)),
+        np.fromiter((doc["moving_time"] for doc in docs), dtype=np.float64, count=len(docs)),
+        np.array([doc["type"] for doc in docs], dtype=object),
+    )
+
+
+class AnalyticsCache:
+    """
+    Per-process LRU of computed series, keyed by athlete.
+
+    Entries carry the athlete's activities_version from sync_state, which
+    every sync that changes activities bumps, so a sync in any process
+    invalidates them.
+    """
+
+    def __init__(self, max_size: int = ANALYTICS_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    async def get(self, athlete_id: int) -> TrainingSeries:
+        state = await sync_state.find_one({"athlete_id": athlete_id}, {"activities_version": 1})
+        version = (state or {}).get("activities_version", 0)
+        today = datetime.utcnow().date()
+
+        entry = self._entries.get(athlete_id)
+        if entry is not None and entry[0] == (version, today):
+            self._entries.move_to_end(athlete_id)
+            cache_event("analytics", "hit")
+            return entry[1]
+
+        cache_event("analytics", "miss")
+        series = await load_training_series(athlete_id)
+        self._entries[athlete_id] = ((version, today), series)
+        self._entries.move_to_end(athlete_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return series
+
+    def invalidate(self, athlete_id: Optional[int] = None):
+        if athlete_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(athlete_id, None)
+
+
+analytics_cache = AnalyticsCache()
+
+
+def synthetic_history(years: int, per_day: float = 1.2, seed: int = 0) -> TrainingSeries:
+    """A random multi-year history for benchmarking."""
+    rng = np.random.default_rng(seed)
+    count = int(years * 365 * per_day)
+    today = np.datetime64(datetime.utcnow().date(), "s")
+    start_dates = today - rng.integers(0, years * 365 * 86400, count).astype("timedelta64[s]")
+    types = rng.choice(np.array(["Run", "Ride", "Swim", "Walk"], dtype=object), count, p=[0.5, 0.3, 0.1, 0.1])
+    return TrainingSeries(
+        start_dates,
+        rng.gamma(4.0, 2500.0, count),
+        rng.gamma(3.0, 1200.0, count),
+        types,
+    )
+
+
+def benchmark(years: int, repeat: int) -> Dict[str, Any]:
+    """Time the series computation and per-endpoint slicing on a synthetic history."""
+    def best_ms(fn) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return round(min(timings) * 1000, 3)
+
+    history = synthetic_history(years)
+    start_dates = history.first_day + history.day_index.astype("timedelta64[D]")
+    return {
+        "years": years,
+        "activities": len(history.day_index),
+        "days": history.days,
+        "compute_ms": best_ms(lambda: TrainingSeries(start_dates, history.distances, history.moving_times, history.types)),
+        "load_ms": best_ms(history.load_series),
+        "volume_ms": best_ms(lambda: history.volume_series("km")),
+        "volume_by_type_ms": best_ms(lambda: history.volume_series("km", "Run")),
+        "monotony_ms": best_ms(history.monotony_series),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the training-load analytics on synthetic histories.")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(json.dumps([benchmark(years, args.repeat) for years in args.years], indent=2))
+
+
+if __name__ == "__main__":
+    main()
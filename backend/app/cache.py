@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any
+from app.metrics import cache_event
+from app.storage import repository
+from app.ratelimit import INTERACTIVE, BACKGROUND
+from app.scheduler import scheduler
+from app.webhooks import WEBHOOKS_ENABLED
+
+# Cache configuration: activities are revalidated after 1 hour by default. With
+# webhooks pushing changes, polling is only a daily reconciliation pass.
+CACHE_DURATION_HOURS = float(os.getenv("CACHE_DURATION_HOURS", "24" if WEBHOOKS_ENABLED else "1"))
+
+# How long a first-time load waits for the initial sync before returning "pending"
+FIRST_SYNC_TIMEOUT_SECONDS = 30
+
+
+async def ensure_fresh(account: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stale-while-revalidate check for an athlete's cached activities.
+
+    Fresh and stale caches are served right away; a stale cache queues a
+    background sync, which the scheduler runs at most once per athlete. Only
+    an athlete who has never been synced waits for the sync.
+
+    The athlete's data_version comes back with the freshness, read from the
+    same sync state, for conditional responses.
+    """
+    freshness = await _freshness(account)
+    cache_event("activities", freshness["status"])
+    return freshness
+
+
+async def _freshness(account: Dict[str, Any]) -> Dict[str, Any]:
+    state = await repository.sync_status(account["athlete_id"])
+    now = datetime.utcnow()
+
+    if not state or not state.get("last_synced_at"):
+        job = await scheduler.enqueue(account["athlete_id"], INTERACTIVE)
+        job = await scheduler.wait(job.id, FIRST_SYNC_TIMEOUT_SECONDS)
+        version = await repository.data_version(account["athlete_id"])
+        if not job or job["status"] != "done" or not job["result"]:
+            return {"status": "pending", "last_synced_at": None, "age": None, "data_version": version}
+        return {"status": "miss", "last_synced_at": job["result"]["synced_at"], "age": 0, "data_version": version}
+
+    last_synced_at = state["last_synced_at"]
+    age = (now - last_synced_at).total_seconds()
+    version = state.get("data_version", 0)
+    if now - last_synced_at > timedelta(hours=CACHE_DURATION_HOURS):
+        await scheduler.enqueue(account["athlete_id"], BACKGROUND)
+        return {"status": "stale", "last_synced_at": last_synced_at, "age": age, "data_version": version}
+    return {"status": "fresh", "last_synced_at": last_synced_at, "age": age, "data_version": version}
+
+
+def freshness_headers(freshness: Dict[str, Any]) -> Dict[str, str]:
+    """Response headers describing how fresh the served data is."""
+    headers = {"X-Cache-Status": freshness["status"]}
+    if freshness["age"] is not None:
+        headers["X-Cache-Age"] = str(int(freshness["age"]))
+    if freshness["last_synced_at"] is not None:
+        headers["X-Last-Synced"] = freshness["last_synced_at"].isoformat() + "Z"
+    return headers
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from pymongo import UpdateOne
+from app.database import cached_activities
+from app.metrics import percentile_ms
+from app.ratelimit import current_priority, BACKGROUND
+from app.records import detail_efforts, efforts_candidate, merge_records
+from app.storage import repository
+from app.strava import strava, StravaRateLimited, StravaUnavailable
+from app.tokens import token_manager
+
+# Set to 0 to skip fetching per-activity details after syncs
+ENRICHMENT_ENABLED = os.getenv("ENRICHMENT_ENABLED", "1") == "1"
+
+# Detail requests in flight at once; the rate-limit budget paces them further
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "4"))
+
+# Enriched activities written per bulk_write
+ENRICH_WRITE_BATCH = 50
+
+# Activities one enrichment job handles before requeueing itself, so a long
+# backfill doesn't hold the athlete's sync lease for hours
+ENRICH_JOB_LIMIT = 200
+
+MAX_ENRICH_ATTEMPTS = 3
+
+# Detailed-activity fields kept in `details`
+DETAIL_FIELDS = (
+    "description", "calories", "device_name", "gear_id", "kilojoules",
+    "average_heartrate", "max_heartrate", "average_cadence", "average_watts",
+    "suffer_score", "splits_metric", "splits_standard",
+)
+BEST_EFFORT_FIELDS = ("name", "distance", "elapsed_time", "moving_time", "start_date", "pr_rank")
+
+# Activities still waiting for details; a missing status means never tried
+PENDING_FILTER = {"enrichment.status": {"$in": [None, "retry"]}}
+
+
+def activity_details(activity: Dict[str, Any]) -> Dict[str, Any]:
+    """The parts of a detailed activity that the summary listing doesn't return."""
+    details = {field: activity.get(field) for field in DETAIL_FIELDS}
+    details["best_efforts"] = [
+        {field: effort.get(field) for field in BEST_EFFORT_FIELDS}
+        for effort in activity.get("best_efforts") or []
+    ]
+    return details
+
+
+def enrichment_update(athlete_id: int, strava_id: int, activity: Optional[Dict[str, Any]]) -> UpdateOne:
+    """Store fetched details, or record that Strava no longer has the activity."""
+    update = {"enrichment": {"status": "done" if activity else "gone", "enriched_at": datetime.utcnow()}}
+    if activity:
+        update["details"] = activity_details(activity)
+    return UpdateOne({"athlete_id": athlete_id, "strava_id": strava_id}, {"$set": update})
+
+
+def failure_update(athlete_id: int, strava_id: int, attempts: int, error: str) -> UpdateOne:
+    status = "failed" if attempts >= MAX_ENRICH_ATTEMPTS else "retry"
+    return UpdateOne(
+        {"athlete_id": athlete_id, "strava_id": strava_id},
+        {"$set": {"enrichment.status": status, "enrichment.attempts": attempts, "enrichment.error": error}}
+    )
+
+
+async def pending_count(athlete_id: int) -> int:
+    return await cached_activities.count_documents({"athlete_id": athlete_id, **PENDING_FILTER})
+
+
+async def enrich_activities(account: Dict[str, Any], limit: Optional[int] = ENRICH_JOB_LIMIT, concurrency: int = ENRICH_CONCURRENCY) -> Dict[str, Any]:
+    """
+    Fetch /activities/{id} for activities that only have summary data.
+
+    Newest activities go first. `concurrency` fetchers run at once, each
+    request admitted by the rate-limit budget, and results are written in
+    batches of ENRICH_WRITE_BATCH. Progress is kept on each activity
+    (enrichment.status), so an interrupted run resumes where it stopped. A
+    429 ends the run early with the work done so far saved. Best efforts
+    in the details are merged into the personal records at the end.
+    """
+    athlete_id = account["athlete_id"]
+    access_token = await token_manager.get_access_token(account)
+    pending_writes: List[UpdateOne] = []
+    record_candidates: List[Dict[str, Any]] = []
+    latencies: List[float] = []
+    stats = {"enriched": 0, "gone": 0, "failed": 0}
+    rate_limited: Optional[StravaRateLimited] = None
+    started = time.perf_counter()
+
+    async def flush():
+        if pending_writes:
+            batch = pending_writes[:]
+            pending_writes.clear()
+            await cached_activities.bulk_write(batch, ordered=False)
+
+    async def enrich(doc: Dict[str, Any]):
+        nonlocal rate_limited
+        attempts = (doc.get("enrichment") or {}).get("attempts", 0) + 1
+        request_started = time.perf_counter()
+        try:
+            resp = await strava.get(f"/activities/{doc['strava_id']}", access_token)
+        except StravaRateLimited as e:
+            rate_limited = e
+            return
+        except StravaUnavailable as e:
+            pending_writes.append(failure_update(athlete_id, doc["strava_id"], attempts, repr(e)))
+            stats["failed"] += 1
+            return
+        latencies.append(time.perf_counter() - request_started)
+
+        if resp.status_code == 404:
+            pending_writes.append(enrichment_update(athlete_id, doc["strava_id"], None))
+            stats["gone"] += 1
+        elif resp.status_code == 200:
+            activity = resp.json()
+            pending_writes.append(enrichment_update(athlete_id, doc["strava_id"], activity))
+            efforts = detail_efforts(activity.get("best_efforts"))
+            if efforts:
+                record_candidates.append(efforts_candidate(doc, efforts))
+            stats["enriched"] += 1
+        else:
+            pending_writes.append(failure_update(athlete_id, doc["strava_id"], attempts, f"HTTP {resp.status_code}"))
+            stats["failed"] += 1
+        if len(pending_writes) >= ENRICH_WRITE_BATCH:
+            await flush()
+
+    # A bounded queue between the cursor and `concurrency` fetchers keeps
+    # the fan-out (and memory) fixed however long the backlog is
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def produce():
+        cursor = cached_activities.find(
+            {"athlete_id": athlete_id, **PENDING_FILTER},
+            {"_id": 0, "strava_id": 1, "type": 1, "start_date": 1, "enrichment": 1}
+        ).sort("start_date", -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        try:
+            async for doc in cursor:
+                if rate_limited is not None:
+                    break
+                await queue.put(doc)
+        finally:
+            for _ in range(concurrency):
+                await queue.put(None)
+
+    async def fetcher():
+        while (doc := await queue.get()) is not None:
+            if rate_limited is None:
+                await enrich(doc)
+
+    tasks = [asyncio.create_task(produce())] + [asyncio.create_task(fetcher()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # If one task failed, the producer could otherwise block on a queue nobody reads
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await flush()
+        await merge_records(athlete_id, record_candidates)
+
+    if rate_limited is not None:
+        raise rate_limited
+
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    fetched = stats["enriched"] + stats["gone"]
+    return {
+        "athlete_id": athlete_id,
+        **stats,
+        "remaining": await pending_count(athlete_id),
+        "seconds": round(elapsed, 3),
+        "activities_per_second": round(fetched / elapsed, 2) if elapsed else None,
+        "p50_ms": percentile_ms(latencies, 0.50),
+        "p95_ms": percentile_ms(latencies, 0.95),
+        "concurrency": concurrency,
+    }
+
+
+async def run_backfill(athlete_id: int, concurrency: int, limit: Optional[int]) -> Dict[str, Any]:
+    account = await repository.get_account(athlete_id)
+    if account is None:
+        raise SystemExit(f"No Strava account connected for athlete {athlete_id}")
+    current_priority.set(BACKGROUND)
+    try:
+        return await enrich_activities(account, limit=limit, concurrency=concurrency)
+    finally:
+        await strava.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch detailed data for cached activities that only have summaries.")
+    parser.add_argument("--athlete", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=ENRICH_CONCURRENCY)
+    parser.add_argument("--limit", type=int, help="Stop after this many activities (default: all pending)")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_backfill(args.athlete, args.concurrency, args.limit)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
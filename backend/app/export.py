@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, AsyncIterator, List, Optional
+from app.activities import activity_query
+from app.aggregations import distance_factor
+from app.database import cached_activities
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are unavailable unless pyarrow is installed
+    pa = pq = None
+
+# Documents per cursor round trip, and rows per CSV chunk
+EXPORT_BATCH_SIZE = 2000
+
+# Rows per Parquet row group; each group is encoded and sent before the next is read
+PARQUET_ROW_GROUP_SIZE = 20000
+
+# Oldest first; the (athlete_id, start_date, _id) indexes are scanned backwards
+EXPORT_SORT = [("start_date", 1), ("_id", 1)]
+
+# (column, field in cached_activities, kind). Detail fields are empty for
+# activities that haven't been enriched.
+EXPORT_COLUMNS = [
+    ("id", "strava_id", "int"),
+    ("name", "name", "str"),
+    ("type", "type", "str"),
+    ("start_date", "start_date", "time"),
+    ("distance", "distance", "distance"),
+    ("moving_time", "moving_time", "int"),
+    ("elapsed_time", "elapsed_time", "int"),
+    ("total_elevation_gain", "total_elevation_gain", "float"),
+    ("average_speed", "average_speed", "float"),
+    ("max_speed", "max_speed", "float"),
+    ("average_heartrate", "details.average_heartrate", "float"),
+    ("max_heartrate", "details.max_heartrate", "float"),
+    ("average_watts", "details.average_watts", "float"),
+    ("calories", "details.calories", "float"),
+    ("device_name", "details.device_name", "str"),
+]
+
+EXPORT_PROJECTION = {"_id": 0, **{field: 1 for _, field, _ in EXPORT_COLUMNS}}
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+PARQUET_AVAILABLE = pq is not None
+
+
+def export_query(
+    athlete_id: int,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    activity_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filter for the athlete's activities from from_date through to_date (inclusive days)."""
+    after = datetime.combine(from_date, datetime.min.time()) if from_date else None
+    before = datetime.combine(to_date + timedelta(days=1), datetime.min.time()) if to_date else None
+    return activity_query(athlete_id, before, after, activity_type)
+
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+async def export_batches(query: Dict[str, Any], unit: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Dict[str, List[Any]]]:
+    """
+    Read matching activities off one cursor, oldest first, as column batches.
+
+    At most `batch_size` documents are held at a time, so memory stays flat
+    however long the history is.
+    """
+    factor = distance_factor(unit)
+    cursor = cached_activities.find(query, EXPORT_PROJECTION, batch_size=batch_size).sort(EXPORT_SORT)
+    columns: Dict[str, List[Any]] = {name: [] for name, _, _ in EXPORT_COLUMNS}
+    rows = 0
+    async for doc in cursor:
+        for name, field, kind in EXPORT_COLUMNS:
+            value = _field(doc, field)
+            if kind == "distance" and value is not None:
+                value = value * factor
+            columns[name].append(value)
+        rows += 1
+        if rows >= batch_size:
+            yield columns
+            columns = {name: [] for name, _, _ in EXPORT_COLUMNS}
+            rows = 0
+    if rows:
+        yield columns
+
+
+def _csv_value(value: Any, kind: str) -> Any:
+    if value is None:
+        return ""
+    if kind == "time":
+        return value.isoformat() + "Z"
+    if kind == "distance":
+        return round(value, 3)
+    return value
+
+
+async def csv_chunks(batches: AsyncIterator[Dict[str, List[Any]]]) -> AsyncIterator[bytes]:
+    """Header, then one encoded chunk of rows per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode()
+
+    kinds = [kind for _, _, kind in EXPORT_COLUMNS]
+    async for columns in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        values = [[_csv_value(value, kind) for value in columns[name]] for (name, _, _), kind in zip(EXPORT_COLUMNS, kinds)]
+        writer.writerows(zip(*values))
+        yield buffer.getvalue().encode()
+
+
+def parquet_schema():
+    types = {
+        "int": pa.int64(), "float": pa.float64(), "distance": pa.float64(),
+        "str": pa.string(), "time": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, _, kind in EXPORT_COLUMNS])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what the Parquet writer wrote until it is drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+async def parquet_chunks(batches: AsyncIterator[Dict[str, List[Any]]], row_group_size: int = PARQUET_ROW_GROUP_SIZE) -> AsyncIterator[bytes]:
+    """
+    Encode batches as Parquet, one row group per `row_group_size` rows.
+
+    Each row group's bytes are sent as soon as it is written; only the
+    group being filled is held in memory. Encoding runs in a thread.
+    """
+    schema = parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    pending: List[Any] = []
+    pending_rows = 0
+
+    async def write_group():
+        nonlocal pending, pending_rows
+        table = pa.Table.from_batches(pending, schema=schema)
+        pending, pending_rows = [], 0
+        await asyncio.to_thread(writer.write_table, table)
+        return sink.drain()
+
+    try:
+        async for columns in batches:
+            pending.append(pa.record_batch([pa.array(columns[field.name], type=field.type) for field in schema], schema=schema))
+            pending_rows += pending[-1].num_rows
+            if pending_rows >= row_group_size:
+                yield await write_group()
+        if pending_rows:
+            yield await write_group()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(query: Dict[str, Any], export_format: str, unit: str) -> AsyncIterator[bytes]:
+    batches = export_batches(query, unit)
+    if export_format == "parquet":
+        return parquet_chunks(batches)
+    return csv_chunks(batches)
+
+
+def export_filename(athlete_id: int, export_format: str) -> str:
+    return f"strive-activities-{athlete_id}-{datetime.utcnow():%Y%m%d}.{export_format}"
+
+
+async def export_to_file(path: str, athlete_id: int, export_format: str, unit: str, from_date: Optional[date], to_date: Optional[date], activity_type: Optional[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    query = export_query(athlete_id, from_date, to_date, activity_type)
+    written = 0
+    out = sys.stdout.buffer if path == "-" else open(path, "wb")
+    try:
+        async for chunk in export_chunks(query, export_format, unit):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return {"athlete_id": athlete_id, "format": export_format, "bytes": written, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export an athlete's cached activities as CSV or Parquet.")
+    parser.add_argument("--athlete", type=int, required=True)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", help="Output file, or - for stdout (default: strive-activities-<athlete>-<date>.<format>)")
+    parser.add_argument("--unit", choices=["km", "mi"], default="km", help="Distance unit")
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument("--type", dest="activity_type", help="Only activities of this type, e.g. Run")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not PARQUET_AVAILABLE:
+        parser.error("Parquet export needs the pyarrow package")
+    output = args.output or export_filename(args.athlete, args.format)
+    result = asyncio.run(export_to_file(output, args.athlete, args.format, args.unit, args.from_date, args.to_date, args.activity_type))
+    if output != "-":
+        print(json.dumps({**result, "output": output}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
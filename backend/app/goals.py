@@ -0,0 +1,60 @@
+from typing import Dict, Any, List, Set, Tuple
+from bson import ObjectId
+from app.models import GoalBatch
+
+# Items accepted by one batch request
+MAX_BATCH_SIZE = 500
+
+# (index into the results, "create" | "update" | "delete", goal id, fields to write)
+GoalWrite = Tuple[int, str, str, Dict[str, Any]]
+
+
+def new_goal_id() -> str:
+    """Goal ids are ObjectId strings with every storage backend."""
+    return str(ObjectId())
+
+
+def batch_goal_ids(batch: GoalBatch) -> List[str]:
+    """Well-formed ids the batch updates or deletes; look these up before planning."""
+    return [goal_id for goal_id in [item.id for item in batch.update] + batch.delete if ObjectId.is_valid(goal_id)]
+
+
+def plan_goal_batch(batch: GoalBatch, athlete_id: int, existing: Set[str]) -> Tuple[List[Dict[str, Any]], List[GoalWrite]]:
+    """
+    Turn a batch into one result per item and the writes to make.
+
+    Results are in request order (creates, then updates, then deletes).
+    Items whose id is malformed or not among the athlete's `existing` goal
+    ids are reported without a write; other athletes' goals count as not
+    found.
+    """
+    results: List[Dict[str, Any]] = []
+    writes: List[GoalWrite] = []
+
+    def add(op: str, goal_id: str, status: str, fields=None):
+        results.append({"op": op, "id": goal_id, "status": status})
+        if fields is not None:
+            writes.append((len(results) - 1, op, goal_id, fields))
+
+    for goal in batch.create:
+        add("create", new_goal_id(), "created", {**goal.model_dump(exclude={"id"}), "user_id": athlete_id})
+
+    for op, goal_id, fields in (
+        [("update", item.id, item.goal.model_dump(exclude_unset=True, exclude={"id", "user_id"})) for item in batch.update]
+        + [("delete", goal_id, {}) for goal_id in batch.delete]
+    ):
+        if not ObjectId.is_valid(goal_id):
+            add(op, goal_id, "invalid_id")
+        elif goal_id not in existing:
+            add(op, goal_id, "not_found")
+        else:
+            add(op, goal_id, f"{op}d", fields)
+
+    return results, writes
+
+
+def batch_response(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {"results": results, "counts": counts}
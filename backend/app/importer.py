@@ -0,0 +1,508 @@
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+from uuid import uuid4
+from xml.etree import ElementTree
+import numpy as np
+import orjson
+from pymongo import UpdateOne
+from app.database import activity_streams, sync_state, import_jobs
+from app.leases import acquire_lease, extend_lease, release_lease, SYNC_LEASE_SECONDS
+from app.records import stream_efforts, rebuild_records
+from app.rollups import rebuild_rollups
+from app.streams import STREAM_SCALES, encode_stream, streams_fields
+from app.mongo_repository import store_activities
+from app.sync import normalize_activity
+
+try:
+    import fitparse
+except ImportError:  # FIT files are skipped unless fitparse is installed
+    fitparse = None
+
+# activities.csv rows upserted per batch
+IMPORT_BATCH_SIZE = 500
+
+# Processes parsing GPX/TCX/FIT files
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", str(os.cpu_count() or 2)))
+
+# Activity Date formats seen in Strava exports (always UTC)
+CSV_DATE_FORMATS = ("%b %d, %Y, %I:%M:%S %p", "%d %b %Y, %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+EARTH_RADIUS_M = 6_371_000
+
+# An import holds the athlete's sync lease, like a sync job, and heartbeats it
+IMPORT_LEASE_POLL_SECONDS = 5
+IMPORT_HEARTBEAT_SECONDS = SYNC_LEASE_SECONDS / 3
+
+# A running import that hasn't heartbeated for this long was cut off by a restart
+IMPORT_STALE_SECONDS = SYNC_LEASE_SECONDS
+
+ProgressCallback = Callable[[Dict[str, Any]], Any]
+
+
+def _float(value: Optional[str]) -> float:
+    try:
+        return float(value.replace(",", "")) if value else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    for fmt in CSV_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def csv_activities(text: io.TextIOBase) -> Iterator[Tuple[Dict[str, Any], Optional[str]]]:
+    """
+    Read activities.csv row by row as (Strava-like activity, export filename).
+
+    Exports repeat some headers: the first "Distance" and "Elapsed Time" are
+    display values (km), later ones are in meters and seconds. The last
+    occurrence of a header wins; a lone "Distance" column is taken as km.
+    """
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns: Dict[str, List[int]] = {}
+    for index, name in enumerate(header):
+        columns.setdefault(name.strip(), []).append(index)
+
+    def value(row: List[str], name: str) -> Optional[str]:
+        indexes = columns.get(name)
+        if not indexes or indexes[-1] >= len(row):
+            return None
+        return row[indexes[-1]]
+
+    distance_in_km = len(columns.get("Distance", [])) == 1
+    for row in reader:
+        start_date = _parse_date(value(row, "Activity Date") or "")
+        strava_id = value(row, "Activity ID")
+        if start_date is None or not strava_id:
+            continue
+        distance = _float(value(row, "Distance")) * (1000 if distance_in_km else 1)
+        elapsed_time = int(_float(value(row, "Elapsed Time")))
+        moving_time = int(_float(value(row, "Moving Time"))) or elapsed_time
+        activity = {
+            "id": int(strava_id),
+            "name": value(row, "Activity Name") or "",
+            "type": value(row, "Activity Type") or "Unknown",
+            "start_date": start_date.replace(tzinfo=timezone.utc).isoformat(),
+            "distance": distance,
+            "elapsed_time": elapsed_time,
+            "moving_time": moving_time,
+            "average_speed": _float(value(row, "Average Speed")) or (distance / moving_time if moving_time else 0),
+            "max_speed": _float(value(row, "Max Speed")),
+            "total_elevation_gain": _float(value(row, "Elevation Gain")),
+        }
+        yield activity, value(row, "Filename") or None
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _gpx_points(data: bytes) -> Iterator[Dict[str, Any]]:
+    point: Dict[str, Any] = {}
+    for event, element in ElementTree.iterparse(io.BytesIO(data), events=("start", "end")):
+        tag = _local(element.tag)
+        if event == "start":
+            if tag == "trkpt":
+                point = {"latlng": [float(element.get("lat")), float(element.get("lon"))]}
+            continue
+        if tag == "ele":
+            point["altitude"] = float(element.text)
+        elif tag == "time" and "latlng" in point:
+            point["time"] = element.text
+        elif tag == "hr":
+            point["heartrate"] = float(element.text)
+        elif tag in ("cad", "cadence"):
+            point["cadence"] = float(element.text)
+        elif tag == "trkpt":
+            yield point
+            element.clear()
+
+
+def _tcx_points(data: bytes) -> Iterator[Dict[str, Any]]:
+    point: Dict[str, Any] = {}
+    position: List[float] = []
+    for event, element in ElementTree.iterparse(io.BytesIO(data), events=("start", "end")):
+        tag = _local(element.tag)
+        if event == "start":
+            if tag == "Trackpoint":
+                point, position = {}, []
+            continue
+        if tag == "Time":
+            point["time"] = element.text
+        elif tag in ("LatitudeDegrees", "LongitudeDegrees"):
+            position.append(float(element.text))
+            if len(position) == 2:
+                point["latlng"] = position
+        elif tag == "AltitudeMeters":
+            point["altitude"] = float(element.text)
+        elif tag == "DistanceMeters":
+            point["distance"] = float(element.text)
+        elif tag == "Value" and "time" in point:
+            point["heartrate"] = float(element.text)
+        elif tag == "Cadence":
+            point["cadence"] = float(element.text)
+        elif tag == "Trackpoint":
+            yield point
+            element.clear()
+
+
+def _fit_points(data: bytes) -> Iterator[Dict[str, Any]]:
+    semicircles = 180 / 2 ** 31
+    for record in fitparse.FitFile(io.BytesIO(data)).get_messages("record"):
+        values = record.get_values()
+        point = {"time": values.get("timestamp")}
+        if values.get("position_lat") is not None and values.get("position_long") is not None:
+            point["latlng"] = [values["position_lat"] * semicircles, values["position_long"] * semicircles]
+        for source, key in (("enhanced_altitude", "altitude"), ("altitude", "altitude"), ("distance", "distance"),
+                            ("heart_rate", "heartrate"), ("cadence", "cadence"), ("power", "watts")):
+            if values.get(source) is not None and key not in point:
+                point[key] = float(values[source])
+        yield point
+
+
+def _seconds(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def track_distance(latlng: np.ndarray) -> np.ndarray:
+    """Cumulative haversine distance in meters along [lat, lng] points."""
+    lat, lng = np.radians(latlng[:, 0]), np.radians(latlng[:, 1])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2
+    return np.concatenate(([0.0], np.cumsum(2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a)))))
+
+
+def parse_activity_file(filename: str, data: bytes) -> Optional[Tuple[Dict[str, Dict[str, Any]], int, Dict[str, float]]]:
+    """
+    Turn one exported GPX/TCX/FIT file into encoded streams, their JSON size and best efforts.
+
+    Runs in the import process pool. A stream is kept only when every
+    timestamped point has it; GPX tracks get a distance stream from their
+    coordinates. Returns None for files without a usable track.
+    """
+    name = filename.lower()
+    if name.endswith(".gz"):
+        data = gzip.decompress(data)
+        name = name[:-3]
+    if name.endswith(".gpx"):
+        points = _gpx_points(data)
+    elif name.endswith(".tcx"):
+        points = _tcx_points(data)
+    elif name.endswith(".fit") and fitparse is not None:
+        points = _fit_points(data)
+    else:
+        return None
+
+    try:
+        track = [point for point in points if point.get("time") is not None]
+    except (ElementTree.ParseError, ValueError, TypeError):
+        return None
+    if len(track) < 2:
+        return None
+
+    first = _seconds(track[0]["time"])
+    series = {"time": [round(_seconds(point["time"]) - first) for point in track]}
+    for key in STREAM_SCALES:
+        if key != "time" and all(key in point for point in track):
+            series[key] = [point[key] for point in track]
+    if "distance" not in series and "latlng" in series:
+        series["distance"] = track_distance(np.asarray(series["latlng"])).round(1).tolist()
+    efforts = stream_efforts(np.asarray(series["time"]), np.asarray(series["distance"])) if "distance" in series else {}
+
+    streams = {key: encode_stream(values, STREAM_SCALES[key]) for key, values in series.items()}
+    raw_bytes = sum(len(orjson.dumps(values)) for values in series.values())
+    return streams, raw_bytes, efforts
+
+
+class StravaExportImporter:
+    """
+    Import a Strava bulk-export zip into cached_activities and activity_streams.
+
+    activities.csv is read straight out of the archive and upserted in
+    batches of IMPORT_BATCH_SIZE. The activity files it references are read
+    one at a time and parsed in a process pool; at most two per worker are
+    in flight. Nothing is extracted to disk and nothing talks to Strava.
+    """
+
+    def __init__(self, athlete_id: int, workers: int = IMPORT_WORKERS, streams: bool = True, progress: Optional[ProgressCallback] = None):
+        self.athlete_id = athlete_id
+        self.workers = workers
+        self.streams = streams
+        self.progress = progress
+        self.stats = {
+            "activities": 0, "inserted": 0, "updated": 0,
+            "files_total": 0, "files_done": 0, "streams": 0, "skipped_files": 0,
+        }
+        self.rollups_built = False
+        self.newest: Optional[datetime] = None
+
+    async def _report(self, phase: str):
+        if self.progress is not None:
+            result = self.progress({"phase": phase, **self.stats})
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def run(self, path_or_file) -> Dict[str, Any]:
+        started = datetime.utcnow()
+        with zipfile.ZipFile(path_or_file) as archive:
+            files = await self._import_csv(archive)
+            if self.streams and files:
+                await self._import_files(archive, files)
+        await self._finish()
+        await self._report("done")
+        return {**self.stats, "seconds": round((datetime.utcnow() - started).total_seconds(), 3)}
+
+    async def _import_csv(self, archive: zipfile.ZipFile) -> Dict[int, str]:
+        """Upsert every activities.csv row; returns activity id -> file in the archive."""
+        state = await sync_state.find_one({"athlete_id": self.athlete_id})
+        self.rollups_built = bool(state and state.get("rollups_built"))
+
+        csv_name = next((n for n in archive.namelist() if n.rsplit("/", 1)[-1] == "activities.csv"), None)
+        if csv_name is None:
+            raise ValueError("activities.csv not found in the archive")
+        prefix = csv_name[:-len("activities.csv")]
+        members = set(archive.namelist())
+
+        files = {}
+        batch = []
+        with archive.open(csv_name) as raw:
+            for activity, filename in csv_activities(io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")):
+                doc = normalize_activity(self.athlete_id, activity)
+                if doc is None:
+                    continue
+                batch.append(doc)
+                if filename and prefix + filename in members:
+                    files[doc["strava_id"]] = prefix + filename
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await self._store(batch)
+                    batch = []
+        if batch:
+            await self._store(batch)
+        self.stats["files_total"] = len(files)
+        return files
+
+    async def _store(self, batch: List[Dict[str, Any]]):
+        inserted, updated = await store_activities(self.athlete_id, batch, rollups_built=self.rollups_built)
+        self.stats["activities"] += len(batch)
+        self.stats["inserted"] += inserted
+        self.stats["updated"] += updated
+        newest = max(doc["start_date"] for doc in batch)
+        if self.newest is None or newest > self.newest:
+            self.newest = newest
+        await self._report("activities")
+
+    async def _import_files(self, archive: zipfile.ZipFile, files: Dict[int, str]):
+        loop = asyncio.get_running_loop()
+        in_flight = asyncio.Semaphore(self.workers * 2)
+        writes: List[UpdateOne] = []
+
+        async def flush():
+            if writes:
+                batch = writes[:]
+                writes.clear()
+                await activity_streams.bulk_write(batch, ordered=False)
+                await self._report("files")
+
+        async def parse(pool: ProcessPoolExecutor, strava_id: int, member: str, data: bytes):
+            try:
+                parsed = await loop.run_in_executor(pool, parse_activity_file, member, data)
+            except Exception as e:
+                print(f"Could not parse {member}: {e!r}")
+                parsed = None
+            finally:
+                in_flight.release()
+            self.stats["files_done"] += 1
+            if parsed is None:
+                self.stats["skipped_files"] += 1
+                return
+            streams, raw_bytes, efforts = parsed
+            writes.append(UpdateOne(
+                {"athlete_id": self.athlete_id, "strava_id": strava_id},
+                {"$set": streams_fields(streams, raw_bytes, efforts)},
+                upsert=True
+            ))
+            self.stats["streams"] += 1
+            if len(writes) >= IMPORT_BATCH_SIZE // 10:
+                await flush()
+
+        # Spawned, not forked: the parent has Motor's threads running
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            tasks = []
+            for strava_id, member in files.items():
+                await in_flight.acquire()
+                # Reading a member decompresses it; keep that off the event loop
+                data = await asyncio.to_thread(archive.read, member)
+                tasks.append(asyncio.create_task(parse(pool, strava_id, member, data)))
+            await asyncio.gather(*tasks)
+        await flush()
+
+    async def _finish(self):
+        """Leave sync state as if the history had been synced from the API."""
+        if not self.rollups_built:
+            await rebuild_rollups(self.athlete_id)
+        # Brings in the best efforts found in the activity files
+        await rebuild_records(self.athlete_id)
+        update = {"rollups_built": True, "records_built": True}
+        state = await sync_state.find_one({"athlete_id": self.athlete_id})
+        high_water_mark = state.get("high_water_mark") if state else None
+        if self.newest is not None and (high_water_mark is None or self.newest > high_water_mark):
+            # The next API sync only asks for activities after the export
+            update["high_water_mark"] = self.newest
+        await sync_state.update_one({"athlete_id": self.athlete_id}, {"$set": update}, upsert=True)
+
+
+async def run_under_lease(importer: StravaExportImporter, path: str, heartbeat: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """
+    Run an import while holding the athlete's sync lease.
+
+    Sync jobs and webhook events diff against the same cached activities
+    and fold the changes into rollups and records, so they wait while an
+    import runs (and it waits for them). `heartbeat` is called while
+    waiting and, with the lease extended, every IMPORT_HEARTBEAT_SECONDS
+    while running.
+    """
+    athlete_id = importer.athlete_id
+    holder = await acquire_lease(athlete_id)
+    while holder is None:
+        await asyncio.sleep(IMPORT_LEASE_POLL_SECONDS)
+        if heartbeat is not None:
+            await heartbeat()
+        holder = await acquire_lease(athlete_id)
+
+    async def keep_alive():
+        while True:
+            await asyncio.sleep(IMPORT_HEARTBEAT_SECONDS)
+            try:
+                await extend_lease(athlete_id, holder)
+                if heartbeat is not None:
+                    await heartbeat()
+            except Exception as e:
+                print(f"Heartbeat for the import of athlete {athlete_id} failed: {e!r}")
+
+    task = asyncio.create_task(keep_alive())
+    try:
+        return await importer.run(path)
+    finally:
+        task.cancel()
+        await release_lease(athlete_id, holder)
+
+
+# Imports running in this process, kept referenced until they finish
+_running_imports = set()
+
+
+async def start_import(athlete_id: int, path: str, filename: Optional[str] = None) -> str:
+    """
+    Import an uploaded export in the background and return its job id.
+
+    The import starts once it has the athlete's sync lease. Progress is
+    written to import_jobs as it runs; the file at `path` is deleted when
+    it finishes.
+    """
+    job_id = uuid4().hex
+    now = datetime.utcnow()
+    await import_jobs.insert_one({
+        "_id": job_id, "athlete_id": athlete_id, "filename": filename, "path": path,
+        "status": "running", "progress": None, "result": None, "error": None,
+        "started_at": now, "heartbeat_at": now, "finished_at": None,
+    })
+
+    async def progress(stats: Dict[str, Any]):
+        await import_jobs.update_one({"_id": job_id}, {"$set": {"progress": stats, "heartbeat_at": datetime.utcnow()}})
+
+    async def heartbeat():
+        await import_jobs.update_one({"_id": job_id}, {"$set": {"heartbeat_at": datetime.utcnow()}})
+
+    async def run():
+        try:
+            result = await run_under_lease(StravaExportImporter(athlete_id, progress=progress), path, heartbeat)
+            update = {"status": "done", "result": result}
+        except Exception as e:
+            print(f"Import {job_id} for athlete {athlete_id} failed: {e!r}")
+            update = {"status": "failed", "error": repr(e)}
+        finally:
+            os.unlink(path)
+        update["finished_at"] = datetime.utcnow()
+        await import_jobs.update_one({"_id": job_id}, {"$set": update})
+
+    task = asyncio.create_task(run())
+    _running_imports.add(task)
+    task.add_done_callback(_running_imports.discard)
+    return job_id
+
+
+async def fail_stale_imports() -> int:
+    """
+    Mark imports whose process stopped heartbeating as failed, removing their upload if it is on this host.
+
+    Called on startup; imports run inside the API process, so a restart cuts them off.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=IMPORT_STALE_SECONDS)
+    failed = 0
+    async for job in import_jobs.find({"status": "running", "heartbeat_at": {"$lt": cutoff}}, {"path": 1}):
+        result = await import_jobs.update_one(
+            {"_id": job["_id"], "status": "running"},
+            {"$set": {"status": "failed", "error": "Import was interrupted by a restart", "finished_at": datetime.utcnow()}}
+        )
+        failed += result.modified_count
+        if job.get("path"):
+            try:
+                os.unlink(job["path"])
+            except OSError:
+                pass
+    return failed
+
+
+async def get_import(job_id: str) -> Optional[Dict[str, Any]]:
+    doc = await import_jobs.find_one({"_id": job_id}, {"path": 0})
+    if doc is None:
+        return None
+    doc["id"] = doc.pop("_id")
+    return doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a Strava bulk-export zip without calling the Strava API.")
+    parser.add_argument("archive", help="Path to the export zip")
+    parser.add_argument("--athlete", type=int, required=True, help="Athlete id to import the activities for")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Processes parsing activity files")
+    parser.add_argument("--no-streams", action="store_true", help="Only import activities.csv")
+    args = parser.parse_args()
+
+    def report(progress: Dict[str, Any]):
+        print(
+            f"[{progress['phase']}] {progress['activities']} activities "
+            f"({progress['inserted']} new, {progress['updated']} updated), "
+            f"files {progress['files_done']}/{progress['files_total']}",
+            flush=True
+        )
+
+    importer = StravaExportImporter(args.athlete, workers=args.workers, streams=not args.no_streams, progress=report)
+    print(json.dumps(asyncio.run(run_under_lease(importer, args.archive)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+from typing import Dict, Any, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from app.database import strava_accounts, cached_activities, goals, sync_state, sync_leases, sync_jobs, weekly_rollups, daily_rollups, activity_streams, import_jobs, personal_records
+
+INDEXES = [
+    (cached_activities, [
+        IndexModel([("athlete_id", ASCENDING), ("strava_id", ASCENDING)], unique=True, name="athlete_strava_unique"),
+        # Newest-first listing; _id breaks start_date ties for keyset pagination
+        IndexModel([("athlete_id", ASCENDING), ("start_date", DESCENDING), ("_id", DESCENDING)], name="athlete_start_date_id"),
+        IndexModel(
+            [("athlete_id", ASCENDING), ("type", ASCENDING), ("start_date", DESCENDING), ("_id", DESCENDING)],
+            name="athlete_type_start_date_id"
+        ),
+        # Activities still waiting for detail enrichment, newest first
+        IndexModel(
+            [("athlete_id", ASCENDING), ("enrichment.status", ASCENDING), ("start_date", DESCENDING)],
+            name="athlete_enrichment_start_date"
+        ),
+    ]),
+    (strava_accounts, [
+        IndexModel([("athlete_id", ASCENDING)], unique=True, name="athlete_id_unique"),
+    ]),
+    (goals, [
+        IndexModel([("user_id", ASCENDING), ("week", ASCENDING)], name="user_week"),
+    ]),
+    (sync_state, [
+        IndexModel([("athlete_id", ASCENDING)], unique=True, name="athlete_id_unique"),
+    ]),
+    (sync_leases, [
+        # Housekeeping only; lease checks compare expires_at themselves
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ]),
+    (sync_jobs, [
+        IndexModel([("athlete_id", ASCENDING), ("status", ASCENDING)], name="athlete_status"),
+        # At most one queued sync per athlete and one queued event job per
+        # activity; the scheduler's enqueue upserts against these
+        IndexModel(
+            [("athlete_id", ASCENDING)], unique=True, name="athlete_sync_queued_unique",
+            partialFilterExpression={"status": "queued", "kind": "sync"}
+        ),
+        IndexModel(
+            [("athlete_id", ASCENDING), ("kind", ASCENDING), ("strava_id", ASCENDING)], unique=True,
+            name="athlete_event_queued_unique", partialFilterExpression={"status": "queued", "kind": "activity"}
+        ),
+        IndexModel([("status", ASCENDING), ("priority", ASCENDING), ("run_after", ASCENDING)], name="status_priority_run_after"),
+        # Finished job records are kept for a day
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=24 * 3600, name="finished_at_ttl"),
+    ]),
+    (weekly_rollups, [
+        IndexModel([("athlete_id", ASCENDING), ("period", ASCENDING), ("type", ASCENDING)], unique=True, name="athlete_period_type_unique"),
+        IndexModel([("athlete_id", ASCENDING), ("week_start", ASCENDING)], name="athlete_week_start"),
+    ]),
+    (daily_rollups, [
+        IndexModel([("athlete_id", ASCENDING), ("period", ASCENDING), ("type", ASCENDING)], unique=True, name="athlete_period_type_unique"),
+        IndexModel([("athlete_id", ASCENDING), ("date", ASCENDING)], name="athlete_date"),
+    ]),
+    (activity_streams, [
+        IndexModel([("athlete_id", ASCENDING), ("strava_id", ASCENDING)], unique=True, name="athlete_strava_unique"),
+    ]),
+    (personal_records, [
+        IndexModel([("athlete_id", ASCENDING), ("type", ASCENDING)], unique=True, name="athlete_type_unique"),
+    ]),
+    (import_jobs, [
+        # Finished import records are kept for a day
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=24 * 3600, name="finished_at_ttl"),
+    ]),
+]
+
+
+# Indexes replaced by a differently defined one; dropped before INDEXES are built
+OBSOLETE_INDEXES = [
+    (sync_jobs, "athlete_queued_unique"),
+    (cached_activities, "athlete_start_date"),
+    # Retention TTL; expiry now runs through sync so rollups and records follow
+    (cached_activities, "start_date_ttl"),
+]
+
+
+async def remove_duplicate_activities() -> int:
+    """
+    Delete duplicate (athlete_id, strava_id) rows left behind by the old
+    insert_many sync so the unique index can be built. Keeps the newest copy.
+    """
+    pipeline = [
+        {"$sort": {"cached_at": -1}},
+        {"$group": {
+            "_id": {"athlete_id": "$athlete_id", "strava_id": "$strava_id"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    duplicate_ids = []
+    async for group in cached_activities.aggregate(pipeline, allowDiskUse=True):
+        duplicate_ids.extend(group["ids"][1:])
+    if not duplicate_ids:
+        return 0
+    result = await cached_activities.delete_many({"_id": {"$in": duplicate_ids}})
+    return result.deleted_count
+
+
+async def ensure_indexes():
+    """Create all indexes the API's hot queries depend on. Safe to run on every startup."""
+    for collection, name in OBSOLETE_INDEXES:
+        if name in await collection.index_information():
+            await collection.drop_index(name)
+
+    for collection, indexes in INDEXES:
+        try:
+            await collection.create_indexes(indexes)
+        except OperationFailure:
+            if collection.name != cached_activities.name:
+                raise
+            removed = await remove_duplicate_activities()
+            print(f"Removed {removed} duplicate cached activities")
+            await collection.create_indexes(indexes)
+
+
+async def index_stats() -> List[Dict[str, Any]]:
+    """Report per-index usage counters from $indexStats for every managed collection."""
+    report = []
+    for collection, _ in INDEXES:
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            report.append({
+                "collection": collection.name,
+                "index": stat["name"],
+                "key": dict(stat["key"]),
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"],
+            })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage MongoDB indexes for the Strava cache.")
+    parser.add_argument("command", choices=["ensure", "stats"], help="ensure: create/update indexes, stats: report index usage")
+    args = parser.parse_args()
+
+    if args.command == "ensure":
+        asyncio.run(ensure_indexes())
+        print("Indexes are up to date")
+        return
+
+    report = asyncio.run(index_stats())
+    for row in report:
+        flag = "  (unused)" if row["ops"] == 0 else ""
+        print(f"{row['collection']:<20} {row['index']:<24} ops={row['ops']:<10} since={row['since'].isoformat()}{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import uuid4
+from pymongo.errors import DuplicateKeyError
+from app.database import sync_leases
+
+# A sync lease expires on its own if the worker holding it dies mid-sync
+SYNC_LEASE_SECONDS = 120
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease(key: Any, seconds: int = SYNC_LEASE_SECONDS) -> Optional[str]:
+    """
+    Take a cross-process lease, e.g. the sync lease for an athlete_id.
+
+    Returns the holder token, or None if another worker holds an unexpired
+    lease. The upsert only matches an expired lease, so while a live one
+    exists it tries to insert a second document with the same _id and fails.
+    """
+    holder = f"{WORKER_ID}:{uuid4().hex}"
+    now = datetime.utcnow()
+    try:
+        await sync_leases.update_one(
+            {"_id": key, "expires_at": {"$lte": now}},
+            {"$set": {
+                "holder": holder,
+                "acquired_at": now,
+                "expires_at": now + timedelta(seconds=seconds),
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    return holder
+
+
+async def release_lease(key: Any, holder: str):
+    """Release a lease, unless it already expired and was taken over."""
+    await sync_leases.delete_one({"_id": key, "holder": holder})
+
+
+async def extend_lease(key: Any, holder: str, seconds: int = SYNC_LEASE_SECONDS) -> bool:
+    """Push back the expiry of a lease this worker still holds."""
+    result = await sync_leases.update_one(
+        {"_id": key, "holder": holder},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=seconds)}}
+    )
+    return result.matched_count == 1
@@ -0,0 +1,187 @@
+import os
+import random
+import re
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from pymongo import monitoring
+
+# With several uvicorn workers, point this at an empty directory shared by
+# them (wiped before the server starts); every worker writes its samples there
+# and /metrics sums them. prometheus_client reads it at import time.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess  # noqa: E402
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY  # noqa: E402
+
+# Opt-in profiling: requests slower than this many milliseconds have their
+# profile written to PROFILE_DIR. Needs pyinstrument; unset turns it off.
+SLOW_REQUEST_PROFILE_MS = float(os.getenv("SLOW_REQUEST_PROFILE_MS", "0"))
+# Share of requests profiled while enabled; profiling slows the ones it samples
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.05"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/strive-profiles")
+
+HTTP_REQUEST_DURATION = Histogram(
+    "strive_http_request_duration_seconds", "Time to serve a request, response body included",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "strive_mongo_command_duration_seconds", "MongoDB command round trips",
+    ["command", "collection"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "strive_mongo_command_failures_total", "MongoDB commands that returned an error", ["command", "collection"]
+)
+SQLITE_QUERY_DURATION = Histogram(
+    "strive_sqlite_query_duration_seconds", "SQLite storage operations, timed on the query thread",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+STRAVA_REQUEST_DURATION = Histogram(
+    "strive_strava_request_duration_seconds", "Strava API attempts, retries counted separately",
+    ["method", "endpoint", "status"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0),
+)
+STRAVA_RATE_LIMIT_USAGE = Gauge(
+    "strive_strava_rate_limit_usage", "Requests used in the current Strava rate-limit window",
+    ["window"], multiprocess_mode="livemax",
+)
+STRAVA_RATE_LIMIT = Gauge(
+    "strive_strava_rate_limit", "Strava rate limit of the window", ["window"], multiprocess_mode="livemax",
+)
+CACHE_EVENTS = Counter(
+    "strive_cache_events_total", "Cache lookups by outcome (hit, miss, stale, pending, refresh)", ["cache", "result"]
+)
+
+# Numeric path segments become :id so activity ids don't explode the label set
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def percentile_ms(sorted_seconds: List[float], q: float) -> Optional[float]:
+    """q-th percentile of sorted durations in seconds, in milliseconds."""
+    if not sorted_seconds:
+        return None
+    return round(sorted_seconds[min(len(sorted_seconds) - 1, int(q * len(sorted_seconds)))] * 1000, 2)
+
+
+def cache_event(cache: str, result: str):
+    CACHE_EVENTS.labels(cache, result).inc()
+
+
+def observe_strava(method: str, path: str, status: str, seconds: float):
+    STRAVA_REQUEST_DURATION.labels(method, _ID_SEGMENT.sub("/:id", path), status).observe(seconds)
+
+
+def observe_sqlite(operation: str, seconds: float):
+    SQLITE_QUERY_DURATION.labels(operation).observe(seconds)
+
+
+def observe_rate_limit(short_usage: int, daily_usage: int, short_limit: int, daily_limit: int):
+    STRAVA_RATE_LIMIT_USAGE.labels("short").set(short_usage)
+    STRAVA_RATE_LIMIT_USAGE.labels("daily").set(daily_usage)
+    STRAVA_RATE_LIMIT.labels("short").set(short_limit)
+    STRAVA_RATE_LIMIT.labels("daily").set(daily_limit)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends; register it with the client's event_listeners."""
+
+    def __init__(self):
+        self._collections: Dict[int, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        # The collection is the value of the command's own key (getMore names it separately)
+        target = event.command.get("collection") if event.command_name == "getMore" else event.command.get(event.command_name)
+        self._collections[event.request_id] = target if isinstance(target, str) else ""
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        collection = self._collections.pop(event.request_id, "")
+        MONGO_COMMAND_DURATION.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(event.command_name, collection).inc()
+
+
+def _profiler_class():
+    if not SLOW_REQUEST_PROFILE_MS:
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print("SLOW_REQUEST_PROFILE_MS is set but pyinstrument is not installed; profiling is off")
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return Profiler
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request latency per route template.
+
+    Unmatched paths are grouped under "unmatched". When slow-request
+    profiling is on, a sample of requests runs under pyinstrument and the
+    ones slower than SLOW_REQUEST_PROFILE_MS are written out.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiler_class = _profiler_class()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        profiler = None
+        if self.profiler_class is not None and random.random() < PROFILE_SAMPLE_RATE:
+            profiler = self.profiler_class(async_mode="enabled")
+            profiler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_path, status).observe(elapsed)
+            if profiler is not None:
+                profiler.stop()
+                if elapsed * 1000 >= SLOW_REQUEST_PROFILE_MS:
+                    self._write_profile(profiler, scope["method"], route_path, elapsed)
+
+    def _write_profile(self, profiler, method: str, route_path: str, elapsed: float):
+        name = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}{route_path}").strip("_")
+        path = os.path.join(PROFILE_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{name}.txt")
+        with open(path, "w") as f:
+            f.write(profiler.output_text(unicode=True))
+        print(f"Slow request {method} {route_path} took {elapsed * 1000:.0f} ms; profile written to {path}")
+
+
+def render_metrics() -> bytes:
+    """Prometheus text exposition, summed over all workers in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_worker_exited():
+    """Drop this worker's live gauges from the multiprocess files."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, Any, List
+from uuid import uuid4
 from app.utils.encryption import encryption
 
 class StravaAccount(BaseModel):
@@ -49,4 +50,41 @@ class Goal(BaseModel):
     target: float
     unit: str  # 'km', 'mi', 'hours', 'minutes', or 'sessions'
 
+class SyncJob(BaseModel):
+    id: str = Field(default_factory=lambda: uuid4().hex)
+    athlete_id: int
+    priority: int
+    kind: str = "sync"  # 'sync', 'activity', 'deauthorize', or 'enrich'
+    full: bool = False
+    strava_id: Optional[int] = None  # 'activity' jobs only
+    aspect: Optional[str] = None  # 'create', 'update', or 'delete'
+    status: str = "queued"  # 'queued', 'running', 'done', or 'failed'
+    attempts: int = 0
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    worker: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+class StravaWebhookEvent(BaseModel):
+    object_type: str  # 'activity' or 'athlete'
+    object_id: int
+    aspect_type: str  # 'create', 'update', or 'delete'
+    owner_id: int
+    subscription_id: int
+    event_time: int
+    updates: Dict[str, Any] = Field(default_factory=dict)
+
+class GoalBatchUpdate(BaseModel):
+    id: str
+    goal: Goal
+
+class GoalBatch(BaseModel):
+    create: List[Goal] = Field(default_factory=list)
+    update: List[GoalBatchUpdate] = Field(default_factory=list)
+    delete: List[str] = Field(default_factory=list)
+
 # ... rest of the models ... 
\ No newline at end of file
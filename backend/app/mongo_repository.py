@@ -0,0 +1,282 @@
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
+from app.activities import activity_query, fetch_activity_page, iter_activities
+from app.aggregations import weekly_activity_pipeline, goal_progress_pipeline
+from app.database import strava_accounts, cached_activities, goals, sync_state, weekly_rollups, daily_rollups, personal_records
+from app.goals import batch_goal_ids, plan_goal_batch, batch_response
+from app.models import GoalBatch
+from app.records import apply_record_changes, merge_records, rebuild_records
+from app.repository import Repository, activity_changed
+from app.rollups import apply_activity_changes, rebuild_rollups, read_weekly_rollups
+
+
+def activity_upsert(doc: Dict[str, Any]) -> UpdateOne:
+    """
+    Build an idempotent upsert keyed on (athlete_id, strava_id).
+
+    cached_at is only written on insert, so re-reading an unchanged activity
+    leaves the stored document untouched and costs no write.
+    """
+    fields = {k: v for k, v in doc.items() if k != "cached_at"}
+    return UpdateOne(
+        {"athlete_id": doc["athlete_id"], "strava_id": doc["strava_id"]},
+        # A changed activity gets its details fetched again
+        {"$set": fields, "$setOnInsert": {"cached_at": doc["cached_at"]}, "$unset": {"enrichment": ""}},
+        upsert=True
+    )
+
+
+async def bump_activities_version(athlete_id: int):
+    """
+    Mark the athlete's cached activities as changed; caches derived from them compare this version.
+
+    Also bumps the data_version that response ETags are derived from.
+    """
+    await sync_state.update_one({"athlete_id": athlete_id}, {"$inc": {"activities_version": 1, "data_version": 1}}, upsert=True)
+
+
+async def store_activities(athlete_id: int, activity_docs: List[Dict[str, Any]], rollups_built: bool = True) -> Tuple[int, int]:
+    """
+    Upsert normalized activities, writing only new or changed rows.
+
+    Returns (inserted, updated). The rollups are updated incrementally from
+    the (old, new) pairs unless they haven't been built for this athlete yet;
+    personal records always are.
+    """
+    if not activity_docs:
+        return 0, 0
+
+    # Diff against the cached copies so only new or changed rows are written
+    existing = {}
+    cursor = cached_activities.find(
+        {"athlete_id": athlete_id, "strava_id": {"$in": [doc["strava_id"] for doc in activity_docs]}},
+        {"_id": 0, "cached_at": 0, "details": 0, "enrichment": 0}
+    )
+    async for doc in cursor:
+        existing[doc["strava_id"]] = doc
+    changed_docs = [doc for doc in activity_docs if activity_changed(existing.get(doc["strava_id"]), doc)]
+    if not changed_docs:
+        return 0, 0
+
+    result = await cached_activities.bulk_write(
+        [activity_upsert(doc) for doc in changed_docs],
+        ordered=False
+    )
+    changes = [(existing.get(doc["strava_id"]), doc) for doc in changed_docs]
+    if rollups_built:
+        await apply_activity_changes(changes)
+    await apply_record_changes(athlete_id, changes)
+    await bump_activities_version(athlete_id)
+    return result.upserted_count, result.modified_count
+
+
+def _object_id(goal_id: str) -> Optional[ObjectId]:
+    return ObjectId(goal_id) if ObjectId.is_valid(goal_id) else None
+
+
+class MongoRepository(Repository):
+    """
+    The MongoDB backend: strava_accounts, sync_state, cached_activities and goals.
+
+    Activity writes also keep weekly/daily rollups and personal records up
+    to date; weekly totals and goal progress are read from the rollups once
+    they are built. Indexes are created by app.indexes.
+    """
+
+    name = "mongo"
+    derived_data = True
+
+    async def get_account(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        return await strava_accounts.find_one({"athlete_id": athlete_id})
+
+    async def save_account(self, athlete_id: int, fields: Dict[str, Any]):
+        await strava_accounts.update_one({"athlete_id": athlete_id}, {"$set": fields}, upsert=True)
+
+    async def count_accounts(self) -> int:
+        return await strava_accounts.count_documents({})
+
+    async def account_ids(self, expiring_before: Optional[int] = None) -> List[int]:
+        query = {} if expiring_before is None else {"expires_at": {"$lt": expiring_before}}
+        return [account["athlete_id"] async for account in strava_accounts.find(query, {"athlete_id": 1})]
+
+    async def sync_status(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        return await sync_state.find_one({"athlete_id": athlete_id})
+
+    async def record_sync(self, athlete_id: int, high_water_mark: Optional[datetime], synced_at: datetime):
+        await sync_state.update_one(
+            {"athlete_id": athlete_id},
+            {"$set": {"high_water_mark": high_water_mark, "last_synced_at": synced_at}},
+            upsert=True
+        )
+
+    async def synced_since(self, cutoff: datetime) -> Set[int]:
+        return set(await sync_state.distinct("athlete_id", {"last_synced_at": {"$gte": cutoff}}))
+
+    async def data_version(self, athlete_id: int) -> int:
+        state = await sync_state.find_one({"athlete_id": athlete_id}, {"data_version": 1})
+        return (state or {}).get("data_version", 0)
+
+    async def bump_data_version(self, athlete_id: int):
+        await sync_state.update_one({"athlete_id": athlete_id}, {"$inc": {"data_version": 1}}, upsert=True)
+
+    async def store_activities(self, athlete_id: int, activity_docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Upsert activities, then build the athlete's rollups and records if
+        this is the first store since they were introduced.
+        """
+        state = await sync_state.find_one({"athlete_id": athlete_id}, {"rollups_built": 1, "records_built": 1}) or {}
+        inserted, updated = await store_activities(athlete_id, activity_docs, rollups_built=bool(state.get("rollups_built")))
+        built = {}
+        if not state.get("rollups_built"):
+            # Backfill the rollups from the cache
+            await rebuild_rollups(athlete_id)
+            built["rollups_built"] = True
+        if not state.get("records_built"):
+            await rebuild_records(athlete_id)
+            built["records_built"] = True
+        if built:
+            await sync_state.update_one({"athlete_id": athlete_id}, {"$set": built}, upsert=True)
+        return inserted, updated
+
+    async def remove_activity(self, athlete_id: int, strava_id: int) -> bool:
+        """Delete a cached activity and take it out of the rollups and records."""
+        old = await cached_activities.find_one_and_delete(
+            {"athlete_id": athlete_id, "strava_id": strava_id},
+            projection={"_id": 0, "cached_at": 0}
+        )
+        if old is None:
+            return False
+        state = await sync_state.find_one({"athlete_id": athlete_id})
+        if state and state.get("rollups_built"):
+            await apply_activity_changes([(old, None)])
+        await merge_records(athlete_id, [], removed=[(strava_id, old["type"])])
+        await bump_activities_version(athlete_id)
+        return True
+
+    async def activity_page(
+        self,
+        athlete_id: int,
+        unit: str,
+        limit: int,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return await fetch_activity_page(activity_query(athlete_id, before, after, activity_type, cursor), unit, limit)
+
+    def iter_activities(
+        self,
+        athlete_id: int,
+        unit: str,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        return iter_activities(activity_query(athlete_id, before, after, activity_type), unit)
+
+    async def weekly_activities(
+        self, athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        state = await sync_state.find_one({"athlete_id": athlete_id}, {"rollups_built": 1})
+        if state and state.get("rollups_built"):
+            return await read_weekly_rollups(athlete_id, unit, start, end)
+
+        # Rollups are built on the first sync; aggregate the raw activities until then
+        pipeline = weekly_activity_pipeline(athlete_id, unit, start, end)
+        return await cached_activities.aggregate(pipeline).to_list(length=None)
+
+    async def list_goals(self, athlete_id: int) -> List[Dict[str, Any]]:
+        goals_list = []
+        async for goal in goals.find({"user_id": athlete_id}):
+            goal["id"] = str(goal.pop("_id"))
+            goals_list.append(goal)
+        return goals_list
+
+    async def create_goal(self, athlete_id: int, goal: Dict[str, Any]) -> Dict[str, Any]:
+        goal_dict = {**goal, "user_id": athlete_id}
+        await goals.insert_one(goal_dict)
+        await self.bump_data_version(athlete_id)
+        goal_dict["id"] = str(goal_dict.pop("_id"))
+        return goal_dict
+
+    async def update_goal(self, athlete_id: int, goal_id: str, fields: Dict[str, Any]) -> bool:
+        object_id = _object_id(goal_id)
+        if object_id is None:
+            return False
+        result = await goals.update_one({"_id": object_id, "user_id": athlete_id}, {"$set": fields})
+        if result.matched_count == 0:
+            return False
+        await self.bump_data_version(athlete_id)
+        return True
+
+    async def delete_goal(self, athlete_id: int, goal_id: str) -> bool:
+        object_id = _object_id(goal_id)
+        if object_id is None:
+            return False
+        result = await goals.delete_one({"_id": object_id, "user_id": athlete_id})
+        if result.deleted_count == 0:
+            return False
+        await self.bump_data_version(athlete_id)
+        return True
+
+    async def apply_goal_batch(self, batch: GoalBatch, athlete_id: int) -> Dict[str, Any]:
+        """The writes go out as one unordered bulk_write; a failed write doesn't stop the others."""
+        existing = set()
+        goal_ids = batch_goal_ids(batch)
+        if goal_ids:
+            query = {"_id": {"$in": [ObjectId(goal_id) for goal_id in goal_ids]}, "user_id": athlete_id}
+            async for doc in goals.find(query, {"_id": 1}):
+                existing.add(str(doc["_id"]))
+
+        results, writes = plan_goal_batch(batch, athlete_id, existing)
+        operations = []
+        for _, op, goal_id, fields in writes:
+            if op == "create":
+                operations.append(InsertOne({"_id": ObjectId(goal_id), **fields}))
+            elif op == "update":
+                operations.append(UpdateOne({"_id": ObjectId(goal_id), "user_id": athlete_id}, {"$set": fields}))
+            else:
+                operations.append(DeleteOne({"_id": ObjectId(goal_id), "user_id": athlete_id}))
+
+        if operations:
+            try:
+                await goals.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    result = results[writes[error["index"]][0]]
+                    result["status"] = "error"
+                    result["error"] = error.get("errmsg")
+            await self.bump_data_version(athlete_id)
+        return batch_response(results)
+
+    async def goal_progress(self, athlete_id: int, year: int, unit: str) -> List[Dict[str, Any]]:
+        state = await sync_state.find_one({"athlete_id": athlete_id}, {"rollups_built": 1})
+        pipeline = goal_progress_pipeline(athlete_id, year, unit, use_rollups=bool(state and state.get("rollups_built")))
+        return await goals.aggregate(pipeline).to_list(length=None)
+
+    async def claim_unowned_goals(self, athlete_id: int) -> int:
+        claimed = await goals.update_many({"user_id": None}, {"$set": {"user_id": athlete_id}})
+        if claimed.modified_count:
+            await self.bump_data_version(athlete_id)
+        return claimed.modified_count
+
+    async def delete_athlete(self, athlete_id: int):
+        scope = {"athlete_id": athlete_id}
+        await strava_accounts.delete_many(scope)
+        await cached_activities.delete_many(scope)
+        # Only the version counters survive, still counting up
+        state = await sync_state.find_one(scope, {"activities_version": 1, "data_version": 1})
+        if state is not None:
+            await sync_state.replace_one(scope, {
+                "athlete_id": athlete_id,
+                "activities_version": state.get("activities_version", 0) + 1,
+                "data_version": state.get("data_version", 0) + 1,
+            })
+        await weekly_rollups.delete_many(scope)
+        await daily_rollups.delete_many(scope)
+        await personal_records.delete_many(scope)
+        await goals.delete_many({"user_id": athlete_id})
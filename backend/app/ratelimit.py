@@ -0,0 +1,148 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+from app.metrics import observe_rate_limit
+
+# Sync priorities; lower runs first
+INTERACTIVE = 0
+WEBHOOK = 5
+BACKGROUND = 10
+
+# Priority of the Strava calls made in the current task. Request handlers are
+# interactive; the sync scheduler sets this for the jobs it runs.
+current_priority: ContextVar[int] = ContextVar("strava_priority", default=INTERACTIVE)
+
+# Strava's default application limits, used until the first response reports the real ones
+DEFAULT_SHORT_LIMIT = 200
+DEFAULT_DAILY_LIMIT = 2000
+
+# Share of each window that background work leaves for interactive requests
+BACKGROUND_RESERVE = 0.2
+
+SHORT_WINDOW = timedelta(minutes=15)
+
+
+def _parse_pair(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not value:
+        return None
+    try:
+        short, daily = value.split(",")
+        return int(short), int(daily)
+    except ValueError:
+        return None
+
+
+def window_resets(now: datetime) -> Tuple[datetime, datetime]:
+    """
+    Next reset of the 15-minute and daily windows.
+
+    Strava's short windows start on the quarter hour and the daily window at
+    midnight UTC.
+    """
+    short_start = now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0)
+    daily_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return short_start + SHORT_WINDOW, daily_start + timedelta(days=1)
+
+
+class RateLimitBudget:
+    """
+    Tracks the application's Strava request budget.
+
+    Usage comes from the X-RateLimit-* (or the stricter X-ReadRateLimit-*)
+    headers on every response, so the view is shared by all workers even
+    though each process keeps its own copy. Between responses, calls made by
+    this process are counted locally.
+    """
+
+    def __init__(self):
+        self.short_limit = DEFAULT_SHORT_LIMIT
+        self.daily_limit = DEFAULT_DAILY_LIMIT
+        self.short_usage = 0
+        self.daily_usage = 0
+        self.updated_at: Optional[datetime] = None
+        self._short_reset, self._daily_reset = window_resets(datetime.utcnow())
+        self._last_background_call = 0.0
+
+    def _roll_windows(self, now: datetime):
+        if now >= self._short_reset:
+            self.short_usage = 0
+        if now >= self._daily_reset:
+            self.daily_usage = 0
+        self._short_reset, self._daily_reset = window_resets(now)
+
+    def update(self, headers: Dict[str, str]):
+        """Take limits and usage from a Strava response."""
+        limit = _parse_pair(headers.get("X-ReadRateLimit-Limit")) or _parse_pair(headers.get("X-RateLimit-Limit"))
+        usage = _parse_pair(headers.get("X-ReadRateLimit-Usage")) or _parse_pair(headers.get("X-RateLimit-Usage"))
+        if limit:
+            self.short_limit, self.daily_limit = limit
+        if usage:
+            self._roll_windows(datetime.utcnow())
+            self.short_usage, self.daily_usage = usage
+            self.updated_at = datetime.utcnow()
+        observe_rate_limit(self.short_usage, self.daily_usage, self.short_limit, self.daily_limit)
+
+    def mark_exhausted(self):
+        """Strava answered 429: treat the current short window as used up."""
+        self.short_usage = max(self.short_usage, self.short_limit)
+        observe_rate_limit(self.short_usage, self.daily_usage, self.short_limit, self.daily_limit)
+
+    def remaining(self, priority: int = INTERACTIVE) -> Tuple[int, int]:
+        """Calls left in the short and daily windows for work at this priority."""
+        self._roll_windows(datetime.utcnow())
+        reserve = BACKGROUND_RESERVE if priority > INTERACTIVE else 0
+        short = int(self.short_limit * (1 - reserve)) - self.short_usage
+        daily = int(self.daily_limit * (1 - reserve)) - self.daily_usage
+        return short, daily
+
+    def delay(self, priority: int = INTERACTIVE) -> float:
+        """
+        Seconds to wait before the next call at this priority.
+
+        Interactive calls only wait when a window is exhausted. Background
+        calls are also paced so the remaining short-window budget is spread
+        evenly over what is left of the window instead of being burst.
+        """
+        now = datetime.utcnow()
+        short, daily = self.remaining(priority)
+        if daily <= 0:
+            return (self._daily_reset - now).total_seconds()
+        if short <= 0:
+            return (self._short_reset - now).total_seconds()
+        if priority == INTERACTIVE:
+            return 0.0
+        interval = (self._short_reset - now).total_seconds() / short
+        return max(0.0, self._last_background_call + interval - time.monotonic())
+
+    async def acquire(self, priority: Optional[int] = None):
+        """Wait until a call at this priority fits the budget, then count it."""
+        if priority is None:
+            priority = current_priority.get()
+        while True:
+            wait = self.delay(priority)
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, 60))
+        self.short_usage += 1
+        self.daily_usage += 1
+        if priority > INTERACTIVE:
+            self._last_background_call = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        short, daily = self.remaining()
+        return {
+            "short_limit": self.short_limit,
+            "short_usage": self.short_usage,
+            "short_remaining": short,
+            "short_resets_at": self._short_reset,
+            "daily_limit": self.daily_limit,
+            "daily_usage": self.daily_usage,
+            "daily_remaining": daily,
+            "daily_resets_at": self._daily_reset,
+            "updated_at": self.updated_at,
+        }
+
+
+budget = RateLimitBudget()
@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+from app.aggregations import distance_factor
+from app.database import cached_activities, activity_streams, personal_records
+
+# Whole-activity records (name -> cached_activities field); larger is better
+ACTIVITY_RECORDS = {
+    "longest": "distance",
+    "longest_time": "moving_time",
+    "biggest_climb": "total_elevation_gain",
+}
+
+# Best-effort distances in meters, named as in Strava's best_efforts; the
+# fastest elapsed time wins
+BEST_EFFORTS = {
+    "400m": 400,
+    "1/2 mile": 804.672,
+    "1k": 1000,
+    "1 mile": 1609.344,
+    "2 mile": 3218.688,
+    "5k": 5000,
+    "10k": 10000,
+    "15k": 15000,
+    "10 mile": 16093.44,
+    "20k": 20000,
+    "Half-Marathon": 21097.5,
+    "30k": 30000,
+    "Marathon": 42195,
+}
+
+RECORD_PROJECTION = {
+    "_id": 0, "strava_id": 1, "type": 1, "start_date": 1,
+    **{field: 1 for field in ACTIVITY_RECORDS.values()},
+    "details.best_efforts.name": 1, "details.best_efforts.elapsed_time": 1,
+}
+
+# An activity's candidate values: {"strava_id", "type", "start_date",
+# "records": {name: value}, "efforts": {name: seconds}}
+Candidate = Dict[str, Any]
+
+
+def stream_efforts(time: np.ndarray, distance: np.ndarray) -> Dict[str, float]:
+    """
+    Fastest elapsed time over each BEST_EFFORTS distance, from time and distance streams.
+
+    For every sample the first sample at least the target distance further
+    on is found with one searchsorted, and the crossing time is interpolated
+    between it and the sample before.
+    """
+    length = min(len(time), len(distance))
+    time = np.asarray(time[:length], dtype=np.float64)
+    distance = np.asarray(distance[:length], dtype=np.float64)
+    # Null samples (NaN) are skipped
+    present = ~(np.isnan(time) | np.isnan(distance))
+    time, distance = time[present], distance[present]
+    length = len(time)
+    # GPS distance can step back slightly; searchsorted needs it sorted
+    distance = np.maximum.accumulate(distance)
+    efforts = {}
+    for name, meters in BEST_EFFORTS.items():
+        if length < 2 or distance[-1] - distance[0] < meters:
+            break
+        target = distance + meters
+        end = np.searchsorted(distance, target)
+        start = np.nonzero(end < length)[0]
+        end = end[start]
+        # distance[end - 1] < target <= distance[end]
+        fraction = (target[start] - distance[end - 1]) / (distance[end] - distance[end - 1])
+        crossing = time[end - 1] + fraction * (time[end] - time[end - 1])
+        efforts[name] = round(float((crossing - time[start]).min()), 1)
+    return efforts
+
+
+def detail_efforts(best_efforts: Optional[List[Dict[str, Any]]]) -> Dict[str, float]:
+    """Strava's own best efforts from a detailed activity, by name."""
+    efforts = {}
+    for effort in best_efforts or []:
+        if effort.get("name") in BEST_EFFORTS and effort.get("elapsed_time"):
+            efforts[effort["name"]] = effort["elapsed_time"]
+    return efforts
+
+
+def activity_candidate(doc: Dict[str, Any], efforts: Optional[Dict[str, float]] = None) -> Candidate:
+    """Candidate values of a cached activity, plus any best efforts found elsewhere (e.g. its streams)."""
+    candidate = {
+        "strava_id": doc["strava_id"],
+        "type": doc["type"],
+        "start_date": doc["start_date"],
+        "records": {name: doc[field] for name, field in ACTIVITY_RECORDS.items() if doc.get(field)},
+        "efforts": detail_efforts((doc.get("details") or {}).get("best_efforts")),
+    }
+    for name, seconds in (efforts or {}).items():
+        if seconds < candidate["efforts"].get(name, float("inf")):
+            candidate["efforts"][name] = seconds
+    return candidate
+
+
+def efforts_candidate(doc: Dict[str, Any], efforts: Dict[str, float]) -> Candidate:
+    """Candidate carrying only best efforts, for an activity whose summary values are already counted."""
+    return {"strava_id": doc["strava_id"], "type": doc["type"], "start_date": doc["start_date"], "efforts": efforts}
+
+
+def _better(section: str, value: float, current: float) -> bool:
+    return value > current if section == "records" else value < current
+
+
+def merge_candidate(doc: Dict[str, Any], candidate: Candidate) -> Tuple[Dict[str, Dict[str, Any]], bool]:
+    """
+    Merge a candidate into a personal_records document in place.
+
+    Returns the changed entries by field path, and whether the document went
+    stale: the candidate is the current holder of a record and its value
+    got worse (or, for summary records, dropped to 0 or went missing), so
+    another activity may hold that record now.
+    """
+    changed = {}
+    stale = False
+    for section in ("records", "efforts"):
+        entries = doc.setdefault(section, {})
+        for name, value in (candidate.get(section) or {}).items():
+            held = entries.get(name)
+            if held is not None and held["strava_id"] == candidate["strava_id"] and _better(section, held["value"], value):
+                stale = True
+            elif held is None or _better(section, value, held["value"]) or (
+                # Ties go to whoever set the record first, whatever order activities arrive in
+                value == held["value"] and candidate["start_date"] < held["start_date"]
+            ):
+                entries[name] = {"value": value, "strava_id": candidate["strava_id"], "start_date": candidate["start_date"]}
+                changed[f"{section}.{name}"] = entries[name]
+    if "records" in candidate:
+        # Zero values aren't candidates, so an edited-down holder shows up as a missing one
+        for name, held in doc["records"].items():
+            if held["strava_id"] == candidate["strava_id"] and not candidate["records"].get(name):
+                stale = True
+    return changed, stale
+
+
+def _holds_record(doc: Dict[str, Any], strava_id: int) -> bool:
+    return any(
+        entry["strava_id"] == strava_id
+        for section in ("records", "efforts")
+        for entry in (doc.get(section) or {}).values()
+    )
+
+
+async def merge_records(athlete_id: int, candidates: List[Candidate], removed: Iterable[Tuple[int, str]] = ()):
+    """
+    Update an athlete's records with new or changed activities.
+
+    `removed` lists (strava_id, type) pairs that no longer count under that
+    type (deleted or retyped activities). Usually this is one read of the
+    affected types and one bulk_write of the improved entries; a type whose
+    record holder was removed or got worse is rebuilt from its activities.
+    """
+    removed = list(removed)
+    types = {candidate["type"] for candidate in candidates} | {activity_type for _, activity_type in removed}
+    if not types:
+        return
+
+    current = {}
+    async for doc in personal_records.find({"athlete_id": athlete_id, "type": {"$in": list(types)}}):
+        current[doc["type"]] = doc
+
+    stale = {activity_type for strava_id, activity_type in removed
+             if activity_type in current and _holds_record(current[activity_type], strava_id)}
+    changes: Dict[str, Dict[str, Any]] = {}
+    for candidate in candidates:
+        doc = current.setdefault(candidate["type"], {})
+        changed, went_stale = merge_candidate(doc, candidate)
+        changes.setdefault(candidate["type"], {}).update(changed)
+        if went_stale:
+            stale.add(candidate["type"])
+
+    requests = [
+        UpdateOne(
+            {"athlete_id": athlete_id, "type": activity_type},
+            {"$set": {**changed, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        for activity_type, changed in changes.items()
+        if changed and activity_type not in stale
+    ]
+    if requests:
+        await personal_records.bulk_write(requests, ordered=False)
+    for activity_type in stale:
+        await rebuild_records(athlete_id, activity_type)
+
+
+async def apply_record_changes(athlete_id: int, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+    """Apply inserted, changed or deleted activities ((old, new) pairs, as for the rollups) to the records."""
+    candidates = [activity_candidate(new) for _, new in changes if new is not None]
+    removed = [
+        (old["strava_id"], old["type"]) for old, new in changes
+        if old is not None and (new is None or new["type"] != old["type"])
+    ]
+    await merge_records(athlete_id, candidates, removed)
+
+
+async def rebuild_records(athlete_id: int, activity_type: Optional[str] = None):
+    """Recompute an athlete's records (of one type, or all) from cached activities and stored stream efforts."""
+    scope = {"athlete_id": athlete_id}
+    if activity_type is not None:
+        scope["type"] = activity_type
+
+    efforts = {}
+    async for doc in activity_streams.find({"athlete_id": athlete_id, "efforts": {"$exists": True}}, {"_id": 0, "strava_id": 1, "efforts": 1}):
+        efforts[doc["strava_id"]] = doc["efforts"]
+
+    docs: Dict[str, Dict[str, Any]] = {}
+    async for activity in cached_activities.find(scope, RECORD_PROJECTION):
+        merge_candidate(docs.setdefault(activity["type"], {}), activity_candidate(activity, efforts.get(activity["strava_id"])))
+
+    rebuilt_at = datetime.utcnow()
+    requests = [
+        ReplaceOne(
+            {"athlete_id": athlete_id, "type": record_type},
+            {"athlete_id": athlete_id, "type": record_type, **doc, "updated_at": rebuilt_at},
+            upsert=True
+        )
+        for record_type, doc in docs.items()
+    ]
+    if requests:
+        await personal_records.bulk_write(requests, ordered=False)
+    # Types the athlete no longer has any activities of
+    if activity_type is None:
+        await personal_records.delete_many({"athlete_id": athlete_id, "type": {"$nin": list(docs)}})
+    elif not docs:
+        await personal_records.delete_one(scope)
+
+
+def records_view(doc: Dict[str, Any], unit: str) -> Dict[str, Any]:
+    """A personal_records document in the /api/records shape, distances in `unit`."""
+    factor = distance_factor(unit)
+    records = {}
+    for name, entry in (doc.get("records") or {}).items():
+        field = ACTIVITY_RECORDS[name]
+        value = entry["value"] * factor if field == "distance" else entry["value"]
+        records[name] = {"strava_id": entry["strava_id"], "start_date": entry["start_date"], field: value}
+    efforts = {
+        name: {"strava_id": entry["strava_id"], "start_date": entry["start_date"], "elapsed_time": entry["value"]}
+        for name, entry in sorted((doc.get("efforts") or {}).items(), key=lambda item: BEST_EFFORTS.get(item[0], 0))
+    }
+    return {"type": doc["type"], "records": records, "efforts": efforts}
+
+
+async def rebuild_all_records(athlete_id: Optional[int] = None):
+    athlete_ids = [athlete_id] if athlete_id is not None else await cached_activities.distinct("athlete_id")
+    for athlete in athlete_ids:
+        await rebuild_records(athlete)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the personal records index.")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute records from cached activities and streams")
+    parser.add_argument("--athlete", type=int, help="Only rebuild this athlete's records")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild_all_records(args.athlete))
+    print("Records rebuilt")
+
+
+if __name__ == "__main__":
+    main()
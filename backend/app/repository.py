@@ -0,0 +1,165 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+from app.models import GoalBatch
+
+
+def activity_changed(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> bool:
+    """Whether a freshly fetched activity differs from its cached copy."""
+    if old is None:
+        return True
+    return any(old.get(k) != v for k, v in new.items() if k != "cached_at")
+
+
+class Repository(ABC):
+    """
+    Storage for accounts, sync state, activities and goals.
+
+    Handlers, the sync and the session/token caches go through this
+    interface, so the same API runs on either backend. Every write that
+    changes what an athlete sees bumps their data_version.
+
+    Rollups, personal records, streams, activity details, analytics and
+    imports are only kept by backends with derived_data set; the sync job
+    queue and leases stay in MongoDB either way.
+    """
+
+    name = "base"
+    derived_data = False
+
+    async def init(self):
+        """Prepare the storage (schema, indexes) before serving traffic."""
+
+    async def close(self):
+        pass
+
+    # Accounts
+
+    @abstractmethod
+    async def get_account(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        """The athlete's strava_accounts document (athlete_id, encrypted tokens, expires_at)."""
+
+    @abstractmethod
+    async def save_account(self, athlete_id: int, fields: Dict[str, Any]):
+        """Create the account or update the given fields of it."""
+
+    @abstractmethod
+    async def count_accounts(self) -> int:
+        ...
+
+    @abstractmethod
+    async def account_ids(self, expiring_before: Optional[int] = None) -> List[int]:
+        """Every connected athlete, or those whose token expires before the given epoch second."""
+
+    # Sync state
+
+    @abstractmethod
+    async def sync_status(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        """high_water_mark, last_synced_at and data_version, or None for an athlete never seen."""
+
+    @abstractmethod
+    async def record_sync(self, athlete_id: int, high_water_mark: Optional[datetime], synced_at: datetime):
+        ...
+
+    @abstractmethod
+    async def synced_since(self, cutoff: datetime) -> Set[int]:
+        """Athletes whose last sync was at or after cutoff."""
+
+    @abstractmethod
+    async def data_version(self, athlete_id: int) -> int:
+        """The athlete's data version; it goes up whenever their activities or goals change."""
+
+    @abstractmethod
+    async def bump_data_version(self, athlete_id: int):
+        """Mark the athlete's data as changed, so ETags and cached responses issued before no longer match."""
+
+    # Activities
+
+    @abstractmethod
+    async def store_activities(self, athlete_id: int, activity_docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """Upsert normalized activities, writing only new or changed rows; returns (inserted, updated)."""
+
+    @abstractmethod
+    async def remove_activity(self, athlete_id: int, strava_id: int) -> bool:
+        ...
+
+    @abstractmethod
+    async def activity_page(
+        self,
+        athlete_id: int,
+        unit: str,
+        limit: int,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of activities in [after, before), newest first, and the cursor of the next page."""
+
+    @abstractmethod
+    def iter_activities(
+        self,
+        athlete_id: int,
+        unit: str,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Every matching activity, newest first, read in batches."""
+
+    @abstractmethod
+    async def weekly_activities(
+        self, athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Totals per ISO week and activity type, oldest week first, shaped like
+        {"week": "2024-W5", "weekNumber": 5, "year": 2024,
+         "activities": {"Run": {"distance": ..., "moving_time": ..., "count": ...}}}
+        """
+
+    # Goals
+
+    @abstractmethod
+    async def list_goals(self, athlete_id: int) -> List[Dict[str, Any]]:
+        """The athlete's goals as stored, each with its id as a string."""
+
+    @abstractmethod
+    async def create_goal(self, athlete_id: int, goal: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+    @abstractmethod
+    async def update_goal(self, athlete_id: int, goal_id: str, fields: Dict[str, Any]) -> bool:
+        """False if the athlete has no goal with that id."""
+
+    @abstractmethod
+    async def delete_goal(self, athlete_id: int, goal_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def apply_goal_batch(self, batch: GoalBatch, athlete_id: int) -> Dict[str, Any]:
+        """
+        Apply one athlete's creates, updates and deletes together.
+
+        Returns one result per item, in request order (creates, then updates,
+        then deletes), with a status of created, updated, deleted, not_found,
+        invalid_id or error, plus counts per status.
+        """
+
+    @abstractmethod
+    async def goal_progress(self, athlete_id: int, year: int, unit: str) -> List[Dict[str, Any]]:
+        """Every goal with the athlete's totals for its ISO week of `year` and its activity type."""
+
+    @abstractmethod
+    async def claim_unowned_goals(self, athlete_id: int) -> int:
+        """Give goals created before sessions existed to the athlete; returns how many."""
+
+    # Lifecycle
+
+    @abstractmethod
+    async def delete_athlete(self, athlete_id: int):
+        """
+        Delete the athlete's account, activities, goals and sync state.
+
+        The data_version survives, still counting up, so caches and ETags
+        from before a reconnect can't match the new data.
+        """
@@ -0,0 +1,111 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+from app.metrics import cache_event
+from app.responses import dumps
+
+# Memory for encoded response bodies per process; bodies larger than a
+# quarter of it are served but not kept
+RESPONSE_CACHE_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+
+# Clients may keep responses but must revalidate them (If-None-Match) before reuse
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(athlete_id: int, version: int, key: str) -> str:
+    """Strong ETag for a request: the data version plus a digest of who asked for what."""
+    digest = hashlib.blake2b(f"{athlete_id}|{key}".encode(), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def request_key(request: Request) -> str:
+    """Path plus query parameters in a canonical order, so reordered URLs share an entry."""
+    return request.url.path + "?" + "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+
+
+class ResponseCache:
+    """
+    Per-process LRU of encoded JSON bodies, bounded by their total size.
+
+    Entries are keyed by athlete and request and carry the data version
+    they were built at; a newer version replaces the entry, so only the
+    latest body per request is kept.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[int, str], tuple]" = OrderedDict()
+
+    def get(self, athlete_id: int, key: str, version: int) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        entry = self._entries.get((athlete_id, key))
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end((athlete_id, key))
+        return entry[1], entry[2]
+
+    def put(self, athlete_id: int, key: str, version: int, body: bytes, headers: Dict[str, str]):
+        self._discard((athlete_id, key))
+        if len(body) > self.max_bytes // 4:
+            return
+        self._entries[(athlete_id, key)] = (version, body, headers)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, entry_key: Tuple[int, str]):
+        entry = self._entries.pop(entry_key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def invalidate(self, athlete_id: Optional[int] = None):
+        for entry_key in [k for k in self._entries if athlete_id is None or k[0] == athlete_id]:
+            self._discard(entry_key)
+
+
+response_cache = ResponseCache()
+
+
+async def conditional_response(
+    request: Request,
+    athlete_id: int,
+    version: int,
+    build: Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Answer a GET from the athlete's data version.
+
+    A matching If-None-Match gets a 304 without building anything. Otherwise
+    the encoded body is served from the cache, or `build` is awaited for the
+    content and the headers that belong with it (e.g. X-Next-Cursor), which
+    are cached together. `headers` are added as they are, uncached.
+    """
+    key = request_key(request)
+    etag = make_etag(athlete_id, version, key)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache_event("responses", "not_modified")
+        return Response(status_code=304, headers=headers)
+
+    cached = response_cache.get(athlete_id, key, version)
+    if cached is not None:
+        cache_event("responses", "hit")
+        body, content_headers = cached
+    else:
+        cache_event("responses", "miss")
+        content, content_headers = await build()
+        body = dumps(content)
+        response_cache.put(athlete_id, key, version, body, content_headers)
+    return Response(body, media_type="application/json", headers={**content_headers, **headers})
@@ -0,0 +1,51 @@
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# NDJSON lines encoded per chunk written to the socket
+NDJSON_BATCH_SIZE = 200
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any, option: int = 0) -> bytes:
+    """Encode with orjson; datetimes come out in isoformat, ObjectIds as strings and NumPy arrays as lists."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | option)
+
+
+class MongoJSONResponse(JSONResponse):
+    """
+    JSON response encoded by orjson.
+
+    Endpoints that return this directly skip FastAPI's jsonable_encoder pass,
+    so Mongo documents are walked once, by the encoder itself.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+async def ndjson_lines(docs: AsyncIterable[Dict[str, Any]], batch_size: int = NDJSON_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Encode documents as newline-delimited JSON, a batch of lines per chunk."""
+    batch = []
+    async for doc in docs:
+        batch.append(dumps(doc, orjson.OPT_APPEND_NEWLINE))
+        if len(batch) >= batch_size:
+            yield b"".join(batch)
+            batch = []
+    if batch:
+        yield b"".join(batch)
+
+
+class NDJSONResponse(StreamingResponse):
+    """Stream documents as they come off a cursor, one JSON object per line."""
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, docs: AsyncIterable[Dict[str, Any]], **kwargs):
+        super().__init__(ndjson_lines(docs), **kwargs)
@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import UpdateOne
+from app.database import cached_activities, weekly_rollups, daily_rollups
+from app.aggregations import distance_factor, whole_weeks
+
+# Summed per (athlete_id, period, type); "count" is added alongside
+ROLLUP_FIELDS = ("distance", "moving_time", "total_elevation_gain")
+
+
+def week_period(start_date: datetime) -> Dict[str, Any]:
+    """Weekly rollup key fields for an activity start date."""
+    iso = start_date.isocalendar()
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return {
+        "period": f"{iso.year}-W{iso.week}",
+        "year": iso.year,
+        "weekNumber": iso.week,
+        "week_start": day - timedelta(days=iso.weekday - 1),
+    }
+
+
+def day_period(start_date: datetime) -> Dict[str, Any]:
+    """Daily rollup key fields for an activity start date."""
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return {"period": day.date().isoformat(), "date": day}
+
+
+def rollup_deltas(changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]) -> Dict[tuple, Dict[str, Any]]:
+    """
+    Turn (old, new) activity pairs into per-rollup increments.
+
+    old is None for an insert and new is None for a delete; a change that
+    moves an activity to another week or type decrements the old rollup and
+    increments the new one.
+    """
+    deltas = {}
+    for old, new in changes:
+        for sign, activity in ((-1, old), (1, new)):
+            if activity is None:
+                continue
+            for collection, key_fields in (
+                (weekly_rollups, week_period(activity["start_date"])),
+                (daily_rollups, day_period(activity["start_date"])),
+            ):
+                key = (collection.name, activity["athlete_id"], key_fields["period"], activity["type"])
+                if key not in deltas:
+                    deltas[key] = {"key_fields": key_fields, "inc": dict.fromkeys(ROLLUP_FIELDS, 0) | {"count": 0}}
+                inc = deltas[key]["inc"]
+                for field in ROLLUP_FIELDS:
+                    inc[field] += sign * activity.get(field, 0)
+                inc["count"] += sign
+    return deltas
+
+
+async def apply_activity_changes(changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+    """Apply inserted, changed or deleted activities to the rollups with $inc upserts."""
+    requests = {weekly_rollups.name: [], daily_rollups.name: []}
+    athlete_ids = set()
+    for (collection_name, athlete_id, period, activity_type), delta in rollup_deltas(changes).items():
+        if not any(delta["inc"].values()):
+            continue
+        athlete_ids.add(athlete_id)
+        requests[collection_name].append(UpdateOne(
+            {"athlete_id": athlete_id, "period": period, "type": activity_type},
+            {"$inc": delta["inc"], "$setOnInsert": {k: v for k, v in delta["key_fields"].items() if k != "period"}},
+            upsert=True
+        ))
+
+    for collection in (weekly_rollups, daily_rollups):
+        if requests[collection.name]:
+            await collection.bulk_write(requests[collection.name], ordered=False)
+            # Periods whose last activity was removed or moved away
+            await collection.delete_many({"athlete_id": {"$in": list(athlete_ids)}, "count": {"$lte": 0}})
+
+
+def _rollup_totals(rollup: Dict[str, Any], factor: float) -> Dict[str, Any]:
+    return {
+        "distance": rollup["distance"] * factor,
+        "moving_time": rollup["moving_time"],
+        "count": rollup["count"],
+    }
+
+
+async def read_weekly_rollups(athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Weekly totals in the /api/activities/weekly shape, read from weekly_rollups.
+
+    Weeks overlapping [start, end) are returned whole.
+    """
+    query = {"athlete_id": athlete_id}
+    week_filter = {}
+    start, end = whole_weeks(start, end)
+    if start is not None:
+        week_filter["$gte"] = start
+    if end is not None:
+        week_filter["$lt"] = end
+    if week_filter:
+        query["week_start"] = week_filter
+
+    factor = distance_factor(unit)
+    weeks = {}
+    async for rollup in weekly_rollups.find(query).sort("week_start", 1):
+        if rollup["period"] not in weeks:
+            weeks[rollup["period"]] = {
+                "week": rollup["period"],
+                "weekNumber": rollup["weekNumber"],
+                "year": rollup["year"],
+                "activities": {},
+            }
+        weeks[rollup["period"]]["activities"][rollup["type"]] = _rollup_totals(rollup, factor)
+    return list(weeks.values())
+
+
+async def read_daily_rollups(athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Per-day totals for calendar views, read from daily_rollups."""
+    query = {"athlete_id": athlete_id}
+    date_filter = {}
+    if start is not None:
+        date_filter["$gte"] = start
+    if end is not None:
+        date_filter["$lt"] = end
+    if date_filter:
+        query["date"] = date_filter
+
+    factor = distance_factor(unit)
+    days = {}
+    async for rollup in daily_rollups.find(query).sort("date", 1):
+        if rollup["period"] not in days:
+            days[rollup["period"]] = {"date": rollup["period"], "activities": {}}
+        days[rollup["period"]]["activities"][rollup["type"]] = _rollup_totals(rollup, factor)
+    return list(days.values())
+
+
+def _rollup_group_stage(period_fields: Dict[str, Any]) -> Dict[str, Any]:
+    group = {
+        "_id": {"athlete_id": "$athlete_id", "period": period_fields["period"], "type": "$type"},
+        "count": {"$sum": 1},
+    }
+    for field in ROLLUP_FIELDS:
+        group[field] = {"$sum": f"${field}"}
+    for name, expression in period_fields.items():
+        if name != "period":
+            group[name] = {"$first": expression}
+    return {"$group": group}
+
+
+def rebuild_pipeline(collection_name: str, athlete_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Aggregation that recomputes a rollup collection from cached_activities and merges it in place."""
+    if collection_name == weekly_rollups.name:
+        period_fields = {
+            "period": {"$concat": [
+                {"$toString": {"$isoWeekYear": "$start_date"}}, "-W", {"$toString": {"$isoWeek": "$start_date"}}
+            ]},
+            "year": {"$isoWeekYear": "$start_date"},
+            "weekNumber": {"$isoWeek": "$start_date"},
+            "week_start": {"$dateFromParts": {
+                "isoWeekYear": {"$isoWeekYear": "$start_date"},
+                "isoWeek": {"$isoWeek": "$start_date"},
+                "isoDayOfWeek": 1,
+            }},
+        }
+    else:
+        period_fields = {
+            "period": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_date"}},
+            "date": {"$dateFromParts": {
+                "year": {"$year": "$start_date"},
+                "month": {"$month": "$start_date"},
+                "day": {"$dayOfMonth": "$start_date"},
+            }},
+        }
+
+    pipeline = []
+    if athlete_id is not None:
+        pipeline.append({"$match": {"athlete_id": athlete_id}})
+    pipeline.append(_rollup_group_stage(period_fields))
+    project = {"_id": 0, "athlete_id": "$_id.athlete_id", "period": "$_id.period", "type": "$_id.type"}
+    project.update({name: 1 for name in list(ROLLUP_FIELDS) + ["count"] + [f for f in period_fields if f != "period"]})
+    pipeline.append({"$project": project})
+    pipeline.append({"$merge": {
+        "into": collection_name,
+        "on": ["athlete_id", "period", "type"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert",
+    }})
+    return pipeline
+
+
+async def rebuild_rollups(athlete_id: Optional[int] = None):
+    """Recompute weekly and daily rollups from cached_activities (all athletes if athlete_id is None)."""
+    scope = {} if athlete_id is None else {"athlete_id": athlete_id}
+    for collection in (weekly_rollups, daily_rollups):
+        await collection.delete_many(scope)
+        await cached_activities.aggregate(rebuild_pipeline(collection.name, athlete_id), allowDiskUse=True).to_list(length=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the weekly and daily activity rollups.")
+    parser.add_argument("command", choices=["rebuild"], help="rebuild: recompute rollups from cached activities")
+    parser.add_argument("--athlete", type=int, help="Only rebuild this athlete's rollups")
+    args = parser.parse_args()
+
+    asyncio.run(rebuild_rollups(args.athlete))
+    print("Rollups rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from app.database import sync_jobs
+from app.leases import WORKER_ID
+from app.models import SyncJob
+from app.ratelimit import budget, WEBHOOK, BACKGROUND
+
+# A running job whose worker stops heartbeating is handed to another worker after this long
+JOB_LEASE_SECONDS = 60
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 30
+
+# How often wait() re-reads a job that may be running in another process
+WAIT_POLL_SECONDS = 0.25
+
+
+def job_document(job: SyncJob) -> Dict[str, Any]:
+    doc = job.model_dump(exclude={"id"})
+    doc["_id"] = job.id
+    return doc
+
+
+def job_from_document(doc: Dict[str, Any]) -> SyncJob:
+    return SyncJob(id=doc["_id"], **{k: v for k, v in doc.items() if k != "_id"})
+
+
+class SyncScheduler:
+    """
+    Mongo-backed priority queue of sync jobs.
+
+    Any process can enqueue; the worker pool (app/worker.py) claims jobs in
+    (priority, run_after) order, so interactive refreshes run before
+    background revalidations. Partial unique indexes keep at most one
+    queued sync per athlete and one queued event job per activity. A
+    claimed job carries a lease that its worker heartbeats; if the worker
+    dies the job is claimed again.
+    """
+
+    async def enqueue(self, athlete_id: int, priority: int = BACKGROUND, full: bool = False) -> SyncJob:
+        """
+        Queue a sync for an athlete and return its job.
+
+        Asking again while a job is queued returns that job, raising its
+        priority (or making it a full sync). Background requests are dropped
+        while a sync for the athlete is already running.
+        """
+        if priority >= BACKGROUND:
+            running = await sync_jobs.find_one({"athlete_id": athlete_id, "kind": "sync", "status": "running"})
+            if running is not None:
+                return job_from_document(running)
+
+        job = SyncJob(athlete_id=athlete_id, priority=priority, full=full)
+        raise_to = {"priority": priority}
+        if priority < BACKGROUND:
+            # Interactive requests also skip any retry backoff of the queued job
+            raise_to["run_after"] = job.run_after
+        on_insert = {
+            k: v for k, v in job_document(job).items()
+            if k not in ("athlete_id", "kind", "status", "full") and k not in raise_to
+        }
+        for _ in range(2):
+            try:
+                doc = await sync_jobs.find_one_and_update(
+                    {"athlete_id": athlete_id, "kind": "sync", "status": "queued"},
+                    {
+                        "$min": raise_to,
+                        "$max": {"full": full},
+                        "$setOnInsert": on_insert,
+                    },
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return job_from_document(doc)
+            except DuplicateKeyError:
+                # Lost an insert race with another process; the second pass updates its job
+                continue
+        raise RuntimeError(f"Could not enqueue sync for athlete {athlete_id}")
+
+    async def enqueue_event(self, athlete_id: int, kind: str, strava_id: Optional[int] = None, aspect: Optional[str] = None, priority: int = WEBHOOK) -> SyncJob:
+        """
+        Queue a single-object job, e.g. from a webhook event.
+
+        Events for the same activity collapse into one queued job carrying
+        the latest aspect, so an edit storm costs one Strava fetch.
+        """
+        job = SyncJob(athlete_id=athlete_id, priority=priority, kind=kind, strava_id=strava_id, aspect=aspect)
+        on_insert = {
+            k: v for k, v in job_document(job).items()
+            if k not in ("athlete_id", "kind", "strava_id", "status", "aspect")
+        }
+        for _ in range(2):
+            try:
+                doc = await sync_jobs.find_one_and_update(
+                    {"athlete_id": athlete_id, "kind": kind, "strava_id": strava_id, "status": "queued"},
+                    {"$set": {"aspect": aspect}, "$setOnInsert": on_insert},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                return job_from_document(doc)
+            except DuplicateKeyError:
+                continue
+        raise RuntimeError(f"Could not enqueue {kind} job for athlete {athlete_id}")
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        doc = await sync_jobs.find_one({"_id": job_id})
+        if doc is None:
+            return None
+        doc["id"] = doc.pop("_id")
+        return doc
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for a job to finish, then return its record."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            job = await self.get_job(job_id)
+            if job is None or job["status"] in ("done", "failed") or loop.time() >= deadline:
+                return job
+            await asyncio.sleep(WAIT_POLL_SECONDS)
+
+    async def claim(self, worker: str = WORKER_ID) -> Optional[SyncJob]:
+        """Claim the next runnable job, including running jobs whose lease has expired."""
+        now = datetime.utcnow()
+        doc = await sync_jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": worker,
+                    "started_at": now,
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", 1), ("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        return job_from_document(doc) if doc else None
+
+    async def heartbeat(self, job: SyncJob) -> bool:
+        """Extend a running job's lease; False means the job was taken over."""
+        result = await sync_jobs.update_one(
+            {"_id": job.id, "worker": job.worker, "status": "running"},
+            {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)}}
+        )
+        return result.matched_count == 1
+
+    async def complete(self, job: SyncJob, result: Optional[Dict[str, Any]]):
+        await sync_jobs.update_one(
+            {"_id": job.id, "worker": job.worker},
+            {"$set": {"status": "done", "finished_at": datetime.utcnow(), "result": result, "error": None}}
+        )
+
+    async def fail(self, job: SyncJob, error: str):
+        await sync_jobs.update_one(
+            {"_id": job.id, "worker": job.worker},
+            {"$set": {"status": "failed", "finished_at": datetime.utcnow(), "error": error}}
+        )
+
+    async def retry(self, job: SyncJob, error: str, delay: Optional[float] = None, count_attempt: bool = True):
+        """
+        Put a failed job back in the queue, or mark it failed once it is out of attempts.
+
+        Rate-limited jobs pass count_attempt=False: running out of quota is
+        not the job's fault.
+        """
+        if count_attempt and job.attempts >= MAX_ATTEMPTS:
+            await self.fail(job, error)
+            return
+
+        update = {"$set": {"error": error, "worker": None, "lease_expires_at": None}}
+        if not count_attempt:
+            update["$inc"] = {"attempts": -1}
+
+        if delay is None:
+            delay = RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        update["$set"].update({"status": "queued", "run_after": datetime.utcnow() + timedelta(seconds=delay)})
+        try:
+            await sync_jobs.update_one({"_id": job.id, "worker": job.worker}, update)
+        except DuplicateKeyError:
+            # A newer job for the athlete was queued meanwhile and will do the work
+            if job.kind == "sync":
+                # Hand it this job's priority and full flag so neither is lost
+                await sync_jobs.update_one(
+                    {"athlete_id": job.athlete_id, "kind": "sync", "status": "queued"},
+                    {"$min": {"priority": job.priority}, "$max": {"full": job.full}}
+                )
+            await self.fail(job, error)
+
+    async def status(self) -> Dict[str, Any]:
+        return {
+            "budget": budget.snapshot(),
+            "queue_depth": await sync_jobs.count_documents({"status": "queued"}),
+            "running": await sync_jobs.count_documents({"status": "running"}),
+        }
+
+
+scheduler = SyncScheduler()
@@ -0,0 +1,159 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import orjson
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, Response
+from app.metrics import cache_event
+from app.storage import repository
+
+load_dotenv()
+
+SESSION_COOKIE = "strive_session"
+OAUTH_STATE_COOKIE = "strive_oauth_state"
+
+SESSION_MAX_AGE_SECONDS = int(os.getenv("SESSION_MAX_AGE_DAYS", "30")) * 24 * 3600
+OAUTH_STATE_MAX_AGE_SECONDS = 10 * 60
+
+# Key for signing session cookies. Without SESSION_SECRET one is derived from
+# ENCRYPTION_KEY, so every worker signs and verifies with the same key.
+SESSION_SECRET = (os.getenv("SESSION_SECRET") or "").encode() or hashlib.sha256(
+    b"strive-session:" + os.getenv("ENCRYPTION_KEY", "").encode()
+).digest()
+
+# Cookies are only sent over HTTPS when the frontend is served over HTTPS
+SESSION_COOKIE_SECURE = (os.getenv("FRONTEND_URL") or "").startswith("https://")
+# "lax" works while the frontend and API share a site (e.g. both on localhost);
+# an API on another site needs "none", which browsers only accept over HTTPS
+SESSION_COOKIE_SAMESITE = os.getenv("SESSION_COOKIE_SAMESITE", "lax")
+
+# Accounts resolved from sessions are kept this long per process; a
+# deauthorized athlete is also dropped right away by forget_athlete
+ACCOUNT_CACHE_SECONDS = 60
+ACCOUNT_CACHE_SIZE = 4096
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _signature(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode(), hashlib.sha256).digest())
+
+
+def sign_session(athlete_id: int, issued_at: Optional[int] = None) -> str:
+    """Session cookie value: the athlete id and issue time, HMAC-signed."""
+    payload = _b64encode(orjson.dumps({"athlete_id": athlete_id, "iat": issued_at or int(time.time())}))
+    return f"{payload}.{_signature(payload)}"
+
+
+def read_session(value: Optional[str]) -> Optional[int]:
+    """Athlete id of a valid, unexpired session cookie; None otherwise."""
+    if not value or "." not in value:
+        return None
+    payload, signature = value.rsplit(".", 1)
+    if not hmac.compare_digest(signature, _signature(payload)):
+        return None
+    try:
+        session = orjson.loads(_b64decode(payload))
+        athlete_id, issued_at = int(session["athlete_id"]), int(session["iat"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    if issued_at + SESSION_MAX_AGE_SECONDS < time.time():
+        return None
+    return athlete_id
+
+
+def set_session_cookie(response: Response, athlete_id: int):
+    response.set_cookie(
+        SESSION_COOKIE, sign_session(athlete_id), max_age=SESSION_MAX_AGE_SECONDS,
+        httponly=True, secure=SESSION_COOKIE_SECURE, samesite=SESSION_COOKIE_SAMESITE,
+    )
+
+
+def clear_session_cookie(response: Response):
+    response.delete_cookie(SESSION_COOKIE, httponly=True, secure=SESSION_COOKIE_SECURE, samesite=SESSION_COOKIE_SAMESITE)
+
+
+def new_oauth_state() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def set_oauth_state_cookie(response: Response, state: str):
+    """Remember the state sent to Strava so the callback can check it came back unchanged."""
+    response.set_cookie(
+        OAUTH_STATE_COOKIE, state, max_age=OAUTH_STATE_MAX_AGE_SECONDS,
+        httponly=True, secure=SESSION_COOKIE_SECURE, samesite=SESSION_COOKIE_SAMESITE,
+    )
+
+
+def check_oauth_state(request: Request, state: Optional[str]):
+    expected = request.cookies.get(OAUTH_STATE_COOKIE)
+    if not state or not expected or not hmac.compare_digest(state, expected):
+        raise HTTPException(status_code=400, detail="Invalid OAuth state")
+
+
+class AccountCache:
+    """
+    Per-process LRU of account documents by athlete_id, with a short TTL.
+
+    Handlers resolve the session's account on every request; this keeps
+    that to one indexed lookup per athlete per ACCOUNT_CACHE_SECONDS.
+    """
+
+    def __init__(self, max_size: int = ACCOUNT_CACHE_SIZE, ttl: float = ACCOUNT_CACHE_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    async def get(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(athlete_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(athlete_id)
+            cache_event("accounts", "hit")
+            return entry[1]
+
+        cache_event("accounts", "miss")
+        account = await repository.get_account(athlete_id)
+        if account is None:
+            self._entries.pop(athlete_id, None)
+            return None
+        self._entries[athlete_id] = (time.monotonic() + self.ttl, account)
+        self._entries.move_to_end(athlete_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return account
+
+    def invalidate(self, athlete_id: Optional[int] = None):
+        if athlete_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(athlete_id, None)
+
+
+account_cache = AccountCache()
+
+
+async def current_account(request: Request) -> Dict[str, Any]:
+    """Dependency: the signed-in athlete's account document; 401 without a valid session."""
+    athlete_id = read_session(request.cookies.get(SESSION_COOKIE))
+    if athlete_id is None:
+        raise HTTPException(status_code=401, detail="Not signed in")
+    account = await account_cache.get(athlete_id)
+    if account is None:
+        raise HTTPException(status_code=401, detail="No Strava account connected")
+    return account
+
+
+async def current_athlete_id(account: Dict[str, Any] = Depends(current_account)) -> int:
+    """Dependency: the signed-in athlete's id."""
+    return account["athlete_id"]
@@ -0,0 +1,588 @@
+import asyncio
+import base64
+import binascii
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Set, Tuple
+import orjson
+from fastapi import HTTPException
+from app.activities import activity_view, DEFAULT_PAGE_SIZE, STREAM_BATCH_SIZE
+from app.aggregations import distance_factor, goal_progress_view, whole_weeks
+from app.goals import batch_goal_ids, plan_goal_batch, batch_response, new_goal_id
+from app.metrics import observe_sqlite
+from app.models import GoalBatch
+from app.repository import Repository, activity_changed
+
+# Database file; on Docker put it on a volume. Every process on the node
+# (API workers, `python -m app.worker`) opens the same file.
+SQLITE_PATH = os.getenv("SQLITE_PATH", "strive.db")
+
+# Threads (each with its own connection) running queries per process. WAL
+# lets them read concurrently; writes queue behind SQLite's single writer.
+SQLITE_THREADS = int(os.getenv("SQLITE_THREADS", "4"))
+
+# How long a write waits for another process's write to finish
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Ids per IN (...) lookup, well under SQLite's bound-parameter limit
+SQLITE_IN_BATCH = 500
+
+# Times are stored as milliseconds since the epoch (UTC), the precision Mongo keeps
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    athlete_id INTEGER PRIMARY KEY,
+    expires_at INTEGER NOT NULL,
+    doc BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_expires_at ON accounts (expires_at);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    athlete_id INTEGER PRIMARY KEY,
+    high_water_mark INTEGER,
+    last_synced_at INTEGER,
+    data_version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sync_state_last_synced_at ON sync_state (last_synced_at);
+
+CREATE TABLE IF NOT EXISTS activities (
+    athlete_id INTEGER NOT NULL,
+    strava_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    start_date INTEGER NOT NULL,
+    -- Monday 00:00 UTC of the activity's ISO week
+    week_start INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    moving_time INTEGER NOT NULL,
+    elapsed_time INTEGER NOT NULL,
+    average_speed REAL NOT NULL,
+    max_speed REAL NOT NULL,
+    total_elevation_gain REAL NOT NULL,
+    cached_at INTEGER NOT NULL,
+    PRIMARY KEY (athlete_id, strava_id)
+) WITHOUT ROWID;
+-- Newest-first pages, keyset cursor on (start_date, strava_id)
+CREATE INDEX IF NOT EXISTS activities_athlete_start_date ON activities (athlete_id, start_date, strava_id);
+CREATE INDEX IF NOT EXISTS activities_athlete_type_start_date ON activities (athlete_id, type, start_date, strava_id);
+-- Covers the weekly totals and goal progress without touching the table
+CREATE INDEX IF NOT EXISTS activities_athlete_week ON activities (athlete_id, week_start, type, distance, moving_time);
+
+CREATE TABLE IF NOT EXISTS goals (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER,
+    week INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    goal_type TEXT NOT NULL,
+    target REAL NOT NULL,
+    unit TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS goals_user_week ON goals (user_id, week, type);
+"""
+
+# activities columns besides the key, in the order of UPSERT_ACTIVITY
+ACTIVITY_FIELDS = (
+    "name", "type", "start_date", "week_start", "distance", "moving_time", "elapsed_time",
+    "average_speed", "max_speed", "total_elevation_gain", "cached_at",
+)
+
+UPSERT_ACTIVITY = f"""
+INSERT INTO activities (athlete_id, strava_id, {", ".join(ACTIVITY_FIELDS)})
+VALUES (?, ?, {", ".join("?" for _ in ACTIVITY_FIELDS)})
+ON CONFLICT (athlete_id, strava_id) DO UPDATE SET
+    {", ".join(f"{field} = excluded.{field}" for field in ACTIVITY_FIELDS if field != "cached_at")}
+"""
+
+GOAL_FIELDS = ("week", "type", "goal_type", "target", "unit")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_ms(value: datetime) -> int:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def _from_ms(value: Optional[int]) -> Optional[datetime]:
+    return None if value is None else EPOCH + timedelta(milliseconds=value)
+
+
+def _week_start(start_date: datetime) -> datetime:
+    day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def _activity_row(doc: Dict[str, Any]) -> tuple:
+    values = {
+        **doc,
+        "start_date": _to_ms(doc["start_date"]),
+        "week_start": _to_ms(_week_start(doc["start_date"])),
+        "cached_at": _to_ms(doc["cached_at"]),
+    }
+    return (doc["athlete_id"], doc["strava_id"], *(values[field] for field in ACTIVITY_FIELDS))
+
+
+def _activity_doc(row: sqlite3.Row) -> Dict[str, Any]:
+    """A row in the shape of a cached_activities document."""
+    doc = {key: row[key] for key in row.keys() if key not in ("week_start", "cached_at")}
+    doc["start_date"] = _from_ms(row["start_date"])
+    return doc
+
+
+def _goal_doc(row: sqlite3.Row) -> Dict[str, Any]:
+    return {key: row[key] for key in row.keys()}
+
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just past this activity."""
+    raw = orjson.dumps([doc["start_date"].isoformat(), doc["strava_id"]])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_date, strava_id = orjson.loads(raw)
+        return _to_ms(datetime.fromisoformat(start_date)), int(strava_id)
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    # IMMEDIATE takes the write lock up front, so a read-then-write can't be overtaken
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _bump(conn: sqlite3.Connection, athlete_id: int):
+    conn.execute(
+        "INSERT INTO sync_state (athlete_id, data_version) VALUES (?, 1) "
+        "ON CONFLICT (athlete_id) DO UPDATE SET data_version = data_version + 1",
+        (athlete_id,),
+    )
+
+
+def _existing_goal_ids(conn: sqlite3.Connection, athlete_id: int, goal_ids: List[str]) -> Set[str]:
+    existing = set()
+    for start in range(0, len(goal_ids), SQLITE_IN_BATCH):
+        chunk = goal_ids[start:start + SQLITE_IN_BATCH]
+        rows = conn.execute(
+            f"SELECT id FROM goals WHERE user_id = ? AND id IN ({', '.join('?' for _ in chunk)})", (athlete_id, *chunk)
+        )
+        existing.update(row["id"] for row in rows)
+    return existing
+
+
+def _select_activities(
+    conn: sqlite3.Connection,
+    athlete_id: int,
+    limit: int,
+    before: Optional[datetime],
+    after: Optional[datetime],
+    activity_type: Optional[str],
+    past: Optional[Tuple[int, int]],
+) -> List[Dict[str, Any]]:
+    """
+    Activities newest first, starting just past the (start_date, strava_id)
+    key `past`; a range scan of the start_date (or type, start_date) index.
+    """
+    where, params = ["athlete_id = ?"], [athlete_id]
+    if activity_type:
+        where.append("type = ?")
+        params.append(activity_type)
+    if before is not None:
+        where.append("start_date < ?")
+        params.append(_to_ms(before))
+    if after is not None:
+        where.append("start_date >= ?")
+        params.append(_to_ms(after))
+    if past is not None:
+        where.append("(start_date, strava_id) < (?, ?)")
+        params.extend(past)
+    rows = conn.execute(
+        "SELECT strava_id, name, distance, moving_time, elapsed_time, type, start_date FROM activities "
+        f"WHERE {' AND '.join(where)} ORDER BY start_date DESC, strava_id DESC LIMIT ?",
+        (*params, limit),
+    )
+    return [_activity_doc(row) for row in rows]
+
+
+def _weekly_totals(conn: sqlite3.Connection, athlete_id: int, start: Optional[int], end: Optional[int]) -> List[sqlite3.Row]:
+    where, params = ["athlete_id = ?"], [athlete_id]
+    if start is not None:
+        where.append("week_start >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("week_start < ?")
+        params.append(end)
+    return conn.execute(
+        "SELECT week_start, type, SUM(distance) AS distance, SUM(moving_time) AS moving_time, COUNT(*) AS count "
+        f"FROM activities WHERE {' AND '.join(where)} GROUP BY week_start, type ORDER BY week_start, type",
+        params,
+    ).fetchall()
+
+
+class SQLiteRepository(Repository):
+    """
+    Embedded SQLite backend for single-node deployments.
+
+    Queries run on a small thread pool, one connection per thread, with the
+    database in WAL mode so readers never wait for the writer. Weekly totals
+    are grouped straight from a covering (athlete, week, type, distance,
+    moving_time) index instead of kept in rollups; rollups, records,
+    streams, details and analytics aren't kept.
+    """
+
+    name = "sqlite"
+    derived_data = False
+
+    def __init__(self, path: str = SQLITE_PATH, threads: int = SQLITE_THREADS):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="sqlite")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            # Autocommit; writes open their own transactions. Each connection
+            # only ever runs on the thread that opened it.
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Durable at checkpoints rather than every commit; safe with WAL
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        def call():
+            started = time.perf_counter()
+            try:
+                return fn(self._connection(), *args)
+            finally:
+                observe_sqlite(fn.__name__.lstrip("_"), time.perf_counter() - started)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def init(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        def create_schema(conn):
+            conn.executescript(SCHEMA)
+        await self._run(create_schema)
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+    # Accounts
+
+    async def get_account(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        def get_account(conn):
+            row = conn.execute("SELECT doc FROM accounts WHERE athlete_id = ?", (athlete_id,)).fetchone()
+            return None if row is None else {**orjson.loads(row["doc"]), "athlete_id": athlete_id}
+        return await self._run(get_account)
+
+    async def save_account(self, athlete_id: int, fields: Dict[str, Any]):
+        def save_account(conn):
+            with _transaction(conn):
+                row = conn.execute("SELECT doc FROM accounts WHERE athlete_id = ?", (athlete_id,)).fetchone()
+                doc = {**(orjson.loads(row["doc"]) if row else {}), **fields, "athlete_id": athlete_id}
+                conn.execute(
+                    "INSERT INTO accounts (athlete_id, expires_at, doc) VALUES (?, ?, ?) "
+                    "ON CONFLICT (athlete_id) DO UPDATE SET expires_at = excluded.expires_at, doc = excluded.doc",
+                    (athlete_id, doc["expires_at"], orjson.dumps(doc)),
+                )
+        await self._run(save_account)
+
+    async def count_accounts(self) -> int:
+        def count_accounts(conn):
+            return conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+        return await self._run(count_accounts)
+
+    async def account_ids(self, expiring_before: Optional[int] = None) -> List[int]:
+        def account_ids(conn):
+            if expiring_before is None:
+                rows = conn.execute("SELECT athlete_id FROM accounts")
+            else:
+                rows = conn.execute("SELECT athlete_id FROM accounts WHERE expires_at < ?", (expiring_before,))
+            return [row["athlete_id"] for row in rows]
+        return await self._run(account_ids)
+
+    # Sync state
+
+    async def sync_status(self, athlete_id: int) -> Optional[Dict[str, Any]]:
+        def sync_status(conn):
+            row = conn.execute("SELECT * FROM sync_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+            if row is None:
+                return None
+            return {
+                "athlete_id": athlete_id,
+                "high_water_mark": _from_ms(row["high_water_mark"]),
+                "last_synced_at": _from_ms(row["last_synced_at"]),
+                "data_version": row["data_version"],
+            }
+        return await self._run(sync_status)
+
+    async def record_sync(self, athlete_id: int, high_water_mark: Optional[datetime], synced_at: datetime):
+        def record_sync(conn):
+            conn.execute(
+                "INSERT INTO sync_state (athlete_id, high_water_mark, last_synced_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (athlete_id) DO UPDATE SET "
+                "high_water_mark = excluded.high_water_mark, last_synced_at = excluded.last_synced_at",
+                (athlete_id, None if high_water_mark is None else _to_ms(high_water_mark), _to_ms(synced_at)),
+            )
+        await self._run(record_sync)
+
+    async def synced_since(self, cutoff: datetime) -> Set[int]:
+        def synced_since(conn):
+            rows = conn.execute("SELECT athlete_id FROM sync_state WHERE last_synced_at >= ?", (_to_ms(cutoff),))
+            return {row["athlete_id"] for row in rows}
+        return await self._run(synced_since)
+
+    async def data_version(self, athlete_id: int) -> int:
+        def data_version(conn):
+            row = conn.execute("SELECT data_version FROM sync_state WHERE athlete_id = ?", (athlete_id,)).fetchone()
+            return row["data_version"] if row else 0
+        return await self._run(data_version)
+
+    async def bump_data_version(self, athlete_id: int):
+        await self._run(_bump, athlete_id)
+
+    # Activities
+
+    async def store_activities(self, athlete_id: int, activity_docs: List[Dict[str, Any]]) -> Tuple[int, int]:
+        def store_activities(conn):
+            with _transaction(conn):
+                # Diff against the stored rows so only new or changed ones are written
+                existing = {}
+                strava_ids = [doc["strava_id"] for doc in activity_docs]
+                for start in range(0, len(strava_ids), SQLITE_IN_BATCH):
+                    chunk = strava_ids[start:start + SQLITE_IN_BATCH]
+                    rows = conn.execute(
+                        f"SELECT * FROM activities WHERE athlete_id = ? AND strava_id IN ({', '.join('?' for _ in chunk)})",
+                        (athlete_id, *chunk),
+                    )
+                    existing.update((row["strava_id"], _activity_doc(row)) for row in rows)
+                changed_docs = [doc for doc in activity_docs if activity_changed(existing.get(doc["strava_id"]), doc)]
+                if not changed_docs:
+                    return 0, 0
+                conn.executemany(UPSERT_ACTIVITY, [_activity_row(doc) for doc in changed_docs])
+                _bump(conn, athlete_id)
+            inserted = sum(1 for doc in changed_docs if doc["strava_id"] not in existing)
+            return inserted, len(changed_docs) - inserted
+
+        if not activity_docs:
+            return 0, 0
+        return await self._run(store_activities)
+
+    async def remove_activity(self, athlete_id: int, strava_id: int) -> bool:
+        def remove_activity(conn):
+            with _transaction(conn):
+                removed = conn.execute(
+                    "DELETE FROM activities WHERE athlete_id = ? AND strava_id = ?", (athlete_id, strava_id)
+                ).rowcount
+                if removed:
+                    _bump(conn, athlete_id)
+            return bool(removed)
+        return await self._run(remove_activity)
+
+    async def activity_page(
+        self,
+        athlete_id: int,
+        unit: str,
+        limit: int = DEFAULT_PAGE_SIZE,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        past = decode_cursor(cursor) if cursor else None
+        docs = await self._run(_select_activities, athlete_id, limit + 1, before, after, activity_type, past)
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        factor = distance_factor(unit)
+        return [activity_view(doc, factor) for doc in docs[:limit]], next_cursor
+
+    async def iter_activities(
+        self,
+        athlete_id: int,
+        unit: str,
+        before: Optional[datetime] = None,
+        after: Optional[datetime] = None,
+        activity_type: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        factor = distance_factor(unit)
+        past = None
+        while True:
+            docs = await self._run(_select_activities, athlete_id, STREAM_BATCH_SIZE, before, after, activity_type, past)
+            for doc in docs:
+                yield activity_view(doc, factor)
+            if len(docs) < STREAM_BATCH_SIZE:
+                return
+            past = (_to_ms(docs[-1]["start_date"]), docs[-1]["strava_id"])
+
+    async def weekly_activities(
+        self, athlete_id: int, unit: str, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Weeks overlapping [start, end) are returned whole, as with the Mongo rollups."""
+        start, end = whole_weeks(start, end)
+        rows = await self._run(
+            _weekly_totals, athlete_id,
+            None if start is None else _to_ms(start),
+            None if end is None else _to_ms(end),
+        )
+        factor = distance_factor(unit)
+        weeks = {}
+        for row in rows:
+            if row["week_start"] not in weeks:
+                iso = _from_ms(row["week_start"]).isocalendar()
+                weeks[row["week_start"]] = {
+                    "week": f"{iso.year}-W{iso.week}",
+                    "weekNumber": iso.week,
+                    "year": iso.year,
+                    "activities": {},
+                }
+            weeks[row["week_start"]]["activities"][row["type"]] = {
+                "distance": row["distance"] * factor,
+                "moving_time": row["moving_time"],
+                "count": row["count"],
+            }
+        return list(weeks.values())
+
+    # Goals
+
+    async def list_goals(self, athlete_id: int) -> List[Dict[str, Any]]:
+        def list_goals(conn):
+            rows = conn.execute("SELECT * FROM goals WHERE user_id = ? ORDER BY rowid", (athlete_id,))
+            return [_goal_doc(row) for row in rows]
+        return await self._run(list_goals)
+
+    async def create_goal(self, athlete_id: int, goal: Dict[str, Any]) -> Dict[str, Any]:
+        goal_dict = {**goal, "user_id": athlete_id, "id": new_goal_id()}
+
+        def create_goal(conn):
+            with _transaction(conn):
+                conn.execute(
+                    f"INSERT INTO goals (id, user_id, {', '.join(GOAL_FIELDS)}) VALUES (?, ?, {', '.join('?' for _ in GOAL_FIELDS)})",
+                    (goal_dict["id"], athlete_id, *(goal_dict[field] for field in GOAL_FIELDS)),
+                )
+                _bump(conn, athlete_id)
+        await self._run(create_goal)
+        return goal_dict
+
+    async def update_goal(self, athlete_id: int, goal_id: str, fields: Dict[str, Any]) -> bool:
+        fields = {field: fields[field] for field in GOAL_FIELDS if field in fields}
+
+        def update_goal(conn):
+            with _transaction(conn):
+                if fields:
+                    matched = conn.execute(
+                        f"UPDATE goals SET {', '.join(f'{field} = ?' for field in fields)} WHERE id = ? AND user_id = ?",
+                        (*fields.values(), goal_id, athlete_id),
+                    ).rowcount
+                else:
+                    matched = len(_existing_goal_ids(conn, athlete_id, [goal_id]))
+                if matched:
+                    _bump(conn, athlete_id)
+            return bool(matched)
+        return await self._run(update_goal)
+
+    async def delete_goal(self, athlete_id: int, goal_id: str) -> bool:
+        def delete_goal(conn):
+            with _transaction(conn):
+                deleted = conn.execute("DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, athlete_id)).rowcount
+                if deleted:
+                    _bump(conn, athlete_id)
+            return bool(deleted)
+        return await self._run(delete_goal)
+
+    async def apply_goal_batch(self, batch: GoalBatch, athlete_id: int) -> Dict[str, Any]:
+        """The writes run in one transaction; a failed write doesn't stop the others."""
+        def apply_goal_batch(conn):
+            with _transaction(conn):
+                results, writes = plan_goal_batch(batch, athlete_id, _existing_goal_ids(conn, athlete_id, batch_goal_ids(batch)))
+                for index, op, goal_id, fields in writes:
+                    try:
+                        if op == "create":
+                            conn.execute(
+                                f"INSERT INTO goals (id, user_id, {', '.join(GOAL_FIELDS)}) VALUES (?, ?, {', '.join('?' for _ in GOAL_FIELDS)})",
+                                (goal_id, athlete_id, *(fields[field] for field in GOAL_FIELDS)),
+                            )
+                        elif op == "update":
+                            changes = {field: fields[field] for field in GOAL_FIELDS if field in fields}
+                            if changes:
+                                conn.execute(
+                                    f"UPDATE goals SET {', '.join(f'{field} = ?' for field in changes)} WHERE id = ? AND user_id = ?",
+                                    (*changes.values(), goal_id, athlete_id),
+                                )
+                        else:
+                            conn.execute("DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, athlete_id))
+                    except sqlite3.Error as e:
+                        results[index]["status"] = "error"
+                        results[index]["error"] = str(e)
+                if writes:
+                    _bump(conn, athlete_id)
+            return batch_response(results)
+        return await self._run(apply_goal_batch)
+
+    async def goal_progress(self, athlete_id: int, year: int, unit: str) -> List[Dict[str, Any]]:
+        def goal_progress(conn):
+            goals = conn.execute("SELECT * FROM goals WHERE user_id = ? ORDER BY week, type", (athlete_id,)).fetchall()
+            totals = _weekly_totals(
+                conn, athlete_id,
+                _to_ms(datetime.fromisocalendar(year, 1, 1)),
+                _to_ms(datetime.fromisocalendar(year + 1, 1, 1)),
+            )
+            return goals, totals
+
+        goals, totals = await self._run(goal_progress)
+        by_week = {
+            (_from_ms(row["week_start"]).isocalendar().week, row["type"]): {
+                "distance": row["distance"], "moving_time": row["moving_time"], "count": row["count"],
+            }
+            for row in totals
+        }
+        return [goal_progress_view(_goal_doc(goal), by_week.get((goal["week"], goal["type"])), year, unit) for goal in goals]
+
+    async def claim_unowned_goals(self, athlete_id: int) -> int:
+        def claim_unowned_goals(conn):
+            with _transaction(conn):
+                claimed = conn.execute("UPDATE goals SET user_id = ? WHERE user_id IS NULL", (athlete_id,)).rowcount
+                if claimed:
+                    _bump(conn, athlete_id)
+            return claimed
+        return await self._run(claim_unowned_goals)
+
+    # Lifecycle
+
+    async def delete_athlete(self, athlete_id: int):
+        def delete_athlete(conn):
+            with _transaction(conn):
+                conn.execute("DELETE FROM accounts WHERE athlete_id = ?", (athlete_id,))
+                conn.execute("DELETE FROM activities WHERE athlete_id = ?", (athlete_id,))
+                conn.execute("DELETE FROM goals WHERE user_id = ?", (athlete_id,))
+                conn.execute(
+                    "UPDATE sync_state SET high_water_mark = NULL, last_synced_at = NULL, data_version = data_version + 1 "
+                    "WHERE athlete_id = ?",
+                    (athlete_id,),
+                )
+        await self._run(delete_athlete)
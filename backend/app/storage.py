@@ -0,0 +1,22 @@
+import os
+from app.repository import Repository
+
+# "mongo" keeps everything in MongoDB; "sqlite" keeps accounts, sync state,
+# activities and goals in an embedded SQLite file (see app/sqlite_repository.py).
+# MongoDB is still required with "sqlite" for the job queue, leases and
+# everything derived from activities.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+
+def create_repository(backend: str = STORAGE_BACKEND) -> Repository:
+    # Imported here so only the configured backend is loaded
+    if backend == "mongo":
+        from app.mongo_repository import MongoRepository
+        return MongoRepository()
+    if backend == "sqlite":
+        from app.sqlite_repository import SQLiteRepository
+        return SQLiteRepository()
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; use mongo or sqlite")
+
+
+repository = create_repository()
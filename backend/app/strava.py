@@ -0,0 +1,216 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, Any, Optional
+import httpx
+from dotenv import load_dotenv
+from app.metrics import observe_strava
+from app.ratelimit import budget
+
+load_dotenv()
+
+# Point this at a local stub server to run without Strava
+STRAVA_BASE_URL = os.getenv("STRAVA_BASE_URL", "https://www.strava.com").rstrip("/")
+STRAVA_API_PREFIX = "/api/v3"
+STRAVA_HTTP2 = os.getenv("STRAVA_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Connect fast-fails so a degraded Strava doesn't hold request handlers hostage
+DEFAULT_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30.0)
+
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_CAP_SECONDS = 4.0
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+
+
+class StravaUnavailable(Exception):
+    """Strava could not be reached, kept failing, or the circuit breaker is open."""
+
+
+class StravaRateLimited(StravaUnavailable):
+    """Strava answered 429; retry once the rate-limit window resets."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold failures in a row the circuit opens and calls are
+    rejected without touching the network. Once reset_timeout has passed a
+    single trial call is let through (half-open); its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class StravaClient:
+    """Process-wide pooled HTTP client for Strava with retries and a circuit breaker."""
+
+    def __init__(self, base_url: str = STRAVA_BASE_URL, http2: bool = STRAVA_HTTP2):
+        self.base_url = base_url
+        self.http2 = http2
+        self.breaker = CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The shared connection pool, created on first use."""
+        if self._client is None or self._client.is_closed:
+            http2 = self.http2
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    print("STRAVA_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+                    http2 = False
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                http2=http2,
+                timeout=DEFAULT_TIMEOUT,
+                limits=POOL_LIMITS,
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        access_token: Optional[str] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        **kwargs
+    ) -> httpx.Response:
+        """
+        Send a request to Strava.
+
+        Every attempt first waits for room in the rate-limit budget at the
+        current task's priority. Connect errors are retried with jittered
+        exponential backoff. 5xx responses and other transport errors (read
+        timeouts, dropped connections) are retried only for GETs, since a
+        repeated POST (e.g. an OAuth code exchange) is not safe.
+        """
+        if not self.breaker.allow():
+            raise StravaUnavailable("Strava circuit breaker is open")
+        trial = self.breaker.trial_in_flight
+        try:
+            return await self._send(method, path, access_token, timeout, **kwargs)
+        finally:
+            # A trial that ends without an outcome (e.g. cancelled while waiting
+            # for the budget) must not keep the circuit half-open forever
+            if trial:
+                self.breaker.trial_in_flight = False
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        access_token: Optional[str],
+        timeout: Optional[httpx.Timeout],
+        **kwargs
+    ) -> httpx.Response:
+        headers = kwargs.pop("headers", {})
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        idempotent = method.upper() == "GET"
+
+        last_error = None
+        for attempt in range(MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+            await budget.acquire()
+            started = time.perf_counter()
+            try:
+                resp = await self.client.request(method, path, headers=headers, **kwargs)
+            except httpx.TransportError as e:
+                if isinstance(e, httpx.TimeoutException):
+                    outcome = "timeout"
+                elif isinstance(e, httpx.ConnectError):
+                    outcome = "connect_error"
+                else:
+                    outcome = "transport_error"
+                observe_strava(method, path, outcome, time.perf_counter() - started)
+                last_error = e
+                # Nothing reached Strava if the connection never opened, so any method can be retried
+                if idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)):
+                    continue
+                break
+
+            observe_strava(method, path, str(resp.status_code), time.perf_counter() - started)
+            budget.update(resp.headers)
+            if resp.status_code == 429:
+                # Quota exhaustion is not an outage, so it doesn't trip the breaker
+                self.breaker.record_success()
+                budget.mark_exhausted()
+                raise StravaRateLimited("Strava rate limit exceeded", retry_after=budget.delay())
+
+            if resp.status_code >= 500:
+                last_error = httpx.HTTPStatusError(f"Strava returned {resp.status_code}", request=resp.request, response=resp)
+                if idempotent:
+                    continue
+                break
+
+            self.breaker.record_success()
+            return resp
+
+        self.breaker.record_failure()
+        raise StravaUnavailable(f"Strava request {method} {path} failed: {last_error!r}")
+
+    async def get(self, path: str, access_token: Optional[str] = None, **kwargs) -> httpx.Response:
+        return await self.request("GET", f"{STRAVA_API_PREFIX}{path}", access_token=access_token, **kwargs)
+
+    async def exchange_token(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """POST to the OAuth token endpoint and return the JSON body."""
+        resp = await self.request("POST", "/oauth/token", data=data)
+        return resp.json()
+
+
+# Shared instance; opened lazily and closed by the app lifespan
+strava = StravaClient()
@@ -0,0 +1,234 @@
+import zlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+import orjson
+from bson import Binary
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from app.aggregations import distance_factor
+from app.database import activity_streams, cached_activities
+from app.records import stream_efforts, efforts_candidate, merge_records
+from app.strava import strava
+from app.tokens import token_manager
+
+# Stream types stored per activity. Each is quantized to integers with a
+# fixed scale, delta-encoded and zlib-compressed; resolution after decoding
+# is 1 / scale in the stream's own unit.
+STREAM_SCALES = {
+    "time": 1,               # seconds since start
+    "distance": 10,          # meters
+    "latlng": 10_000_000,    # degrees, ~1 cm
+    "altitude": 10,          # meters
+    "heartrate": 1,          # bpm
+    "velocity_smooth": 100,  # m/s
+    "cadence": 1,            # rpm
+    "watts": 1,              # W
+}
+
+COMPRESSION_LEVEL = 6
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+
+def _stream_array(values: List[Any]) -> np.ndarray:
+    """Float array of a stream; null samples (sensor dropouts) become NaN, null latlng pairs a row of NaN."""
+    width = next((len(v) for v in values if isinstance(v, (list, tuple))), None)
+    if width is not None:
+        values = [[None] * width if v is None else v for v in values]
+    return np.asarray(values, dtype=np.float64)
+
+
+def encode_stream(values: List[Any], scale: int) -> Dict[str, Any]:
+    """
+    Quantize, delta-encode and compress one stream into a BSON-ready dict.
+
+    Null samples are forward-filled before quantizing, so they cost no
+    large deltas, and recorded in a packed bit mask under "nulls".
+    """
+    array = _stream_array(values)
+    missing = np.isnan(array)
+    if missing.ndim > 1:
+        missing = missing.any(axis=1)
+    nulls = None
+    if missing.any():
+        nulls = Binary(zlib.compress(np.packbits(missing).tobytes(), COMPRESSION_LEVEL))
+        # Each null takes the last recorded value; leading nulls the first one
+        present = np.nonzero(~missing)[0]
+        if len(present):
+            source = np.maximum.accumulate(np.where(missing, 0, np.arange(len(array))))
+            source[:present[0]] = present[0]
+            array = array[source]
+        else:
+            array = np.zeros_like(array)
+
+    quantized = np.rint(array * scale).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1,) + quantized.shape[1:], dtype=np.int64))
+    # Deltas of per-second samples fit in 32 bits; the first value is an absolute one
+    dtype = "<i4" if np.abs(deltas).max(initial=0) < 2 ** 31 else "<i8"
+    raw = deltas.astype(dtype).tobytes()
+    encoded = {
+        "dtype": dtype,
+        "scale": scale,
+        "shape": list(array.shape),
+        "data": Binary(zlib.compress(raw, COMPRESSION_LEVEL)),
+    }
+    if nulls is not None:
+        encoded["nulls"] = nulls
+    return encoded
+
+
+def decode_stream(encoded: Dict[str, Any]) -> np.ndarray:
+    """
+    Inverse of encode_stream; the integer deltas are read in place from the decompressed buffer.
+
+    Null samples come back as NaN.
+    """
+    deltas = np.frombuffer(zlib.decompress(encoded["data"]), dtype=encoded["dtype"]).reshape(encoded["shape"])
+    values = np.cumsum(deltas, axis=0, dtype=np.int64) / encoded["scale"]
+    if "nulls" in encoded:
+        missing = np.unpackbits(np.frombuffer(zlib.decompress(encoded["nulls"]), dtype=np.uint8), count=len(values)).astype(bool)
+        values[missing] = np.nan
+    return values
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last samples are always kept. Between them, samples are
+    split into points - 2 equal buckets. Each bucket keeps the sample that
+    forms the largest triangle with the previously kept sample and the
+    average of the next bucket. Buckets are chosen one after another, but
+    the work inside each bucket is vectorized.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    kept = np.empty(points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+
+def streams_fields(streams: Dict[str, Dict[str, Any]], raw_bytes: int, efforts: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """activity_streams fields for a set of encoded streams and the best efforts found in them."""
+    fields = {
+        "streams": streams,
+        "length": max(s["shape"][0] for s in streams.values()),
+        "raw_bytes": raw_bytes,
+        "stored_bytes": sum(len(s["data"]) for s in streams.values()),
+        "fetched_at": datetime.utcnow(),
+    }
+    if efforts:
+        fields["efforts"] = efforts
+    return fields
+
+
+async def fetch_streams(account: Dict[str, Any], strava_id: int) -> Optional[Dict[str, Any]]:
+    """Fetch an activity's streams from Strava and store them encoded; None if Strava has none."""
+    resp = await strava.get(
+        f"/activities/{strava_id}/streams",
+        await token_manager.get_access_token(account),
+        params={"keys": ",".join(STREAM_SCALES), "key_by_type": "true"},
+    )
+    if resp.status_code == 404:
+        return None
+    data = resp.json()
+    if resp.status_code != 200 or not isinstance(data, dict):
+        raise HTTPException(status_code=500, detail="Invalid response from Strava API")
+
+    streams = {}
+    raw_bytes = 0
+    for key, scale in STREAM_SCALES.items():
+        values = (data.get(key) or {}).get("data")
+        if not values:
+            continue
+        streams[key] = encode_stream(values, scale)
+        # What the same series would take as JSON
+        raw_bytes += len(orjson.dumps(values))
+    if not streams:
+        return None
+
+    efforts = None
+    if "time" in streams and "distance" in streams:
+        efforts = stream_efforts(np.asarray(data["time"]["data"]), np.asarray(data["distance"]["data"]))
+    doc = await activity_streams.find_one_and_update(
+        {"athlete_id": account["athlete_id"], "strava_id": strava_id},
+        {"$set": streams_fields(streams, raw_bytes, efforts)},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if efforts:
+        activity = await cached_activities.find_one(
+            {"athlete_id": account["athlete_id"], "strava_id": strava_id},
+            {"_id": 0, "strava_id": 1, "type": 1, "start_date": 1}
+        )
+        if activity is not None:
+            await merge_records(account["athlete_id"], [efforts_candidate(activity, efforts)])
+    return doc
+
+
+async def get_streams(account: Dict[str, Any], strava_id: int) -> Dict[str, Any]:
+    """Stored streams for an activity, fetched from Strava on first use."""
+    doc = await activity_streams.find_one({"athlete_id": account["athlete_id"], "strava_id": strava_id})
+    if doc is None:
+        doc = await fetch_streams(account, strava_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="No streams for this activity")
+    return doc
+
+
+def downsample_streams(doc: Dict[str, Any], keys: List[str], points: int, x_key: str = "time", unit: str = "km") -> Dict[str, Any]:
+    """
+    Decode the requested streams and reduce each to at most `points` samples.
+
+    Every series is downsampled with LTTB against the x stream, so peaks and
+    dips survive. latlng is treated as a polyline (longitude against latitude).
+    Distances are converted to `unit`; everything else keeps Strava's units.
+    Null samples are picked as if they were 0, so dropouts stay visible, and
+    are served as null.
+    """
+    streams = doc["streams"]
+    if x_key not in streams:
+        raise HTTPException(status_code=400, detail=f"Activity has no {x_key} stream")
+    x = decode_stream(streams[x_key])
+    if x_key == "distance":
+        x = x * distance_factor(unit)
+
+    series = {}
+    for key in keys:
+        if key not in streams or key == x_key:
+            continue
+        values = decode_stream(streams[key])
+        if key == "latlng":
+            kept = lttb_indices(np.nan_to_num(values[:, 1]), np.nan_to_num(values[:, 0]), points)
+            series[key] = values[kept]
+            continue
+        if key == "distance":
+            values = values * distance_factor(unit)
+        length = min(len(x), len(values))
+        kept = lttb_indices(np.nan_to_num(x[:length]), np.nan_to_num(values[:length]), points)
+        series[key] = {"x": x[kept], "y": values[kept]}
+
+    return {
+        "strava_id": doc["strava_id"],
+        "x": x_key,
+        "original_points": doc["length"],
+        "points": points,
+        "series": series,
+    }
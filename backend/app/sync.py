@@ -0,0 +1,183 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+from app.database import cached_activities, activity_streams
+from app.records import efforts_candidate, detail_efforts, merge_records
+from app.models import CachedActivity
+from app.storage import repository
+from app.strava import strava
+from app.tokens import token_manager
+from app.enrichment import enrichment_update
+
+# Strava caps per_page at 200; larger pages mean fewer requests against the quota
+SYNC_PAGE_SIZE = 200
+
+# Re-read this much history behind the high-water mark so that recent edits
+# (renames, type changes, deleted GPS glitches) are picked up by the upsert
+SYNC_OVERLAP = timedelta(days=7)
+
+# Optional retention policy: activities whose start_date is older than this
+# many days are removed at the end of each sync. Unset keeps full history.
+ACTIVITY_RETENTION_DAYS = os.getenv("ACTIVITY_RETENTION_DAYS")
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Naive UTC, the form activity times are stored and compared in."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def normalize_activity(athlete_id: int, activity: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Convert a Strava summary activity into a cached_activities document."""
+    if not isinstance(activity, dict):
+        return None
+
+    # Normalize: map walks+jogs to "Run" category
+    if activity.get("type") in ("Walk",) and activity.get("average_speed", 0) > 2.5:
+        activity["type"] = "Run"
+
+    try:
+        activity_doc = CachedActivity(
+            athlete_id=athlete_id,
+            strava_id=activity.get("id"),
+            name=activity.get("name", ""),
+            distance=activity.get("distance", 0),
+            moving_time=activity.get("moving_time", 0),
+            elapsed_time=activity.get("elapsed_time", 0),
+            type=activity.get("type", "Unknown"),
+            # Stored as naive UTC, which is what Mongo hands back on reads
+            start_date=naive_utc(datetime.fromisoformat(activity.get("start_date", "").replace("Z", "+00:00"))),
+            average_speed=activity.get("average_speed", 0),
+            max_speed=activity.get("max_speed", 0),
+            total_elevation_gain=activity.get("total_elevation_gain", 0)
+        )
+    except Exception as e:
+        print(f"Error processing activity: {e}")
+        return None
+    return activity_doc.model_dump(exclude={"id"})
+
+
+async def fetch_activity_pages(access_token: str, after: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Page through /athlete/activities until Strava returns a short page."""
+    activities = []
+    page = 1
+    while True:
+        params = {"per_page": SYNC_PAGE_SIZE, "page": page}
+        if after is not None:
+            params["after"] = after
+        resp = await strava.get("/athlete/activities", access_token, params=params)
+        batch = resp.json()
+
+        if not isinstance(batch, list):
+            raise HTTPException(status_code=500, detail="Invalid response from Strava API")
+
+        activities.extend(batch)
+        if len(batch) < SYNC_PAGE_SIZE:
+            return activities
+        page += 1
+
+
+async def remove_activity(athlete_id: int, strava_id: int) -> bool:
+    """Delete a cached activity and its streams."""
+    removed = await repository.remove_activity(athlete_id, strava_id)
+    if removed:
+        await activity_streams.delete_one({"athlete_id": athlete_id, "strava_id": strava_id})
+    return removed
+
+
+def retention_cutoff() -> Optional[datetime]:
+    """Start date before which activities aren't kept, or None to keep everything."""
+    if not ACTIVITY_RETENTION_DAYS:
+        return None
+    return datetime.utcnow() - timedelta(days=float(ACTIVITY_RETENTION_DAYS))
+
+
+async def expire_activities(athlete_id: int, cutoff: datetime) -> int:
+    """
+    Remove the athlete's activities that started before cutoff.
+
+    Each goes through remove_activity, so the rollups and records are
+    adjusted too; a TTL index would delete them behind their backs.
+    """
+    expired = [activity["id"] async for activity in repository.iter_activities(athlete_id, "km", before=cutoff)]
+    removed = 0
+    for strava_id in expired:
+        removed += await remove_activity(athlete_id, strava_id)
+    return removed
+
+
+async def sync_activity(account: Dict[str, Any], strava_id: int) -> Dict[str, Any]:
+    """
+    Fetch one activity from Strava and upsert it, e.g. for a webhook event.
+
+    An activity that is gone or no longer visible (404) is removed from the cache.
+    """
+    athlete_id = account["athlete_id"]
+
+    resp = await strava.get(f"/activities/{strava_id}", await token_manager.get_access_token(account))
+    if resp.status_code == 404:
+        removed = await remove_activity(athlete_id, strava_id)
+        return {"athlete_id": athlete_id, "strava_id": strava_id, "removed": removed}
+    activity = resp.json()
+    if resp.status_code != 200 or not isinstance(activity, dict):
+        raise HTTPException(status_code=500, detail="Invalid response from Strava API")
+
+    doc = normalize_activity(athlete_id, activity)
+    inserted, updated = await repository.store_activities(athlete_id, [doc] if doc else [])
+    if doc and repository.derived_data:
+        # This was already the detailed representation
+        await cached_activities.bulk_write([enrichment_update(athlete_id, strava_id, activity)])
+        efforts = detail_efforts(activity.get("best_efforts"))
+        if efforts:
+            await merge_records(athlete_id, [efforts_candidate(doc, efforts)])
+    return {"athlete_id": athlete_id, "strava_id": strava_id, "inserted": inserted, "updated": updated}
+
+
+async def sync_activities(account: Dict[str, Any], full: bool = False) -> Dict[str, Any]:
+    """
+    Incrementally sync an athlete's activities into the repository.
+
+    Only activities starting after the stored high-water mark (minus
+    SYNC_OVERLAP) are requested. Pass full=True to re-read the whole history.
+    """
+    athlete_id = account["athlete_id"]
+
+    state = await repository.sync_status(athlete_id)
+    high_water_mark = state.get("high_water_mark") if state else None
+    if high_water_mark is not None:
+        # Compared against the new activities' start dates below, full sync or not
+        high_water_mark = naive_utc(high_water_mark)
+
+    after = None
+    if high_water_mark and not full:
+        after = int((high_water_mark - SYNC_OVERLAP).replace(tzinfo=timezone.utc).timestamp())
+
+    activities = await fetch_activity_pages(await token_manager.get_access_token(account), after=after)
+
+    activity_docs = [doc for doc in (normalize_activity(athlete_id, a) for a in activities) if doc]
+    cutoff = retention_cutoff()
+    if cutoff is not None:
+        activity_docs = [doc for doc in activity_docs if doc["start_date"] >= cutoff]
+
+    upserted, modified = await repository.store_activities(athlete_id, activity_docs)
+    expired = await expire_activities(athlete_id, cutoff) if cutoff is not None else 0
+
+    if activity_docs:
+        newest = max(doc["start_date"] for doc in activity_docs)
+        if high_water_mark is None or newest > high_water_mark:
+            high_water_mark = newest
+
+    synced_at = datetime.utcnow()
+    await repository.record_sync(athlete_id, high_water_mark, synced_at)
+
+    return {
+        "athlete_id": athlete_id,
+        "fetched": len(activities),
+        "inserted": upserted,
+        "updated": modified,
+        "expired": expired,
+        "high_water_mark": high_water_mark,
+        "synced_at": synced_at,
+    }
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+from app.metrics import cache_event
+from app.models import StravaAccount
+from app.storage import repository
+from app.strava import strava
+
+load_dotenv()
+
+STRAVA_CLIENT_ID = os.getenv("STRAVA_CLIENT_ID")
+STRAVA_CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
+
+# Strava access tokens live six hours; refresh once less than this is left
+REFRESH_AHEAD_SECONDS = 30 * 60
+
+# Decrypted tokens kept per process
+TOKEN_CACHE_SIZE = 1024
+
+
+class TokenRefreshError(Exception):
+    """Strava refused to refresh an athlete's token (e.g. access was revoked)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenManager:
+    """
+    Serves Strava access tokens without per-call decryption.
+
+    Decrypted tokens are kept in a bounded LRU whose entries expire with the
+    token itself. A token inside the REFRESH_AHEAD_SECONDS window is still
+    served while a background refresh runs; only an expired token makes the
+    caller wait. Refreshes are single-flight per athlete within a process,
+    and the re-encrypted tokens are written back to the account.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._tokens: "OrderedDict[int, Tuple[str, int]]" = OrderedDict()
+        self._refreshing: Dict[int, asyncio.Task] = {}
+
+    def _remember(self, athlete_id: int, access_token: str, expires_at: int):
+        self._tokens[athlete_id] = (access_token, expires_at)
+        self._tokens.move_to_end(athlete_id)
+        while len(self._tokens) > self.max_size:
+            self._tokens.popitem(last=False)
+
+    def prime(self, athlete_id: int, access_token: str, expires_at: int):
+        """Cache a token we already hold in plaintext, e.g. right after the OAuth exchange."""
+        self._remember(athlete_id, access_token, expires_at)
+
+    def forget(self, athlete_id: Optional[int] = None):
+        """Drop one athlete's cached token, or all of them."""
+        if athlete_id is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(athlete_id, None)
+
+    async def get_access_token(self, account: Dict[str, Any]) -> str:
+        athlete_id = account["athlete_id"]
+        now = time.time()
+
+        cached = self._tokens.get(athlete_id)
+        cache_event("tokens", "miss" if cached is None else "hit")
+        if cached is None:
+            # Cold cache: one decrypt, then served from memory until expiry
+            strava_account = StravaAccount(**account)
+            cached = (strava_account.get_access_token(), strava_account.expires_at)
+            self._remember(athlete_id, *cached)
+        else:
+            self._tokens.move_to_end(athlete_id)
+
+        access_token, expires_at = cached
+        if expires_at <= now:
+            return await asyncio.shield(self.refresh(athlete_id))
+        if expires_at - now < REFRESH_AHEAD_SECONDS:
+            self.refresh(athlete_id)
+        return access_token
+
+    def refresh(self, athlete_id: int) -> asyncio.Task:
+        """Start a token refresh for the athlete unless one is already running."""
+        task = self._refreshing.get(athlete_id)
+        if task is None:
+            cache_event("tokens", "refresh")
+            task = asyncio.create_task(self._refresh(athlete_id))
+            self._refreshing[athlete_id] = task
+            task.add_done_callback(lambda t: self._refresh_done(athlete_id, t))
+        return task
+
+    def _refresh_done(self, athlete_id: int, task: asyncio.Task):
+        if self._refreshing.get(athlete_id) is task:
+            del self._refreshing[athlete_id]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Token refresh for athlete {athlete_id} failed: {task.exception()!r}")
+
+    async def _refresh(self, athlete_id: int) -> str:
+        account_doc = await repository.get_account(athlete_id)
+        if account_doc is None:
+            raise TokenRefreshError(f"No Strava account connected for athlete {athlete_id}")
+        account = StravaAccount(**account_doc)
+
+        # Another worker may have refreshed already
+        if account.expires_at - time.time() >= REFRESH_AHEAD_SECONDS:
+            access_token = account.get_access_token()
+            self._remember(athlete_id, access_token, account.expires_at)
+            return access_token
+
+        resp = await strava.request("POST", "/oauth/token", data={
+            "client_id": STRAVA_CLIENT_ID,
+            "client_secret": STRAVA_CLIENT_SECRET,
+            "grant_type": "refresh_token",
+            "refresh_token": account.get_refresh_token(),
+        })
+        token_data = resp.json()
+        if "access_token" not in token_data:
+            raise TokenRefreshError(f"Strava refused to refresh the token for athlete {athlete_id}: {token_data}", resp.status_code)
+
+        account.expires_at = token_data["expires_at"]
+        account.set_access_token(token_data["access_token"])
+        account.set_refresh_token(token_data["refresh_token"])
+        await repository.save_account(athlete_id, {
+            "access_token": account.access_token,
+            "refresh_token": account.refresh_token,
+            "expires_at": account.expires_at,
+        })
+        self._remember(athlete_id, token_data["access_token"], account.expires_at)
+        return token_data["access_token"]
+
+
+async def refresh_expiring_tokens() -> int:
+    """Refresh every stored token that expires within REFRESH_AHEAD_SECONDS; returns how many were started."""
+    cutoff = int(time.time()) + REFRESH_AHEAD_SECONDS
+    tasks = [token_manager.refresh(athlete_id) for athlete_id in await repository.account_ids(expiring_before=cutoff)]
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return len(tasks)
+
+
+token_manager = TokenManager()
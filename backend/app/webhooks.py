@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, Any, List, Optional
+import httpx
+from dotenv import load_dotenv
+from app.database import sync_jobs, activity_streams, import_jobs
+from app.models import StravaWebhookEvent, SyncJob
+from app.scheduler import scheduler
+from app.strava import strava, STRAVA_API_PREFIX
+from app.sync import sync_activity
+from app.tokens import token_manager, TokenRefreshError
+from app.metrics import percentile_ms
+from app.analytics import analytics_cache
+from app.sessions import account_cache
+from app.response_cache import response_cache
+from app.storage import repository
+
+load_dotenv()
+
+# Shared secret echoed back by Strava during the subscription handshake
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
+# The id `subscribe` prints; events from any other subscription are dropped
+STRAVA_WEBHOOK_SUBSCRIPTION_ID = os.getenv("STRAVA_WEBHOOK_SUBSCRIPTION_ID")
+
+# Events are only accepted once the subscription exists; until then only
+# the handshake that creates it is answered
+WEBHOOKS_ENABLED = bool(STRAVA_WEBHOOK_VERIFY_TOKEN and STRAVA_WEBHOOK_SUBSCRIPTION_ID)
+
+
+async def enqueue_event(event: StravaWebhookEvent) -> Optional[SyncJob]:
+    """Translate a webhook event into a queued job; returns None for events we ignore."""
+    if not WEBHOOKS_ENABLED or str(event.subscription_id) != STRAVA_WEBHOOK_SUBSCRIPTION_ID:
+        return None
+
+    if event.object_type == "activity":
+        return await scheduler.enqueue_event(event.owner_id, "activity", strava_id=event.object_id, aspect=event.aspect_type)
+
+    if event.object_type == "athlete" and str(event.updates.get("authorized", "")).lower() == "false":
+        return await scheduler.enqueue_event(event.owner_id, "deauthorize")
+
+    return None
+
+
+async def forget_athlete(athlete_id: int):
+    """Remove an athlete who revoked access or logged out, along with their goals and everything cached for them."""
+    await repository.delete_athlete(athlete_id)
+    await activity_streams.delete_many({"athlete_id": athlete_id})
+    await import_jobs.delete_many({"athlete_id": athlete_id})
+    await sync_jobs.delete_many({"athlete_id": athlete_id, "status": "queued"})
+    account_cache.invalidate(athlete_id)
+    response_cache.invalidate(athlete_id)
+    token_manager.forget(athlete_id)
+    analytics_cache.invalidate(athlete_id)
+
+
+async def access_revoked(account: Dict[str, Any]) -> bool:
+    """Whether Strava confirms the athlete revoked our access: the token refresh or the athlete call answers 401."""
+    try:
+        access_token = await token_manager.get_access_token(account)
+    except TokenRefreshError as e:
+        return e.status_code == 401
+    resp = await strava.get("/athlete", access_token)
+    return resp.status_code == 401
+
+
+async def apply_event_job(job: SyncJob, account: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Run an 'activity' or 'deauthorize' job queued from a webhook event.
+
+    Events aren't signed, so nothing is deleted on their word: a deleted
+    activity is re-fetched and only removed once Strava answers 404, and an
+    athlete is only forgotten once Strava refuses their tokens.
+    """
+    if job.kind == "deauthorize":
+        deauthorized = account is not None and await access_revoked(account)
+        if deauthorized:
+            await forget_athlete(job.athlete_id)
+        return {"athlete_id": job.athlete_id, "deauthorized": deauthorized}
+
+    return await sync_activity(account, job.strava_id)
+
+
+async def subscribe(callback_url: str) -> Dict[str, Any]:
+    resp = await strava.request("POST", f"{STRAVA_API_PREFIX}/push_subscriptions", data={
+        "client_id": os.getenv("STRAVA_CLIENT_ID"),
+        "client_secret": os.getenv("STRAVA_CLIENT_SECRET"),
+        "callback_url": callback_url,
+        "verify_token": STRAVA_WEBHOOK_VERIFY_TOKEN,
+    })
+    return resp.json()
+
+
+async def list_subscriptions() -> List[Dict[str, Any]]:
+    resp = await strava.get("/push_subscriptions", params={
+        "client_id": os.getenv("STRAVA_CLIENT_ID"),
+        "client_secret": os.getenv("STRAVA_CLIENT_SECRET"),
+    })
+    return resp.json()
+
+
+async def unsubscribe(subscription_id: int) -> int:
+    resp = await strava.request("DELETE", f"{STRAVA_API_PREFIX}/push_subscriptions/{subscription_id}", params={
+        "client_id": os.getenv("STRAVA_CLIENT_ID"),
+        "client_secret": os.getenv("STRAVA_CLIENT_SECRET"),
+    })
+    return resp.status_code
+
+
+def generate_events(count: int, athlete_ids: List[int], activities_per_athlete: int = 500) -> List[Dict[str, Any]]:
+    """Synthetic activity events for load-testing the webhook endpoint."""
+    events = []
+    for _ in range(count):
+        events.append({
+            "object_type": "activity",
+            "object_id": random.randint(1, activities_per_athlete),
+            "aspect_type": random.choices(["create", "update", "delete"], weights=[6, 3, 1])[0],
+            "owner_id": random.choice(athlete_ids),
+            "subscription_id": int(STRAVA_WEBHOOK_SUBSCRIPTION_ID or 1),
+            "event_time": int(time.time()),
+            "updates": {},
+        })
+    return events
+
+
+async def replay(url: str, events: List[Dict[str, Any]], concurrency: int, rate: Optional[float]) -> Dict[str, Any]:
+    """POST events to a webhook endpoint and report acknowledgement latency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def post(client: httpx.AsyncClient, event: Dict[str, Any]):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                resp = await client.post(url, json=event)
+                if resp.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        tasks = []
+        for event in events:
+            tasks.append(asyncio.create_task(post(client, event)))
+            if rate:
+                await asyncio.sleep(1 / rate)
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "events": len(events),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "events_per_second": round(len(events) / elapsed, 1) if elapsed else None,
+        "p50_ms": percentile_ms(latencies, 0.50),
+        "p95_ms": percentile_ms(latencies, 0.95),
+        "p99_ms": percentile_ms(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage Strava webhook subscriptions and replay events locally.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subscribe_parser = subparsers.add_parser("subscribe", help="Create the push subscription")
+    subscribe_parser.add_argument("callback_url", help="Public URL of /webhooks/strava")
+    subparsers.add_parser("list", help="Show the current push subscription")
+    unsubscribe_parser = subparsers.add_parser("unsubscribe", help="Delete a push subscription")
+    unsubscribe_parser.add_argument("subscription_id", type=int)
+
+    replay_parser = subparsers.add_parser("replay", help="POST recorded or synthetic events to a webhook endpoint")
+    replay_parser.add_argument("--url", default="http://localhost:8000/webhooks/strava")
+    replay_parser.add_argument("--file", help="JSON lines file of recorded events")
+    replay_parser.add_argument("--generate", type=int, default=0, help="Number of synthetic events to send")
+    replay_parser.add_argument("--athletes", default="1", help="Comma-separated athlete ids for synthetic events")
+    replay_parser.add_argument("--concurrency", type=int, default=20)
+    replay_parser.add_argument("--rate", type=float, help="Events per second (default: as fast as possible)")
+
+    args = parser.parse_args()
+
+    if args.command == "subscribe":
+        print(json.dumps(asyncio.run(subscribe(args.callback_url)), indent=2))
+    elif args.command == "list":
+        print(json.dumps(asyncio.run(list_subscriptions()), indent=2))
+    elif args.command == "unsubscribe":
+        print(f"Strava answered {asyncio.run(unsubscribe(args.subscription_id))}")
+    else:
+        events = []
+        if args.file:
+            with open(args.file) as f:
+                events.extend(json.loads(line) for line in f if line.strip())
+        if args.generate:
+            events.extend(generate_events(args.generate, [int(a) for a in args.athletes.split(",")]))
+        if not events:
+            parser.error("replay needs --file and/or --generate")
+        print(json.dumps(asyncio.run(replay(args.url, events, args.concurrency, args.rate)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from app.cache import CACHE_DURATION_HOURS
+from app.database import check_connection
+from app.leases import acquire_lease, release_lease, extend_lease, WORKER_ID
+from app.models import SyncJob
+from app.ratelimit import current_priority, BACKGROUND
+from app.storage import repository
+from app.scheduler import scheduler, JOB_LEASE_SECONDS
+from app.strava import strava, StravaRateLimited
+from app.sync import sync_activities
+from app.enrichment import enrich_activities, ENRICHMENT_ENABLED
+from app.tokens import refresh_expiring_tokens
+from app.webhooks import apply_event_job
+
+# Jobs one process runs at the same time; the rate-limit budget paces them further
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "2"))
+
+# "inprocess" runs the pool inside each API worker; "external" leaves it to `python -m app.worker`
+SYNC_WORKER_MODE = os.getenv("SYNC_WORKER_MODE", "inprocess")
+
+IDLE_POLL_SECONDS = 2.0
+LEASE_BUSY_RETRY_SECONDS = 1
+HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+
+# How often one process checks all connected accounts for stale caches
+WARM_INTERVAL_SECONDS = 300
+WARM_LEASE_KEY = "warm-scheduler"
+
+
+class SyncWorkerPool:
+    """
+    Bounded pool of asyncio workers that claim and run sync jobs.
+
+    Each worker claims a job from the Mongo queue, takes the athlete's sync
+    lease and heartbeats both while the sync runs; if either is taken over,
+    the sync is cancelled. Failures are retried with backoff. One extra loop queues background syncs for every connected
+    account whose cache has gone stale and refreshes OAuth tokens that are
+    about to expire; a lease makes sure only one process does that per
+    interval.
+    """
+
+    def __init__(self, concurrency: int = SYNC_CONCURRENCY, warm: bool = True):
+        self.concurrency = concurrency
+        self.warm = warm
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self):
+        self._stopping.clear()
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        if self.warm:
+            self._tasks.append(asyncio.create_task(self._warm_loop()))
+
+    async def stop(self):
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _sleep(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job = await scheduler.claim(WORKER_ID)
+            except Exception as e:
+                print(f"Sync worker could not claim a job: {e!r}")
+                job = None
+            if job is None:
+                await self._sleep(IDLE_POLL_SECONDS)
+                continue
+            try:
+                await self.run_job(job)
+            except Exception as e:
+                # e.g. the queue itself is unreachable; the job's lease expires and it is claimed again
+                print(f"Sync worker could not finish job {job.id} for athlete {job.athlete_id}: {e!r}")
+
+    async def run_job(self, job: SyncJob):
+        token = current_priority.set(job.priority)
+        try:
+            account = await repository.get_account(job.athlete_id)
+            if account is None and job.kind != "deauthorize":
+                await scheduler.fail(job, f"No Strava account connected for athlete {job.athlete_id}")
+                return
+
+            holder = await acquire_lease(job.athlete_id)
+            if holder is None:
+                # Another worker holds the athlete; run after it, since its job may be
+                # an incremental sync or an event that doesn't cover this one
+                await scheduler.retry(job, "Athlete sync in progress", delay=LEASE_BUSY_RETRY_SECONDS, count_attempt=False)
+                return
+
+            work = asyncio.create_task(self._work(job, account))
+            heartbeat = asyncio.create_task(self._heartbeat(job, holder))
+            try:
+                await asyncio.wait([work, heartbeat], return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                heartbeat.cancel()
+                if not work.done():
+                    # Taken over, or the pool is stopping: stop writing before letting go
+                    work.cancel()
+                    await asyncio.gather(work, return_exceptions=True)
+                await release_lease(job.athlete_id, holder)
+            if work.cancelled():
+                print(f"Sync job {job.id} for athlete {job.athlete_id} was taken over by another worker; stopped it")
+                return
+            result = work.result()
+            await scheduler.complete(job, result)
+            await self._queue_enrichment(job, result)
+        except StravaRateLimited as e:
+            await scheduler.retry(job, repr(e), delay=e.retry_after, count_attempt=False)
+        except Exception as e:
+            print(f"Sync job {job.id} for athlete {job.athlete_id} failed: {e!r}")
+            await scheduler.retry(job, repr(e))
+        finally:
+            current_priority.reset(token)
+
+    async def _queue_enrichment(self, job: SyncJob, result: Optional[Dict[str, Any]]):
+        """Follow a sync that brought in activities, or an unfinished enrichment, with an enrichment job."""
+        if not ENRICHMENT_ENABLED or not repository.derived_data or not result:
+            return
+        if job.kind == "sync" and (result.get("inserted") or result.get("updated")):
+            await scheduler.enqueue_event(job.athlete_id, "enrich", priority=BACKGROUND)
+        elif job.kind == "enrich" and result.get("remaining"):
+            await scheduler.enqueue_event(job.athlete_id, "enrich", priority=job.priority)
+
+    async def _work(self, job: SyncJob, account: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if job.kind == "sync":
+            return await sync_activities(account, full=job.full)
+        if job.kind == "enrich":
+            return await enrich_activities(account)
+        return await apply_event_job(job, account)
+
+    async def _heartbeat(self, job: SyncJob, holder: str):
+        """Keep the job and athlete leases alive; returns once either was taken over by another worker."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                if not await scheduler.heartbeat(job) or not await extend_lease(job.athlete_id, holder):
+                    return
+            except Exception as e:
+                # e.g. Mongo briefly unreachable; the leases outlast a few missed beats
+                print(f"Heartbeat for sync job {job.id} failed: {e!r}")
+
+    async def _warm_loop(self):
+        while not self._stopping.is_set():
+            try:
+                if await acquire_lease(WARM_LEASE_KEY, WARM_INTERVAL_SECONDS):
+                    queued = await warm_stale_accounts()
+                    if queued:
+                        print(f"Queued background sync for {queued} stale accounts")
+                    refreshed = await refresh_expiring_tokens()
+                    if refreshed:
+                        print(f"Refreshed {refreshed} expiring Strava tokens")
+            except Exception as e:
+                print(f"Warm scheduler failed: {e!r}")
+            await self._sleep(WARM_INTERVAL_SECONDS)
+
+
+async def warm_stale_accounts() -> int:
+    """Queue a background sync for every connected account whose cache is older than CACHE_DURATION_HOURS."""
+    cutoff = datetime.utcnow() - timedelta(hours=CACHE_DURATION_HOURS)
+    fresh = await repository.synced_since(cutoff)
+    queued = 0
+    for athlete_id in await repository.account_ids():
+        if athlete_id not in fresh:
+            await scheduler.enqueue(athlete_id, BACKGROUND)
+            queued += 1
+    return queued
+
+
+pool: Optional[SyncWorkerPool] = None
+
+
+def start_in_process_pool():
+    """Start the pool inside the API process unless workers run separately."""
+    global pool
+    if SYNC_WORKER_MODE == "inprocess" and pool is None:
+        pool = SyncWorkerPool()
+        pool.start()
+
+
+async def stop_in_process_pool():
+    global pool
+    if pool is not None:
+        await pool.stop()
+        pool = None
+
+
+async def run_forever(concurrency: int, warm: bool):
+    await check_connection()
+    await repository.init()
+    worker_pool = SyncWorkerPool(concurrency=concurrency, warm=warm)
+    worker_pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await worker_pool.stop()
+        await strava.close()
+        await repository.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the background Strava sync workers.")
+    parser.add_argument("--concurrency", type=int, default=SYNC_CONCURRENCY, help="Jobs to run at the same time")
+    parser.add_argument("--no-warm", action="store_true", help="Don't queue syncs for stale accounts periodically")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_forever(args.concurrency, not args.no_warm))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
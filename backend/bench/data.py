@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+import numpy as np
+
+# (type, share of activities, speed range m/s, distance range m)
+ACTIVITY_MIX = [
+    ("Run", 0.55, (2.5, 4.2), (3_000, 25_000)),
+    ("Ride", 0.28, (5.5, 9.5), (15_000, 140_000)),
+    ("Swim", 0.07, (0.7, 1.3), (800, 4_000)),
+    ("Walk", 0.10, (1.1, 1.7), (2_000, 10_000)),
+]
+
+ACTIVITIES_PER_WEEK = 5
+
+# Activity ids are athlete_id * ID_STRIDE + index, so they never collide
+ID_STRIDE = 10_000_000
+
+
+def athlete_history(athlete_id: int, years: float, per_week: float = ACTIVITIES_PER_WEEK, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    A reproducible multi-year history in Strava's summary-activity shape, oldest first.
+
+    The same athlete_id, years and end always give the same activities, so
+    the seeded database and the fake Strava server agree with each other.
+    """
+    rng = np.random.default_rng(athlete_id)
+    end = (end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    count = int(years * 52 * per_week)
+    seconds = np.sort(rng.integers(0, int(years * 365 * 86400), count))
+    start = end - timedelta(days=int(years * 365))
+    mix = rng.choice(len(ACTIVITY_MIX), count, p=[share for _, share, _, _ in ACTIVITY_MIX])
+    unit = rng.random((count, 3))
+
+    activities = []
+    for i in range(count):
+        activity_type, _, (slow, fast), (short, long) = ACTIVITY_MIX[mix[i]]
+        speed = slow + (fast - slow) * unit[i, 0]
+        # Most sessions are short; a few are long
+        distance = short + (long - short) * unit[i, 1] ** 2
+        moving_time = int(distance / speed)
+        start_date = start + timedelta(seconds=int(seconds[i]))
+        activities.append({
+            "id": athlete_id * ID_STRIDE + i,
+            "name": f"{activity_type} {i}",
+            "type": activity_type,
+            "sport_type": activity_type,
+            "start_date": start_date.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z"),
+            "distance": round(distance, 1),
+            "moving_time": moving_time,
+            "elapsed_time": moving_time + int(unit[i, 2] * 600),
+            "average_speed": round(speed, 3),
+            "max_speed": round(speed * 1.4, 3),
+            "total_elevation_gain": round(distance * unit[i, 2] * 0.01, 1),
+        })
+    return activities
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Set
+from urllib.parse import urlencode
+import numpy as np
+from fastapi import FastAPI, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse
+from app.ratelimit import window_resets
+from bench.data import athlete_history, ID_STRIDE
+
+DEFAULT_PORT = 8100
+
+
+class FakeStrava:
+    """
+    In-memory stand-in for the parts of the Strava API the backend uses.
+
+    Every athlete id exists; their activities come from bench.data, so they
+    match what bench.seed writes. Tokens encode the athlete id and expiry,
+    so no token state is kept. Rate limits are counted per server like
+    Strava's per-application limits, in 15-minute and daily windows.
+    """
+
+    def __init__(
+        self,
+        years: float = 3,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        short_limit: int = 600,
+        daily_limit: int = 30000,
+        token_ttl: int = 6 * 3600,
+    ):
+        self.years = years
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.token_ttl = token_ttl
+        self.short_usage = 0
+        self.daily_usage = 0
+        self.requests = 0
+        # Athletes who revoked access and activities deleted on "Strava"
+        self.revoked: Set[int] = set()
+        self.deleted: Set[int] = set()
+        self._histories: Dict[int, List[Dict[str, Any]]] = {}
+        self._short_reset, self._daily_reset = window_resets(datetime.utcnow())
+
+    def history(self, athlete_id: int) -> List[Dict[str, Any]]:
+        if athlete_id not in self._histories:
+            self._histories[athlete_id] = athlete_history(athlete_id, self.years)
+        return self._histories[athlete_id]
+
+    def tokens(self, athlete_id: int) -> Dict[str, Any]:
+        expires_at = int(time.time()) + self.token_ttl
+        return {
+            "token_type": "Bearer",
+            "access_token": f"fake-access-{athlete_id}-{expires_at}",
+            "refresh_token": f"fake-refresh-{athlete_id}",
+            "expires_at": expires_at,
+            "expires_in": self.token_ttl,
+            "athlete": self.athlete(athlete_id),
+        }
+
+    def athlete(self, athlete_id: int) -> Dict[str, Any]:
+        return {"id": athlete_id, "firstname": "Bench", "lastname": f"Athlete {athlete_id}", "username": f"bench{athlete_id}"}
+
+    def authorize(self, authorization: Optional[str]) -> int:
+        """Athlete id of a valid bearer token; 401 otherwise."""
+        try:
+            _, _, athlete_id, expires_at = (authorization or "").removeprefix("Bearer ").split("-")
+            athlete_id, expires_at = int(athlete_id), int(expires_at)
+        except ValueError:
+            raise HTTPException(status_code=401, detail="Authorization Error")
+        if expires_at <= time.time() or athlete_id in self.revoked:
+            raise HTTPException(status_code=401, detail="Authorization Error: token expired")
+        return athlete_id
+
+    def rate_limit_headers(self) -> Dict[str, str]:
+        limit = f"{self.short_limit},{self.daily_limit}"
+        usage = f"{self.short_usage},{self.daily_usage}"
+        return {
+            "X-RateLimit-Limit": limit, "X-RateLimit-Usage": usage,
+            "X-ReadRateLimit-Limit": limit, "X-ReadRateLimit-Usage": usage,
+        }
+
+    def count_request(self) -> bool:
+        """Count a request against the windows; False once either limit is used up."""
+        now = datetime.utcnow()
+        if now >= self._short_reset:
+            self.short_usage = 0
+        if now >= self._daily_reset:
+            self.daily_usage = 0
+        self._short_reset, self._daily_reset = window_resets(now)
+        self.requests += 1
+        if self.short_usage >= self.short_limit or self.daily_usage >= self.daily_limit:
+            return False
+        self.short_usage += 1
+        self.daily_usage += 1
+        return True
+
+
+def detailed_activity(activity: Dict[str, Any]) -> Dict[str, Any]:
+    """A summary activity plus the detail fields enrichment stores."""
+    efforts = []
+    if activity["type"] == "Run":
+        for name, meters in (("400m", 400), ("1k", 1000), ("1 mile", 1609.344), ("5k", 5000), ("10k", 10000)):
+            if activity["distance"] >= meters:
+                efforts.append({
+                    "name": name, "distance": meters, "start_date": activity["start_date"], "pr_rank": None,
+                    "elapsed_time": int(meters / activity["average_speed"] * 0.97),
+                    "moving_time": int(meters / activity["average_speed"] * 0.97),
+                })
+    return {
+        **activity,
+        "description": None,
+        "calories": round(activity["moving_time"] / 60 * 11, 1),
+        "device_name": "Bench Watch",
+        "gear_id": None,
+        "average_heartrate": 145.0,
+        "max_heartrate": 178.0,
+        "best_efforts": efforts,
+    }
+
+
+def activity_streams(activity: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-second streams consistent with the activity's distance and moving time."""
+    seconds = max(activity["moving_time"], 2)
+    rng = np.random.default_rng(activity["id"])
+    time_stream = np.arange(seconds)
+    speed = activity["average_speed"] * (1 + 0.1 * np.sin(time_stream / 120) + rng.normal(0, 0.03, seconds))
+    distance = np.cumsum(speed)
+    heading = np.cumsum(rng.normal(0, 0.02, seconds))
+    lat = 45 + np.cumsum(speed * np.cos(heading)) / 111_320
+    lng = 7 + np.cumsum(speed * np.sin(heading)) / 78_710
+    streams = {
+        "time": time_stream.tolist(),
+        "distance": distance.round(1).tolist(),
+        "velocity_smooth": speed.round(2).tolist(),
+        "heartrate": (140 + 15 * np.sin(time_stream / 300) + rng.integers(-3, 4, seconds)).astype(int).tolist(),
+        "altitude": (300 + 40 * np.sin(time_stream / 900)).round(1).tolist(),
+        "latlng": np.column_stack([lat, lng]).round(6).tolist(),
+    }
+    return {key: {"data": data, "series_type": "time", "original_size": seconds, "resolution": "high"} for key, data in streams.items()}
+
+
+def create_app(fake: FakeStrava) -> FastAPI:
+    app = FastAPI(title="Fake Strava")
+
+    @app.middleware("http")
+    async def strava_behaviour(request: Request, call_next):
+        if fake.latency_ms or fake.jitter_ms:
+            await asyncio.sleep(max(0.0, random.gauss(fake.latency_ms, fake.jitter_ms)) / 1000)
+        if not fake.count_request():
+            return JSONResponse(status_code=429, content={"message": "Rate Limit Exceeded"}, headers=fake.rate_limit_headers())
+        if fake.error_rate and random.random() < fake.error_rate:
+            return JSONResponse(status_code=500, content={"message": "Injected error"}, headers=fake.rate_limit_headers())
+        response = await call_next(request)
+        response.headers.update(fake.rate_limit_headers())
+        return response
+
+    @app.get("/oauth/authorize")
+    async def authorize(redirect_uri: str, state: Optional[str] = None, athlete: int = 1):
+        """Approve straight away; pass ?athlete= to log in as someone else."""
+        params = {"code": str(athlete), "scope": "read,activity:read_all"}
+        if state:
+            params["state"] = state
+        return RedirectResponse(f"{redirect_uri}?{urlencode(params)}")
+
+    @app.post("/oauth/token")
+    async def token(
+        grant_type: str = Form(...),
+        code: Optional[str] = Form(None),
+        refresh_token: Optional[str] = Form(None),
+    ):
+        try:
+            if grant_type == "authorization_code":
+                athlete_id = int(code)
+            elif grant_type == "refresh_token":
+                athlete_id = int(refresh_token.removeprefix("fake-refresh-"))
+            else:
+                raise ValueError(grant_type)
+        except (TypeError, ValueError, AttributeError):
+            return JSONResponse(status_code=400, content={"message": "Bad Request", "errors": [{"code": "invalid"}]})
+        if athlete_id in fake.revoked:
+            return JSONResponse(status_code=401, content={"message": "Authorization Error", "errors": [{"code": "invalid"}]})
+        return fake.tokens(athlete_id)
+
+    @app.get("/api/v3/athlete")
+    async def athlete(authorization: Optional[str] = Header(None)):
+        return fake.athlete(fake.authorize(authorization))
+
+    @app.get("/api/v3/athlete/activities")
+    async def athlete_activities(
+        authorization: Optional[str] = Header(None),
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+        page: int = 1,
+        per_page: int = 30,
+    ):
+        activities = fake.history(fake.authorize(authorization))
+        if after is not None or before is not None:
+            low = datetime.utcfromtimestamp(after or 0).isoformat() + "Z"
+            high = datetime.utcfromtimestamp(before).isoformat() + "Z" if before is not None else "9999"
+            activities = [a for a in activities if low < a["start_date"] < high]
+        # Like Strava: oldest first when paging forward from `after`, newest first otherwise
+        if after is None:
+            activities = activities[::-1]
+        per_page = min(per_page, 200)
+        return activities[(page - 1) * per_page:page * per_page]
+
+    @app.get("/api/v3/activities/{activity_id}")
+    async def activity(activity_id: int, authorization: Optional[str] = Header(None)):
+        return detailed_activity(_owned_activity(fake, fake.authorize(authorization), activity_id))
+
+    @app.get("/api/v3/activities/{activity_id}/streams")
+    async def streams(activity_id: int, authorization: Optional[str] = Header(None)):
+        return activity_streams(_owned_activity(fake, fake.authorize(authorization), activity_id))
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {"requests": fake.requests, "short_usage": fake.short_usage, "daily_usage": fake.daily_usage}
+
+    return app
+
+
+def _owned_activity(fake: FakeStrava, athlete_id: int, activity_id: int) -> Dict[str, Any]:
+    history = fake.history(athlete_id)
+    index = activity_id - athlete_id * ID_STRIDE
+    if not 0 <= index < len(history) or activity_id in fake.deleted:
+        raise HTTPException(status_code=404, detail="Record Not Found")
+    return history[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Strava stand-in for benchmarks and offline development.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--years", type=float, default=3, help="History length of every athlete")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mean added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Standard deviation of the added latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    parser.add_argument("--short-limit", type=int, default=600, help="Requests per 15 minutes")
+    parser.add_argument("--daily-limit", type=int, default=30000, help="Requests per day")
+    parser.add_argument("--token-ttl", type=int, default=6 * 3600, help="Access token lifetime in seconds")
+    args = parser.parse_args()
+
+    import uvicorn
+    fake = FakeStrava(
+        years=args.years, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        short_limit=args.short_limit, daily_limit=args.daily_limit, token_ttl=args.token_ttl,
+    )
+    print(f"Fake Strava on http://{args.host}:{args.port}; run the backend with STRAVA_BASE_URL=http://{args.host}:{args.port}")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
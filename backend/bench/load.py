@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable, List, Optional
+import httpx
+from app.metrics import percentile_ms
+from app.sessions import sign_session, SESSION_COOKIE
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Pages an /api/activities client follows before starting over from the newest
+MAX_PAGES = 5
+
+
+class ActivitiesScenario:
+    """Scroll the activity list: the first page, then X-Next-Cursor up to MAX_PAGES deep."""
+
+    name = "activities"
+
+    def __init__(self, page_size: int = 100):
+        self.page_size = page_size
+
+    async def __call__(self, client: httpx.AsyncClient, state: Dict[str, Any]) -> httpx.Response:
+        params = {"limit": self.page_size}
+        if state.get("cursor"):
+            params["cursor"] = state["cursor"]
+        resp = await client.get("/api/activities", params=params)
+        state["pages"] = state.get("pages", 0) + 1
+        state["cursor"] = resp.headers.get("X-Next-Cursor") if state["pages"] < MAX_PAGES else None
+        if state["cursor"] is None:
+            state["pages"] = 0
+        return resp
+
+
+class GetScenario:
+    """The same GET over and over; with revalidate, like a polling dashboard that sends back the last ETag."""
+
+    def __init__(self, name: str, path: str, params: Optional[Dict[str, Any]] = None, revalidate: bool = False):
+        self.name = name
+        self.path = path
+        self.params = params or {}
+        self.revalidate = revalidate
+
+    async def __call__(self, client: httpx.AsyncClient, state: Dict[str, Any]) -> httpx.Response:
+        headers = {"If-None-Match": state["etag"]} if self.revalidate and state.get("etag") else {}
+        resp = await client.get(self.path, params=self.params, headers=headers)
+        if resp.headers.get("ETag"):
+            state["etag"] = resp.headers["ETag"]
+        return resp
+
+
+SCENARIOS = {
+    "activities": ActivitiesScenario(),
+    "weekly": GetScenario("weekly", "/api/activities/weekly"),
+    "goals": GetScenario("goals", "/api/goals"),
+    "weekly_poll": GetScenario("weekly_poll", "/api/activities/weekly", revalidate=True),
+}
+
+Scenario = Callable[[httpx.AsyncClient, Dict[str, Any]], Awaitable[httpx.Response]]
+
+
+async def run_scenario(
+    base_url: str, scenario: Scenario, concurrency: int, duration: float, warmup: float, athletes: List[int]
+) -> Dict[str, Any]:
+    """
+    Run `concurrency` clients back to back against the API for `duration` seconds.
+
+    Requests made during the warmup aren't counted. Each client keeps its own
+    connection and scenario state (e.g. its paging cursor), and is signed in
+    as one of `athletes`, round robin.
+    """
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    response_bytes = 0
+    measuring = False
+
+    async def client_loop(deadline: float, athlete_id: int):
+        nonlocal response_bytes
+        state: Dict[str, Any] = {}
+        cookies = {SESSION_COOKIE: sign_session(athlete_id)}
+        async with httpx.AsyncClient(base_url=base_url, timeout=60.0, cookies=cookies) as client:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    resp = await scenario(client, state)
+                    status = str(resp.status_code)
+                    size = len(resp.content)
+                except httpx.HTTPError as e:
+                    status, size = type(e).__name__, 0
+                if measuring:
+                    latencies.append(time.perf_counter() - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    response_bytes += size
+
+    warmup_deadline = time.perf_counter() + warmup
+    deadline = warmup_deadline + duration
+    tasks = [asyncio.create_task(client_loop(deadline, athletes[i % len(athletes)])) for i in range(concurrency)]
+    await asyncio.sleep(max(0.0, warmup_deadline - time.perf_counter()))
+    measuring = True
+    measured_from = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - measured_from
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not status.startswith(("2", "3")))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "bytes_per_request": round(response_bytes / len(latencies)) if latencies else None,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+        "p50_ms": percentile_ms(latencies, 0.50),
+        "p95_ms": percentile_ms(latencies, 0.95),
+        "p99_ms": percentile_ms(latencies, 0.99),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def api_storage(base_url: str) -> Optional[str]:
+    """Storage backend the API reports on /health, so runs against Mongo and SQLite can be told apart."""
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+            return (await client.get("/health")).json().get("storage")
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """One line per scenario with the change in throughput and latency percentiles against a baseline run."""
+    lines = [f"Against {baseline.get('commit')} on {baseline.get('storage')} storage ({baseline.get('started_at')}):"]
+    for name, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("requests_per_second", "p50_ms", "p95_ms", "p99_ms"):
+            if current.get(key) is not None and before.get(key):
+                changes.append(f"{key} {before[key]} -> {current[key]} ({(current[key] - before[key]) / before[key] * 100:+.1f}%)")
+        lines.append(f"  {name}: " + ", ".join(changes))
+    return lines
+
+
+async def run(base_url: str, scenarios: List[str], concurrency: int, duration: float, warmup: float, athletes: List[int]) -> Dict[str, Any]:
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.utcnow().isoformat() + "Z",
+        "base_url": base_url,
+        "storage": await api_storage(base_url),
+        "concurrency": concurrency,
+        "duration": duration,
+        "athletes": len(athletes),
+        "scenarios": {},
+    }
+    for name in scenarios:
+        results["scenarios"][name] = await run_scenario(base_url, SCENARIOS[name], concurrency, duration, warmup, athletes)
+        summary = results["scenarios"][name]
+        print(f"{name}: {summary['requests_per_second']} req/s, p50 {summary['p50_ms']} ms, "
+              f"p95 {summary['p95_ms']} ms, p99 {summary['p99_ms']} ms, {summary['errors']} errors", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API and record throughput and latency percentiles.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), nargs="+", default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients sending requests back to back")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before each scenario")
+    parser.add_argument("--athletes", type=int, default=1, help="Seeded athletes the clients sign in as, round robin")
+    parser.add_argument("--first-athlete", type=int, default=1, help="Lowest seeded athlete id")
+    parser.add_argument("--output", help=f"Results file (default: {RESULTS_DIR}/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    athletes = list(range(args.first_athlete, args.first_athlete + args.athletes))
+    results = asyncio.run(run(args.base_url, args.scenario, args.concurrency, args.duration, args.warmup, athletes))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{results['commit'] or 'unknown'}-{results['storage'] or 'unknown'}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(results, json.load(f))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+from app.indexes import ensure_indexes
+from app.models import StravaAccount, Goal, GoalBatch
+from app.storage import repository
+from app.sync import normalize_activity
+from bench.data import athlete_history, ACTIVITIES_PER_WEEK
+
+# Activities per store_activities call
+SEED_BATCH_SIZE = 1000
+
+# Weekly goals per athlete, one per recent week and type
+GOAL_TYPES = [("Run", "distance", 30.0, "km"), ("Ride", "time", 5.0, "hours"), ("Swim", "sessions", 2.0, "sessions")]
+
+
+def bench_account(athlete_id: int, token_ttl: int = 6 * 3600) -> Dict[str, Any]:
+    """An account document whose tokens the fake Strava server accepts."""
+    expires_at = int(time.time()) + token_ttl
+    account = StravaAccount(athlete_id=athlete_id, expires_at=expires_at)
+    account.set_access_token(f"fake-access-{athlete_id}-{expires_at}")
+    account.set_refresh_token(f"fake-refresh-{athlete_id}")
+    return account.model_dump()
+
+
+def bench_goals(athlete_id: int, weeks: int) -> List[Dict[str, Any]]:
+    current_week = datetime.utcnow().isocalendar().week
+    return [
+        {"user_id": athlete_id, "week": week, "type": activity_type, "goal_type": goal_type, "target": target, "unit": unit}
+        for week in range(max(1, current_week - weeks + 1), current_week + 1)
+        for activity_type, goal_type, target, unit in GOAL_TYPES
+    ]
+
+
+async def seed_athlete(athlete_id: int, years: float, per_week: float, goal_weeks: int) -> Dict[str, Any]:
+    """
+    Replace one athlete's data with a generated history, as if it had been synced.
+
+    Everything goes through the configured storage backend, so Mongo also
+    gets its rollups and records.
+    """
+    # Deleting keeps the version counters, so a running API's caches stay honest
+    await repository.delete_athlete(athlete_id)
+    await repository.save_account(athlete_id, bench_account(athlete_id))
+
+    docs = [doc for doc in (normalize_activity(athlete_id, a) for a in athlete_history(athlete_id, years, per_week)) if doc]
+    for start in range(0, len(docs), SEED_BATCH_SIZE):
+        await repository.store_activities(athlete_id, docs[start:start + SEED_BATCH_SIZE])
+
+    athlete_goals = bench_goals(athlete_id, goal_weeks)
+    if athlete_goals:
+        await repository.apply_goal_batch(GoalBatch(create=[Goal(**goal) for goal in athlete_goals]), athlete_id)
+
+    await repository.record_sync(athlete_id, max(doc["start_date"] for doc in docs) if docs else None, datetime.utcnow())
+    return {"athlete_id": athlete_id, "activities": len(docs), "goals": len(athlete_goals)}
+
+
+async def seed(athletes: int, first_athlete: int, years: float, per_week: float, goal_weeks: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    if repository.name == "mongo":
+        await ensure_indexes()
+    await repository.init()
+    try:
+        seeded = [await seed_athlete(athlete_id, years, per_week, goal_weeks) for athlete_id in range(first_athlete, first_athlete + athletes)]
+    finally:
+        await repository.close()
+    return {
+        "storage": repository.name,
+        "athletes": len(seeded),
+        "activities": sum(s["activities"] for s in seeded),
+        "goals": sum(s["goals"] for s in seeded),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the configured storage (STORAGE_BACKEND) with generated multi-year histories for benchmarking.")
+    parser.add_argument("--athletes", type=int, default=10)
+    parser.add_argument("--first-athlete", type=int, default=1, help="Athlete ids run from here upwards")
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--per-week", type=float, default=ACTIVITIES_PER_WEEK, help="Activities per week")
+    parser.add_argument("--goal-weeks", type=int, default=12, help="Recent weeks with goals")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(seed(args.athletes, args.first_athlete, args.years, args.per_week, args.goal_weeks)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
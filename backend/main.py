@@ -1,30 +1,63 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-import httpx
+from fastapi.responses import RedirectResponse, JSONResponse, Response, StreamingResponse
 import os
-from datetime import datetime, timedelta
-from typing import Literal, Dict, Any
+import shutil
+import tempfile
+import asyncio
+from datetime import datetime, timedelta, date, time
+from typing import Literal, Dict, Any, Optional
 from app.utils.encryption import encryption
 from dotenv import load_dotenv
-from app.database import strava_accounts, cached_activities, goals
-from app.models import StravaAccount, CachedActivity, Goal
-from bson import ObjectId
-import json
-
-# Custom JSON encoder for ObjectId
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+from app.database import personal_records, check_connection
+from app.models import StravaAccount, Goal, GoalBatch, StravaWebhookEvent
+from app.goals import MAX_BATCH_SIZE
+from app.cache import ensure_fresh, freshness_headers
+from app.scheduler import scheduler
+from app.worker import start_in_process_pool, stop_in_process_pool
+from app.webhooks import enqueue_event, forget_athlete, WEBHOOKS_ENABLED, STRAVA_WEBHOOK_VERIFY_TOKEN
+from app.ratelimit import INTERACTIVE, BACKGROUND
+from app.strava import strava, StravaUnavailable, STRAVA_BASE_URL
+from app.tokens import token_manager
+from app.indexes import ensure_indexes
+from app.rollups import read_daily_rollups
+from app.analytics import analytics_cache
+from app.records import records_view
+from app.importer import start_import, get_import, fail_stale_imports
+from app.export import export_query, export_chunks, export_filename, MEDIA_TYPES, PARQUET_AVAILABLE
+from app.streams import get_streams, downsample_streams, DEFAULT_POINTS, MAX_POINTS
+from app.activities import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.responses import MongoJSONResponse, NDJSONResponse
+from app.response_cache import conditional_response
+from app.storage import repository
+from app.metrics import MetricsMiddleware, render_metrics, mark_worker_exited, CONTENT_TYPE_LATEST
+from app.sessions import current_account, current_athlete_id, account_cache, set_session_cookie, clear_session_cookie, new_oauth_state, set_oauth_state_cookie, check_oauth_state
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The sync job queue, leases and derived data stay in MongoDB with either
+    # storage backend; make sure it is there and the hot queries are covered
+    # before serving traffic
+    await check_connection()
+    await ensure_indexes()
+    await repository.init()
+    if STRAVA_WEBHOOK_VERIFY_TOKEN and not WEBHOOKS_ENABLED:
+        print("STRAVA_WEBHOOK_SUBSCRIPTION_ID is not set; webhook events are rejected until it is")
+    interrupted = await fail_stale_imports()
+    if interrupted:
+        print(f"Marked {interrupted} interrupted imports as failed")
+    start_in_process_pool()
+    yield
+    await stop_in_process_pool()
+    await strava.close()
+    await repository.close()
+    mark_worker_exited()
+
+app = FastAPI(lifespan=lifespan, default_response_class=MongoJSONResponse)
 
 # Get configuration from environment variables
 STRAVA_CLIENT_ID = os.getenv("STRAVA_CLIENT_ID")
@@ -32,9 +65,6 @@ STRAVA_CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
 STRAVA_REDIRECT_URI = os.getenv("STRAVA_REDIRECT_URI")
 FRONTEND_URL = os.getenv("FRONTEND_URL")
 
-# Cache configuration
-CACHE_DURATION_HOURS = 1  # Activities are cached for 1 hour by default
-
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -42,305 +72,472 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache-Status", "X-Cache-Age", "X-Last-Synced", "X-Next-Cursor", "ETag"],
 )
 
-def serialize_mongo_doc(doc: Dict[str, Any]) -> Dict[str, Any]:
-    """Convert MongoDB document to JSON-serializable dict."""
-    if doc is None:
-        return None
-    if isinstance(doc, dict):
-        return {k: serialize_mongo_doc(v) for k, v in doc.items()}
-    if isinstance(doc, list):
-        return [serialize_mongo_doc(item) for item in doc]
-    if isinstance(doc, ObjectId):
-        return str(doc)
-    if isinstance(doc, datetime):
-        return doc.isoformat()
-    return doc
+# Outermost, so the timings include CORS handling and error responses
+app.add_middleware(MetricsMiddleware)
+
+def derived_data_storage():
+    """Dependency for endpoints served from rollups, records, streams or details, which only MongoDB storage keeps."""
+    if not repository.derived_data:
+        raise HTTPException(status_code=501, detail=f"Not available with {repository.name} storage")
+
+@app.exception_handler(StravaUnavailable)
+async def strava_unavailable_handler(request, exc: StravaUnavailable):
+    # Only reached when there is no cached data to fall back on
+    return JSONResponse(status_code=503, content={"detail": "Strava is currently unavailable"})
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request, MongoDB and Strava latency, rate-limit usage and cache outcomes."""
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "storage": repository.name}
 
 @app.get("/auth/strava")
 def strava_auth():
+    state = new_oauth_state()
     authorize_url = (
-        "https://www.strava.com/oauth/authorize"
+        f"{STRAVA_BASE_URL}/oauth/authorize"
         f"?client_id={STRAVA_CLIENT_ID}"
         f"&redirect_uri={STRAVA_REDIRECT_URI}"
         "&response_type=code"
         "&scope=read,activity:read_all"
+        f"&state={state}"
     )
-    return RedirectResponse(authorize_url)
+    response = RedirectResponse(authorize_url)
+    set_oauth_state_cookie(response, state)
+    return response
 
 @app.get("/auth/strava/callback")
-async def strava_callback(code: str):
-    token_url = "https://www.strava.com/oauth/token"
+async def strava_callback(request: Request, code: str, state: Optional[str] = None):
+    """
+    Finish the OAuth flow and sign the athlete in.
+    
+    The session is a signed cookie holding the athlete id; every API
+    endpoint is scoped to that athlete.
+    """
+    check_oauth_state(request, state)
     data = {
         "client_id": STRAVA_CLIENT_ID,
         "client_secret": STRAVA_CLIENT_SECRET,
         "code": code,
         "grant_type": "authorization_code"
     }
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(token_url, data=data)
-        token_data = resp.json()
-        
-        if "error" in token_data:
-            raise HTTPException(status_code=400, detail=token_data["error"])
-            
-        # Get athlete info from a separate API call
-        headers = {"Authorization": f"Bearer {token_data['access_token']}"}
-        athlete_resp = await client.get("https://www.strava.com/api/v3/athlete", headers=headers)
-        athlete_info = athlete_resp.json()
+    token_data = await strava.exchange_token(data)
+    
+    if "error" in token_data:
+        raise HTTPException(status_code=400, detail=token_data["error"])
         
-        # Create StravaAccount instance
-        account = StravaAccount(
-            athlete_id=athlete_info["id"],
-            expires_at=token_data["expires_at"],
-        )
-        # Set encrypted tokens
-        account.set_access_token(token_data["access_token"])
-        account.set_refresh_token(token_data["refresh_token"])
+    # Get athlete info from a separate API call
+    athlete_resp = await strava.get("/athlete", token_data["access_token"])
+    athlete_info = athlete_resp.json()
+    
+    # Create StravaAccount instance
+    account = StravaAccount(
+        athlete_id=athlete_info["id"],
+        expires_at=token_data["expires_at"],
+    )
+    # Set encrypted tokens
+    account.set_access_token(token_data["access_token"])
+    account.set_refresh_token(token_data["refresh_token"])
+    
+    await repository.save_account(account.athlete_id, account.model_dump())
+    token_manager.prime(account.athlete_id, token_data["access_token"], account.expires_at)
+    account_cache.invalidate(account.athlete_id)
+    
+    # Goals created before sessions existed have no owner; they belong to
+    # the single athlete such an install had
+    if await repository.count_accounts() == 1:
+        await repository.claim_unowned_goals(account.athlete_id)
         
-        # Update or insert into MongoDB
-        await strava_accounts.update_one(
-            {"athlete_id": account.athlete_id},
-            {"$set": account.model_dump()},
-            upsert=True
-        )
-            
-        # Redirect to frontend after successful connection
-        return RedirectResponse(url=FRONTEND_URL)
+    # Redirect to frontend after successful connection
+    response = RedirectResponse(url=FRONTEND_URL)
+    set_session_cookie(response, account.athlete_id)
+    return response
+
+@app.get("/webhooks/strava")
+async def verify_strava_webhook(
+    mode: str = Query(..., alias="hub.mode"),
+    challenge: str = Query(..., alias="hub.challenge"),
+    verify_token: str = Query(..., alias="hub.verify_token"),
+):
+    """Answer Strava's subscription validation handshake."""
+    if not STRAVA_WEBHOOK_VERIFY_TOKEN or mode != "subscribe" or verify_token != STRAVA_WEBHOOK_VERIFY_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid verify token")
+    return {"hub.challenge": challenge}
+
+@app.post("/webhooks/strava")
+async def receive_strava_webhook(event: StravaWebhookEvent):
+    """
+    Receive a Strava push event.
+    
+    Strava expects an acknowledgement within two seconds, so the event is only
+    queued here; a sync worker checks it against Strava before acting on it.
+    """
+    if not WEBHOOKS_ENABLED:
+        raise HTTPException(status_code=404, detail="Webhooks are not enabled")
+    await enqueue_event(event)
+    return {"status": "ok"}
 
 @app.post("/auth/logout")
-async def logout():
-    await strava_accounts.delete_many({})
-    await cached_activities.delete_many({})
-    await goals.delete_many({})
+async def logout(response: Response, athlete_id: int = Depends(current_athlete_id)):
+    """Disconnect the signed-in athlete and delete their data."""
+    await forget_athlete(athlete_id)
+    clear_session_cookie(response)
     return {"status": "logged_out"}
 
 @app.post("/auth/clear-data")
-async def clear_data():
-    """Clear all existing data to start fresh with encryption."""
-    await strava_accounts.delete_many({})
-    await cached_activities.delete_many({})
-    await goals.delete_many({})
+async def clear_data(response: Response, athlete_id: int = Depends(current_athlete_id)):
+    """Clear the signed-in athlete's data to start fresh with encryption."""
+    await forget_athlete(athlete_id)
+    clear_session_cookie(response)
     return {"status": "data_cleared"}
 
-async def fetch_and_cache_activities(account: dict):
-    """Fetch activities from Strava and cache them."""
-    # Convert dict to StravaAccount object
-    strava_account = StravaAccount(**account)
-    access_token = strava_account.get_access_token()
-    headers = {"Authorization": f"Bearer {access_token}"}
+@app.post("/api/activities/refresh", status_code=202)
+async def refresh_activities(
+    full: bool = Query(False, description="Re-read the whole history instead of syncing incrementally"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Queue a refresh of the activities cache.
     
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            "https://www.strava.com/api/v3/athlete/activities",
-            headers=headers,
-            params={"per_page": 50}
-        )
-        activities = resp.json()
-        
-        if not isinstance(activities, list):
-            raise HTTPException(status_code=500, detail="Invalid response from Strava API")
-        
-        # Normalize: map walks+jogs to "Run" category
-        for activity in activities:
-            if isinstance(activity, dict) and activity.get("type") in ("Walk",) and activity.get("average_speed", 0) > 2.5:
-                activity["type"] = "Run"
-        
-        # Cache the activities
-        activity_docs = []
-        for activity in activities:
-            if not isinstance(activity, dict):
-                continue
-            try:
-                activity_doc = CachedActivity(
-                    athlete_id=strava_account.athlete_id,
-                    strava_id=activity.get("id"),
-                    name=activity.get("name", ""),
-                    distance=activity.get("distance", 0),
-                    moving_time=activity.get("moving_time", 0),
-                    elapsed_time=activity.get("elapsed_time", 0),
-                    type=activity.get("type", "Unknown"),
-                    start_date=datetime.fromisoformat(activity.get("start_date", "").replace("Z", "+00:00")),
-                    average_speed=activity.get("average_speed", 0),
-                    max_speed=activity.get("max_speed", 0),
-                    total_elevation_gain=activity.get("total_elevation_gain", 0)
-                )
-                activity_docs.append(activity_doc.model_dump())
-            except Exception as e:
-                print(f"Error processing activity: {e}")
-                continue
-        
-        if activity_docs:
-            await cached_activities.insert_many(activity_docs)
-            
-        return activities
-
-@app.post("/api/activities/refresh")
-async def refresh_activities():
-    """Force a refresh of the activities cache."""
-    # Get the most recent account from the database
-    account_doc = await strava_accounts.find_one({})
+    The sync runs ahead of background work and returns a job handle; poll
+    /api/sync/jobs/{job_id} for its outcome.
+    """
+    job = await scheduler.enqueue(account["athlete_id"], INTERACTIVE, full=full)
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/api/activities/enrich", status_code=202, dependencies=[Depends(derived_data_storage)])
+async def enrich_activities(account: Dict[str, Any] = Depends(current_account)):
+    """
+    Queue fetching details (calories, device, splits, best efforts) for activities that only have summaries.
     
-    if not account_doc:
-        raise HTTPException(status_code=400, detail="No Strava account connected")
+    Runs as background work in chunks until every activity is enriched; poll
+    /api/sync/jobs/{job_id} for progress and throughput.
+    """
+    job = await scheduler.enqueue_event(account["athlete_id"], "enrich", priority=BACKGROUND)
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/api/import/strava-export", status_code=202, dependencies=[Depends(derived_data_storage)])
+async def import_strava_export(
+    file: UploadFile = File(..., description="Strava bulk-export zip"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Import a Strava bulk export (activities.csv plus GPX/TCX/FIT files).
     
-    # Convert to StravaAccount object
-    account = StravaAccount(**account_doc)
-        
-    activities = await fetch_and_cache_activities(account_doc)
-    return activities
+    Nothing is requested from Strava. The upload is imported in the
+    background; poll /api/import/{job_id} for progress.
+    """
+    # The upload is gone once this request ends; the import reads its own copy
+    with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as copy:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, copy)
+    job_id = await start_import(account["athlete_id"], copy.name, file.filename)
+    return {"job_id": job_id, "status": "running"}
+
+@app.get("/api/import/{job_id}")
+async def get_import_job(job_id: str, athlete_id: int = Depends(current_athlete_id)):
+    """Get the progress and result of an export import."""
+    job = await get_import(job_id)
+    if job is None or job["athlete_id"] != athlete_id:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return MongoJSONResponse(job)
+
+@app.get("/api/sync/jobs/{job_id}")
+async def get_sync_job(job_id: str, athlete_id: int = Depends(current_athlete_id)):
+    """Get the status and result of a sync job."""
+    job = await scheduler.get_job(job_id)
+    if job is None or job["athlete_id"] != athlete_id:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    return MongoJSONResponse(job)
+
+@app.get("/api/sync/status", dependencies=[Depends(current_account)])
+async def get_sync_status():
+    """Report the Strava rate-limit budget and the sync queue."""
+    return MongoJSONResponse(await scheduler.status())
 
 @app.get("/api/activities")
-async def get_activities(unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)")):
+async def get_activities(
+    request: Request,
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Activities per page"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    before: Optional[datetime] = Query(None, description="Only activities starting before this time"),
+    after: Optional[datetime] = Query(None, description="Only activities starting at or after this time"),
+    activity_type: Optional[str] = Query(None, alias="type", description="Only activities of this type, e.g. Run"),
+    account: Dict[str, Any] = Depends(current_account),
+):
     """
-    Get activities from cache or Strava API.
+    Get activities from cache or Strava API, newest first, one page at a time.
     
     Cache behavior:
-    - Activities are cached for 1 hour by default
-    - Cache is automatically refreshed when expired
+    - Cached activities are always served right away; once older than
+      CACHE_DURATION_HOURS (24 with webhooks enabled, 1 otherwise) they are
+      revalidated in the background, once per athlete across all workers
+    - Only activities newer than the last sync are requested from Strava
+    - X-Cache-Status (fresh, stale, miss or pending) and X-Cache-Age report freshness
     - Use /api/activities/refresh to force a refresh
+    
+    Paging: when more activities match, X-Next-Cursor holds the cursor of the
+    next page; pass it back with the same filters.
+    
+    Responses carry an ETag that changes with the athlete's data; send it
+    back in If-None-Match to get a 304 while nothing has changed.
     """
-    # Get the most recent account from the database
-    account = await strava_accounts.find_one({})
-        
-    if not account:
-        raise HTTPException(status_code=400, detail="No Strava account connected")
-        
-    # Check if we have cached activities that are less than 1 hour old
-    cache_time = datetime.utcnow() - timedelta(hours=CACHE_DURATION_HOURS)
-    cached_activities_list = await cached_activities.find({
-        "athlete_id": account["athlete_id"],
-        "cached_at": {"$gt": cache_time}
-    }).to_list(length=100)
+    freshness = await ensure_fresh(account)
+    
+    async def build():
+        page, next_cursor = await repository.activity_page(account["athlete_id"], unit, limit, before, after, activity_type, cursor)
+        return page, {"X-Next-Cursor": next_cursor} if next_cursor else {}
     
-    if cached_activities_list:
-        # Convert distance to requested unit
-        for activity in cached_activities_list:
-            # First convert from meters to kilometers
-            activity["distance"] = activity["distance"] / 1000
-            # Then convert to miles if requested
-            if unit == "mi":
-                activity["distance"] = activity["distance"] * 0.621371
-        return serialize_mongo_doc(cached_activities_list)
+    return await conditional_response(request, account["athlete_id"], freshness["data_version"], build, freshness_headers(freshness))
+
+@app.get("/api/activities/stream")
+async def stream_activities(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    before: Optional[datetime] = Query(None, description="Only activities starting before this time"),
+    after: Optional[datetime] = Query(None, description="Only activities starting at or after this time"),
+    activity_type: Optional[str] = Query(None, alias="type", description="Only activities of this type, e.g. Run"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Stream the athlete's whole activity history as NDJSON, newest first.
+    
+    Activities are written as they are read from the cursor, so memory use
+    stays flat however long the history is.
+    """
+    freshness = await ensure_fresh(account)
+    return NDJSONResponse(
+        repository.iter_activities(account["athlete_id"], unit, before, after, activity_type),
+        headers=freshness_headers(freshness)
+    )
+
+@app.get("/api/export/activities.{export_format}", dependencies=[Depends(derived_data_storage)])
+async def export_activities(
+    export_format: Literal["csv", "parquet"],
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    activity_type: Optional[str] = Query(None, alias="type", description="Only activities of this type, e.g. Run"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Download the athlete's cached activities as CSV or Parquet, oldest first.
     
-    # If no cache or cache is old, fetch from Strava
-    activities = await fetch_and_cache_activities(account)
+    Rows are read off one cursor in batches and written out as CSV chunks
+    or Parquet row groups while the cursor is read, so memory use stays
+    flat for any history length. Parquet needs pyarrow on the server.
+    """
+    if export_format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=501, detail="Parquet export is not available on this server")
     
-    # Convert distance to requested unit
-    for a in activities:
-        # First convert from meters to kilometers
-        a["distance"] = a["distance"] / 1000
-        # Then convert to miles if requested
-        if unit == "mi":
-            a["distance"] = a["distance"] * 0.621371
+    query = export_query(account["athlete_id"], from_date, to_date, activity_type)
+    filename = export_filename(account["athlete_id"], export_format)
+    return StreamingResponse(
+        export_chunks(query, export_format, unit),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/api/activities/{strava_id}/streams", dependencies=[Depends(derived_data_storage)])
+async def get_activity_streams(
+    strava_id: int,
+    keys: str = Query("heartrate,altitude,velocity_smooth", description="Comma-separated stream types"),
+    points: int = Query(DEFAULT_POINTS, ge=3, le=MAX_POINTS, description="Maximum samples per series"),
+    x: Literal["time", "distance"] = Query("time", description="Stream the series are plotted against"),
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Per-second streams of an activity, downsampled for charts.
     
-    return activities
+    Streams are fetched from Strava on first request and stored compressed;
+    each series is reduced to `points` samples with LTTB.
+    """
+    doc = await get_streams(account, strava_id)
+    return MongoJSONResponse(downsample_streams(doc, keys.split(","), points, x, unit))
 
 @app.get("/api/goals")
-async def get_goals(unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)")):
-    """Get all goals."""
-    goals_collection = goals.find({})
+async def get_goals(
+    request: Request,
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    athlete_id: int = Depends(current_athlete_id),
+):
+    """Get all of the athlete's goals; supports If-None-Match like /api/activities."""
+    async def build():
+        goals_list = []
+        for goal in await repository.list_goals(athlete_id):
+            # Convert distances if needed
+            if goal["goal_type"] == 'distance':
+                if goal["unit"] == 'km' and unit == 'mi':
+                    # Convert km to miles
+                    goal["target"] = round(goal["target"] * 0.621371, 2)
+                    goal["unit"] = 'mi'
+                elif goal["unit"] == 'mi' and unit == 'km':
+                    # Convert miles to km
+                    goal["target"] = round(goal["target"] * 1.60934, 2)
+                    goal["unit"] = 'km'
+            goals_list.append(goal)
+        return goals_list, {}
     
-    # Convert distances if needed
-    for goal in await goals_collection.to_list(length=100):
-        if goal["type"] == 'distance':
-            if goal["unit"] == 'km' and unit == 'mi':
-                # Convert km to miles
-                goal["target"] = round(goal["target"] * 0.621371, 2)
-                goal["unit"] = 'mi'
-            elif goal["unit"] == 'mi' and unit == 'km':
-                # Convert miles to km
-                goal["target"] = round(goal["target"] * 1.60934, 2)
-                goal["unit"] = 'km'
+    return await conditional_response(request, athlete_id, await repository.data_version(athlete_id), build)
+
+@app.get("/api/goals/progress")
+async def get_goal_progress(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    year: Optional[int] = Query(None, description="ISO year the goal weeks belong to (default: current)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Actual vs target for every goal.
     
-    return [goal for goal in await goals_collection.to_list(length=100)]
+    Each goal is joined to the athlete's totals for its ISO week and activity
+    type. Distance goals are reported in the requested unit, time goals in
+    their own unit (hours or minutes) and session goals as a count.
+    """
+    if year is None:
+        year = datetime.utcnow().isocalendar().year
+    return MongoJSONResponse(await repository.goal_progress(account["athlete_id"], year, unit))
 
 @app.post("/api/goals")
-async def create_goal(goal: Goal):
+async def create_goal(goal: Goal, athlete_id: int = Depends(current_athlete_id)):
     """Create a new goal."""
-    goal_dict = goal.model_dump()
-    result = await goals.insert_one(goal_dict)
-    goal_dict["id"] = str(result.inserted_id)
-    return goal_dict
+    return await repository.create_goal(athlete_id, goal.model_dump(exclude={"id", "user_id"}))
+
+@app.post("/api/goals/batch")
+async def batch_goals(batch: GoalBatch, athlete_id: int = Depends(current_athlete_id)):
+    """
+    Create, update and delete many goals in one request.
+    
+    The writes go to storage together (one unordered bulk write, or one
+    SQLite transaction). Each item gets its own result (created, updated,
+    deleted, not_found, invalid_id or error), and a failing item doesn't
+    stop the others.
+    """
+    if len(batch.create) + len(batch.update) + len(batch.delete) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} goals per batch")
+    return await repository.apply_goal_batch(batch, athlete_id)
 
 @app.put("/api/goals/{goal_id}")
-async def update_goal(goal_id: str, goal: Goal):
+async def update_goal(goal_id: str, goal: Goal, athlete_id: int = Depends(current_athlete_id)):
     """Update an existing goal."""
-    result = await goals.update_one(
-        {"_id": ObjectId(goal_id)},
-        {"$set": goal.model_dump(exclude_unset=True)}
-    )
-    if result.modified_count == 0:
+    if not await repository.update_goal(athlete_id, goal_id, goal.model_dump(exclude_unset=True, exclude={"id", "user_id"})):
         raise HTTPException(status_code=404, detail="Goal not found")
+    goal.user_id = athlete_id
     return goal
 
 @app.delete("/api/goals/{goal_id}")
-async def delete_goal(goal_id: str):
+async def delete_goal(goal_id: str, athlete_id: int = Depends(current_athlete_id)):
     """Delete a goal."""
-    result = await goals.delete_one({"_id": ObjectId(goal_id)})
-    if result.deleted_count == 0:
+    if not await repository.delete_goal(athlete_id, goal_id):
         raise HTTPException(status_code=404, detail="Goal not found")
     return {"status": "deleted"}
 
 @app.get("/api/activities/weekly")
-async def get_weekly_activities(unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)")):
-    """Get activities aggregated by week."""
-    activities_collection = cached_activities.find({})
+async def get_weekly_activities(
+    request: Request,
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """Get activities aggregated by ISO week and activity type; supports If-None-Match like /api/activities."""
+    freshness = await ensure_fresh(account)
     
-    # Group activities by week and type
-    weekly_data = {}
-    for activity in await activities_collection.to_list(length=100):
-        # Calculate ISO week number
-        date = activity["start_date"]
-        d = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        # Get the day of the week (0 = Monday, 6 = Sunday)
-        day_num = d.weekday()
-        # Move to the Thursday of the same week (ISO weeks start on Monday)
-        d = d - timedelta(days=day_num-3)
-        year_start = datetime(d.year, 1, 1)
-        # Calculate week number
-        week_number = ((d - year_start).days // 7) + 1
-        
-        week_key = f"{d.year}-W{week_number}"
-        
-        if week_key not in weekly_data:
-            weekly_data[week_key] = {}
-        
-        activity_type = activity["type"]
-        if activity_type not in weekly_data[week_key]:
-            weekly_data[week_key][activity_type] = {
-                'distance': 0,
-                'moving_time': 0,
-                'count': 0
-            }
-        
-        # Convert distance to requested unit if needed
-        distance = activity["distance"] / 1000  # Convert meters to kilometers
-        if unit == "mi":
-            distance = distance * 0.621371  # Convert kilometers to miles
-        
-        weekly_data[week_key][activity_type]['distance'] += distance
-        weekly_data[week_key][activity_type]['moving_time'] += activity["moving_time"]
-        weekly_data[week_key][activity_type]['count'] += 1
+    start = datetime.combine(from_date, time.min) if from_date else None
+    end = datetime.combine(to_date + timedelta(days=1), time.min) if to_date else None
+    
+    async def build():
+        return await repository.weekly_activities(account["athlete_id"], unit, start, end), {}
+    
+    return await conditional_response(request, account["athlete_id"], freshness["data_version"], build, freshness_headers(freshness))
+
+@app.get("/api/activities/daily", dependencies=[Depends(derived_data_storage)])
+async def get_daily_activities(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """Get activities aggregated by day and activity type, for calendar views."""
+    freshness = await ensure_fresh(account)
+    
+    start = datetime.combine(from_date, time.min) if from_date else None
+    end = datetime.combine(to_date + timedelta(days=1), time.min) if to_date else None
+    
+    return MongoJSONResponse(
+        await read_daily_rollups(account["athlete_id"], unit, start, end),
+        headers=freshness_headers(freshness)
+    )
+
+@app.get("/api/records", dependencies=[Depends(derived_data_storage)])
+async def get_records(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    activity_type: Optional[str] = Query(None, alias="type", description="Only records of this type, e.g. Run"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Personal records per activity type: longest distance and duration, biggest climb and best efforts (400m to marathon).
     
-    # Convert to list format and sort by week
-    result = []
-    for week_key, type_data in weekly_data.items():
-        year, week = week_key.split('-W')
-        result.append({
-            'week': week_key,
-            'weekNumber': int(week),
-            'year': int(year),
-            'activities': type_data
-        })
+    Records are kept up to date as activities are synced. Best efforts come
+    from Strava's activity details and from stored streams; elapsed times
+    are in seconds.
+    """
+    query = {"athlete_id": account["athlete_id"]}
+    if activity_type:
+        query["type"] = activity_type
+    docs = await personal_records.find(query).sort("type", 1).to_list(length=None)
+    return MongoJSONResponse([records_view(doc, unit) for doc in docs])
+
+@app.get("/api/analytics/summary", dependencies=[Depends(derived_data_storage)])
+async def get_analytics_summary(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """Latest fitness, fatigue, form, monotony and rolling volume."""
+    series = await analytics_cache.get(account["athlete_id"])
+    return MongoJSONResponse(series.summary(unit))
+
+@app.get("/api/analytics/load", dependencies=[Depends(derived_data_storage)])
+async def get_training_load(
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """
+    Daily training load with fitness (CTL, 42-day), fatigue (ATL, 7-day) and form (TSB).
     
-    return sorted(result, key=lambda x: (x['year'], x['weekNumber']))
\ No newline at end of file
+    Series are columnar: one array per metric, aligned with "dates".
+    """
+    series = await analytics_cache.get(account["athlete_id"])
+    return MongoJSONResponse(series.load_series(from_date, to_date))
+
+@app.get("/api/analytics/volume", dependencies=[Depends(derived_data_storage)])
+async def get_training_volume(
+    unit: Literal["km", "mi"] = Query("km", description="Distance unit (km or mi)"),
+    activity_type: Optional[str] = Query(None, alias="type", description="Only activities of this type, e.g. Run"),
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """Daily distance and hours with rolling 7- and 28-day totals."""
+    series = await analytics_cache.get(account["athlete_id"])
+    return MongoJSONResponse(series.volume_series(unit, activity_type, from_date, to_date))
+
+@app.get("/api/analytics/monotony", dependencies=[Depends(derived_data_storage)])
+async def get_training_monotony(
+    from_date: Optional[date] = Query(None, alias="from", description="First day to include (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="Last day to include (YYYY-MM-DD)"),
+    account: Dict[str, Any] = Depends(current_account),
+):
+    """Rolling 7-day load, monotony (mean / standard deviation of daily load) and strain (load x monotony)."""
+    series = await analytics_cache.get(account["athlete_id"])
+    return MongoJSONResponse(series.monotony_series(from_date, to_date))
@@ -0,0 +1,118 @@
+import os
+from cryptography.fernet import Fernet
+
+# Configure the app before anything imports it: no background workers, and
+# MongoDB replaced by mongomock (server-side features such as $isoWeekYear
+# and $lookup pipelines aren't available there)
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
+os.environ.setdefault("SESSION_SECRET", "test-session-secret")
+os.environ["SYNC_WORKER_MODE"] = "external"
+os.environ["STORAGE_BACKEND"] = "mongo"
+
+import motor.motor_asyncio
+import mongomock_motor
+
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+from datetime import datetime
+from typing import Any, Dict, List
+import httpx
+import pytest
+from app import database
+from app import strava as strava_module
+from app.analytics import analytics_cache
+from app.ratelimit import RateLimitBudget
+from app.response_cache import response_cache
+from app.sessions import account_cache, sign_session, SESSION_COOKIE
+from app.storage import repository
+from app.strava import StravaClient, CircuitBreaker
+from app.sync import normalize_activity
+from app.tokens import token_manager
+from bench.data import athlete_history
+from bench.fake_strava import FakeStrava, create_app
+from bench.seed import bench_account
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """An empty database, with the per-process caches that mirror it emptied too."""
+    for name in await database.db.list_collection_names():
+        await database.db.drop_collection(name)
+    account_cache.invalidate()
+    response_cache.invalidate()
+    token_manager.forget()
+    analytics_cache.invalidate()
+    yield database.db
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    """A fresh rate-limit budget, so a test that exhausts it doesn't stall the next."""
+    fresh = RateLimitBudget()
+    monkeypatch.setattr(strava_module, "budget", fresh)
+    return fresh
+
+
+@pytest.fixture
+def fake_strava():
+    return FakeStrava(years=1)
+
+
+@pytest.fixture
+async def strava_client(fake_strava, budget, monkeypatch):
+    """A StravaClient talking to the fake Strava server in-process, without backoff sleeps."""
+    monkeypatch.setattr(strava_module, "BACKOFF_BASE_SECONDS", 0)
+    client = StravaClient(base_url="http://fake-strava")
+    client._client = httpx.AsyncClient(base_url="http://fake-strava", transport=httpx.ASGITransport(app=create_app(fake_strava)))
+    yield client
+    await client.close()
+
+
+@pytest.fixture
+async def strava_api(fake_strava, budget, monkeypatch):
+    """Points the shared StravaClient the app code uses at the fake Strava server; returns the fake."""
+    monkeypatch.setattr(strava_module, "BACKOFF_BASE_SECONDS", 0)
+    monkeypatch.setattr(strava_module.strava, "breaker", CircuitBreaker())
+    strava_module.strava._client = httpx.AsyncClient(base_url="http://fake-strava", transport=httpx.ASGITransport(app=create_app(fake_strava)))
+    yield fake_strava
+    await strava_module.strava.close()
+
+
+@pytest.fixture
+def seed(db):
+    """Store a generated history for an athlete as if it had just been synced; returns the stored documents."""
+
+    async def seed_athlete(athlete_id: int, years: float = 1) -> List[Dict[str, Any]]:
+        # Built up front: mongomock can't run the aggregations that backfill rollups
+        await database.sync_state.update_one(
+            {"athlete_id": athlete_id}, {"$set": {"rollups_built": True, "records_built": True}}, upsert=True
+        )
+        await repository.save_account(athlete_id, bench_account(athlete_id))
+        docs = [normalize_activity(athlete_id, activity) for activity in athlete_history(athlete_id, years)]
+        await repository.store_activities(athlete_id, docs)
+        await repository.record_sync(athlete_id, max(doc["start_date"] for doc in docs), datetime.utcnow())
+        return docs
+
+    return seed_athlete
+
+
+@pytest.fixture
+async def api(db):
+    """Returns HTTP clients for the app, signed in as the given athlete (or not at all); the lifespan isn't run."""
+    from main import app
+    clients = []
+
+    def client_for(athlete_id=None) -> httpx.AsyncClient:
+        cookies = {SESSION_COOKIE: sign_session(athlete_id)} if athlete_id is not None else {}
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", cookies=cookies)
+        clients.append(client)
+        return client
+
+    yield client_for
+    for client in clients:
+        await client.aclose()
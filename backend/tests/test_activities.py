@@ -0,0 +1,65 @@
+import pytest
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+
+async def all_pages(client, **params):
+    """Follow X-Next-Cursor from the first page to the last."""
+    activities, pages = [], 0
+    cursor = None
+    while True:
+        resp = await client.get("/api/activities", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        activities += resp.json()
+        pages += 1
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return activities, pages
+
+
+async def test_cursor_pages_cover_every_activity_once_newest_first(api, seed):
+    docs = await seed(1)
+
+    activities, pages = await all_pages(api(1), limit=40)
+
+    assert sorted(a["id"] for a in activities) == sorted(doc["strava_id"] for doc in docs)
+    assert pages == -(-len(docs) // 40)
+    start_dates = [a["start_date"] for a in activities]
+    assert start_dates == sorted(start_dates, reverse=True)
+
+
+async def test_cursor_pages_split_activities_that_start_at_the_same_time(api, seed):
+    docs = await seed(1)
+    # Edited onto one start time, straddling several page boundaries
+    tied = docs[100:110]
+    for doc in tied:
+        await repository.store_activities(1, [{**doc, "start_date": tied[0]["start_date"]}])
+
+    activities, _ = await all_pages(api(1), limit=3)
+
+    ids = [a["id"] for a in activities]
+    assert len(ids) == len(set(ids)) == len(docs)
+
+
+async def test_filters_apply_to_every_page(api, seed):
+    docs = await seed(1)
+    dates = sorted(doc["start_date"] for doc in docs)
+    after, before = dates[len(dates) // 4], dates[len(dates) // 2]
+    expected = {
+        doc["strava_id"] for doc in docs
+        if doc["type"] == "Run" and after <= doc["start_date"] < before
+    }
+    assert expected
+
+    activities, _ = await all_pages(api(1), limit=25, type="Run", after=after.isoformat(), before=before.isoformat())
+
+    assert {a["id"] for a in activities} == expected
+
+
+async def test_invalid_cursor_is_a_bad_request(api, seed):
+    await seed(1)
+
+    resp = await api(1).get("/api/activities", params={"cursor": "not-a-cursor"})
+
+    assert resp.status_code == 400
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+import pytest
+from app.analytics import CTL_DAYS, TrainingSeries, analytics_cache, ewma, rolling_sum
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+TODAY = date(2025, 3, 31)
+
+
+def reference_ewma(values, days):
+    out, y = [], 0.0
+    for x in values:
+        y += (x - y) / days
+        out.append(y)
+    return np.array(out)
+
+
+def history(*activities):
+    """TrainingSeries for (days before TODAY, meters, seconds, type) tuples."""
+    return TrainingSeries(
+        np.array([np.datetime64(TODAY - timedelta(days=ago), "s") + np.timedelta64(7 * 3600, "s") for ago, _, _, _ in activities]),
+        np.array([meters for _, meters, _, _ in activities], dtype=np.float64),
+        np.array([seconds for _, _, seconds, _ in activities], dtype=np.float64),
+        np.array([kind for _, _, _, kind in activities], dtype=object),
+        today=TODAY,
+    )
+
+
+def test_blocked_ewma_matches_the_recurrence_over_long_histories():
+    load = np.random.default_rng(1).gamma(2.0, 40.0, 20 * 365) * (np.arange(20 * 365) % 3 != 0)
+
+    for days in (7, 42):
+        np.testing.assert_allclose(ewma(load, days), reference_ewma(load, days), rtol=1e-9, atol=1e-9)
+
+
+def test_rolling_sum_is_a_trailing_window():
+    values = np.arange(1, 11, dtype=np.float64)
+
+    assert rolling_sum(values, 3).tolist() == [1, 3, 6, 9, 12, 15, 18, 21, 24, 27]
+
+
+def test_daily_load_and_form():
+    series = history((2, 10_000, 3600, "Run"), (2, 20_000, 1800, "Ride"), (0, 5_000, 1200, "Run"))
+
+    assert series.days == 3
+    assert series.load.tolist() == [90, 0, 20]
+    assert series.ctl[0] == pytest.approx(90 / CTL_DAYS)
+    # Form uses yesterday's fitness and fatigue
+    assert series.tsb[0] == 0
+    assert series.tsb[2] == pytest.approx(series.ctl[1] - series.atl[1])
+
+
+def test_volume_by_type_and_monotony_of_an_even_week():
+    series = history(*[(ago, 10_000, 3600, "Run") for ago in range(7)], (0, 30_000, 3600, "Ride"))
+
+    runs = series.volume_series("km", "Run")
+    assert runs["distance"][-1] == 10
+    assert runs["distance_7d"][-1] == 70
+    everything = series.volume_series("km")
+    assert everything["distance_7d"][-1] == 100
+    # Six identical days and one heavier: finite monotony; identical days would be null
+    assert np.isfinite(series.monotony[-1])
+    assert np.isnan(history(*[(ago, 10_000, 3600, "Run") for ago in range(7)]).monotony[-1])
+
+
+async def test_cached_series_are_recomputed_after_a_sync_changes_activities(api, seed):
+    docs = await seed(1)
+    client = api(1)
+    before = (await client.get("/api/analytics/summary")).json()
+    assert before["activities"] == len(docs)
+    assert await analytics_cache.get(1) is await analytics_cache.get(1)
+
+    await repository.remove_activity(1, docs[-1]["strava_id"])
+
+    after = (await client.get("/api/analytics/summary")).json()
+    assert after["activities"] == len(docs) - 1
+
+
+@pytest.mark.parametrize("path", ["/api/analytics/load", "/api/analytics/volume", "/api/analytics/monotony"])
+async def test_series_endpoints_are_columnar_and_windowed(api, seed, path):
+    await seed(1)
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=27)
+
+    body = (await api(1).get(path, params={"from": start.isoformat(), "to": today.isoformat()})).json()
+
+    assert body["dates"][0] == start.isoformat() and len(body["dates"]) == 28
+    assert all(len(values) == 28 for values in body.values())
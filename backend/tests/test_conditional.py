@@ -0,0 +1,81 @@
+import pytest
+from app.response_cache import etag_matches, make_etag
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+GOAL = {"week": 10, "type": "Run", "goal_type": "distance", "target": 20, "unit": "km"}
+
+
+def test_etag_matching():
+    etag = make_etag(1, 3, "/api/goals?unit=km")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag(1, 4, "/api/goals?unit=km"), etag)
+    assert not etag_matches(make_etag(2, 3, "/api/goals?unit=km"), etag)
+
+
+@pytest.mark.parametrize("path", ["/api/activities", "/api/activities/weekly", "/api/goals"])
+async def test_unchanged_data_revalidates_with_304(api, seed, path):
+    await seed(1)
+    client = api(1)
+    first = await client.get(path)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = await client.get(path, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+
+async def test_goal_write_changes_the_etag(api, seed):
+    await seed(1)
+    client = api(1)
+    etag = (await client.get("/api/goals")).headers["ETag"]
+
+    await client.post("/api/goals", json=GOAL)
+    resp = await client.get("/api/goals", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert len(resp.json()) == 1
+
+
+async def test_changed_activity_changes_the_etag(api, seed):
+    docs = await seed(1)
+    client = api(1)
+    etag = (await client.get("/api/activities")).headers["ETag"]
+
+    await repository.store_activities(1, [{**docs[-1], "name": "Renamed"}])
+    resp = await client.get("/api/activities", headers={"If-None-Match": etag})
+
+    assert resp.status_code == 200
+    assert "Renamed" in {a["name"] for a in resp.json()}
+
+
+async def test_unchanged_resync_keeps_the_etag(api, seed):
+    docs = await seed(1)
+    client = api(1)
+    etag = (await client.get("/api/activities")).headers["ETag"]
+
+    assert await repository.store_activities(1, docs[-50:]) == (0, 0)
+
+    assert (await client.get("/api/activities", headers={"If-None-Match": etag})).status_code == 304
+
+
+async def test_etags_differ_per_request_and_athlete(api, seed):
+    await seed(1)
+    await seed(2)
+
+    etags = {
+        (await api(athlete_id).get("/api/activities", params={"unit": unit})).headers["ETag"]
+        for athlete_id in (1, 2)
+        for unit in ("km", "mi")
+    }
+
+    assert len(etags) == 4
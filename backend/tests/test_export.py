@@ -0,0 +1,63 @@
+import csv
+import io
+import pyarrow.parquet as pq
+import pytest
+import main
+from app.export import export_batches, parquet_chunks
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_csv_export_streams_every_activity_oldest_first(api, seed):
+    docs = await seed(1)
+
+    resp = await api(1).get("/api/export/activities.csv", params={"unit": "mi"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert 'filename="' in resp.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert [int(row["id"]) for row in rows] == [doc["strava_id"] for doc in sorted(docs, key=lambda d: d["start_date"])]
+    first = min(docs, key=lambda d: d["start_date"])
+    assert float(rows[0]["distance"]) == pytest.approx(first["distance"] / 1000 * 0.621371, abs=1e-3)
+    assert rows[0]["start_date"] == first["start_date"].isoformat() + "Z"
+    assert rows[0]["average_heartrate"] == ""
+
+
+async def test_parquet_export_matches_the_csv_and_filters(api, seed):
+    docs = await seed(1)
+    client = api(1)
+    dates = sorted(doc["start_date"].date() for doc in docs)
+    params = {"type": "Run", "from": dates[10].isoformat(), "to": dates[-10].isoformat()}
+
+    resp = await client.get("/api/export/activities.parquet", params=params)
+
+    assert resp.status_code == 200
+    table = pq.read_table(io.BytesIO(resp.content))
+    expected = [
+        doc["strava_id"] for doc in sorted(docs, key=lambda d: d["start_date"])
+        if doc["type"] == "Run" and dates[10] <= doc["start_date"].date() <= dates[-10]
+    ]
+    assert table.column("id").to_pylist() == expected
+    csv_rows = list(csv.DictReader(io.StringIO((await client.get("/api/export/activities.csv", params=params)).text)))
+    assert [int(row["id"]) for row in csv_rows] == expected
+
+
+async def test_parquet_export_without_pyarrow_is_not_implemented(api, seed, monkeypatch):
+    await seed(1)
+    monkeypatch.setattr(main, "PARQUET_AVAILABLE", False)
+
+    resp = await api(1).get("/api/export/activities.parquet")
+
+    assert resp.status_code == 501
+
+
+async def test_parquet_row_groups_are_sent_as_they_fill(seed):
+    docs = await seed(1)
+
+    chunks = [chunk async for chunk in parquet_chunks(export_batches({"athlete_id": 1}, "km", batch_size=50), row_group_size=100)]
+
+    assert len(chunks) > 2
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet.metadata.num_row_groups == -(-len(docs) // 100)
+    assert parquet.metadata.num_rows == len(docs)
@@ -0,0 +1,79 @@
+import pytest
+from app.models import Goal, GoalBatch
+from app.sqlite_repository import SQLiteRepository
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+GOAL = {"week": 10, "type": "Run", "goal_type": "distance", "target": 20, "unit": "km"}
+
+
+def block(weeks):
+    return [{**GOAL, "week": week} for week in weeks]
+
+
+async def test_batch_applies_every_item_and_reports_each(api, seed):
+    await seed(1)
+    client = api(1)
+    existing = (await client.post("/api/goals/batch", json={"create": block(range(1, 5))})).json()
+    first, second, third, _ = [result["id"] for result in existing["results"]]
+
+    resp = await client.post("/api/goals/batch", json={
+        "create": block([20, 21]),
+        "update": [{"id": first, "goal": {**GOAL, "week": 1, "target": 42}}, {"id": "f" * 24, "goal": GOAL}],
+        "delete": [second, third, "not-an-id"],
+    })
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [(r["op"], r["status"]) for r in body["results"]] == [
+        ("create", "created"), ("create", "created"),
+        ("update", "updated"), ("update", "not_found"),
+        ("delete", "deleted"), ("delete", "deleted"), ("delete", "invalid_id"),
+    ]
+    assert body["counts"] == {"created": 2, "updated": 1, "not_found": 1, "deleted": 2, "invalid_id": 1}
+    goals = {g["week"]: g for g in (await client.get("/api/goals")).json()}
+    assert sorted(goals) == [1, 4, 20, 21]
+    assert goals[1]["target"] == 42
+    assert {goals[20]["id"], goals[21]["id"]} == {r["id"] for r in body["results"][:2]}
+
+
+async def test_empty_batch_writes_nothing(api, seed):
+    await seed(1)
+    client = api(1)
+    etag = (await client.get("/api/goals")).headers["ETag"]
+
+    body = (await client.post("/api/goals/batch", json={})).json()
+
+    assert body == {"results": [], "counts": {}}
+    assert (await client.get("/api/goals", headers={"If-None-Match": etag})).status_code == 304
+
+
+async def test_oversized_batch_is_rejected(api, seed):
+    await seed(1)
+
+    resp = await api(1).post("/api/goals/batch", json={"create": block([1] * 501)})
+
+    assert resp.status_code == 400
+    assert (await api(1).get("/api/goals")).json() == []
+
+
+async def test_sqlite_batch_results_match_mongo(db, tmp_path):
+    sqlite = SQLiteRepository(str(tmp_path / "strive.db"), threads=1)
+    await sqlite.init()
+    try:
+        outcomes = []
+        for repo in (repository, sqlite):
+            created = await repo.apply_goal_batch(GoalBatch(create=[Goal(**goal) for goal in block([1, 2, 3])]), 1)
+            ids = [r["id"] for r in created["results"]]
+            result = await repo.apply_goal_batch(GoalBatch.model_validate({
+                "update": [{"id": ids[0], "goal": {**GOAL, "week": 1, "target": 5}}],
+                "delete": [ids[1], ids[1], "0" * 24],
+            }), 1)
+            goals = sorted((g["week"], g["target"]) for g in await repo.list_goals(1))
+            outcomes.append(([(r["op"], r["status"]) for r in result["results"]], goals))
+    finally:
+        await sqlite.close()
+
+    assert outcomes[0] == outcomes[1]
+    assert outcomes[0][1] == [(1, 5), (3, 20)]
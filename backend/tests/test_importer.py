@@ -0,0 +1,186 @@
+import asyncio
+import gzip
+import io
+import os
+import zipfile
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app import importer
+from app.database import activity_streams, cached_activities, import_jobs, personal_records, sync_state
+from app.importer import StravaExportImporter, csv_activities, fail_stale_imports, parse_activity_file, run_under_lease
+from app.leases import acquire_lease, release_lease
+from app.streams import decode_stream
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2024, 5, 4, 7, 30)
+
+CSV_HEADER = "Activity ID,Activity Date,Activity Name,Activity Type,Elapsed Time,Distance,Filename,Elapsed Time,Moving Time,Distance,Elevation Gain\n"
+
+
+def csv_row(strava_id: int, start: datetime, distance: float, filename: str = "", activity_type: str = "Run") -> str:
+    seconds = int(distance / 4)
+    return (
+        f'{strava_id},"{start:%b %d, %Y, %I:%M:%S %p}",Morning {activity_type},{activity_type},'
+        f'{seconds},"{distance / 1000:.2f}",{filename},{seconds},{seconds},{distance:.1f},12.0\n'
+    )
+
+
+def gpx(points: int, start: datetime = START) -> bytes:
+    """A straight track north at 4 m/s, one point a second, with heart rate."""
+    step = 4 / 111_195
+    track = "".join(
+        f'<trkpt lat="{45 + i * step:.7f}" lon="7.0"><ele>{200 + i % 5}</ele>'
+        f'<time>{(start + timedelta(seconds=i)).isoformat()}Z</time>'
+        f'<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>{140 + i % 10}</gpxtpx:hr></gpxtpx:TrackPointExtension></extensions></trkpt>'
+        for i in range(points)
+    )
+    return (
+        '<?xml version="1.0"?><gpx xmlns="http://www.topografix.com/GPX/1/1" '
+        'xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">'
+        f"<trk><trkseg>{track}</trkseg></trk></gpx>"
+    ).encode()
+
+
+def tcx(points: int, start: datetime = START) -> bytes:
+    track = "".join(
+        f"<Trackpoint><Time>{(start + timedelta(seconds=i)).isoformat()}Z</Time>"
+        f"<DistanceMeters>{i * 5.0}</DistanceMeters><HeartRateBpm><Value>150</Value></HeartRateBpm></Trackpoint>"
+        for i in range(points)
+    )
+    return (
+        '<?xml version="1.0"?><TrainingCenterDatabase xmlns="http://www.garmin.com/xmlschemas/TrainingCenterDatabase/v2">'
+        f"<Activities><Activity><Lap><Track>{track}</Track></Lap></Activity></Activities></TrainingCenterDatabase>"
+    ).encode()
+
+
+def export_zip(rows: int = 30) -> io.BytesIO:
+    """An export whose first two activities have files (one gzipped GPX, one TCX) and one file is corrupt."""
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        body = CSV_HEADER
+        for i in range(rows):
+            filename = {0: "activities/1.gpx.gz", 1: "activities/2.tcx", 2: "activities/3.gpx"}.get(i, "")
+            body += csv_row(i + 1, START + timedelta(days=i), 2_400 + i * 100, filename)
+        zf.writestr("export_123/activities.csv", body)
+        zf.writestr("export_123/activities/1.gpx.gz", gzip.compress(gpx(600)))
+        zf.writestr("export_123/activities/2.tcx", tcx(300, START + timedelta(days=1)))
+        zf.writestr("export_123/activities/3.gpx", b"<gpx><trk>")
+    archive.seek(0)
+    return archive
+
+
+@pytest.fixture
+async def athlete(db):
+    # mongomock can't run the rollup rebuild's $merge; maintain them incrementally
+    await sync_state.insert_one({"athlete_id": 1, "rollups_built": True, "records_built": True})
+
+
+def test_csv_repeated_headers_use_the_metric_columns():
+    rows = list(csv_activities(io.StringIO(CSV_HEADER + csv_row(7, START, 10_000, "activities/7.gpx"))))
+
+    assert len(rows) == 1
+    activity, filename = rows[0]
+    assert activity["id"] == 7
+    assert activity["distance"] == 10_000
+    assert activity["moving_time"] == 2_500
+    assert activity["start_date"] == "2024-05-04T07:30:00+00:00"
+    assert filename == "activities/7.gpx"
+
+
+def test_gpx_tracks_become_streams_with_a_distance_and_efforts():
+    streams, raw_bytes, efforts = parse_activity_file("1.gpx.gz", gzip.compress(gpx(600)))
+
+    assert set(streams) == {"time", "latlng", "altitude", "heartrate", "distance"}
+    distance = decode_stream(streams["distance"])
+    assert distance[-1] == pytest.approx(599 * 4, rel=1e-3)
+    assert decode_stream(streams["time"]).tolist() == list(range(600))
+    assert efforts["400m"] == pytest.approx(100, abs=1)
+    assert raw_bytes > 0
+
+
+def test_unreadable_or_unknown_files_are_skipped():
+    assert parse_activity_file("3.gpx", b"<gpx><trk>") is None
+    assert parse_activity_file("notes.txt", b"hello") is None
+    assert parse_activity_file("4.gpx", gpx(1)) is None
+
+
+async def test_export_is_imported_with_streams_and_sync_state(athlete):
+    progress = []
+    result = await StravaExportImporter(1, workers=1, progress=progress.append).run(export_zip())
+
+    assert {k: result[k] for k in ("activities", "inserted", "files_total", "streams", "skipped_files")} == {
+        "activities": 30, "inserted": 30, "files_total": 3, "streams": 2, "skipped_files": 1,
+    }
+    assert progress[-1]["phase"] == "done"
+    assert await cached_activities.count_documents({"athlete_id": 1}) == 30
+    assert {doc["strava_id"] async for doc in activity_streams.find({"athlete_id": 1})} == {1, 2}
+    state = await sync_state.find_one({"athlete_id": 1})
+    assert state["high_water_mark"] == START + timedelta(days=29)
+    records = await personal_records.find_one({"athlete_id": 1, "type": "Run"})
+    assert records["records"]["longest"]["strava_id"] == 30
+    assert "400m" in records["efforts"]
+
+    again = await StravaExportImporter(1, workers=1, streams=False).run(export_zip())
+    assert (again["inserted"], again["updated"]) == (0, 0)
+
+
+async def test_import_waits_for_the_athletes_sync_lease(athlete, monkeypatch):
+    monkeypatch.setattr(importer, "IMPORT_LEASE_POLL_SECONDS", 0.01)
+    holder = await acquire_lease(1)
+    beats = []
+
+    async def heartbeat():
+        beats.append(1)
+
+    running = asyncio.create_task(run_under_lease(StravaExportImporter(1, streams=False), export_zip(), heartbeat))
+    await asyncio.sleep(0.1)
+    assert not running.done()
+    assert await cached_activities.count_documents({}) == 0
+
+    await release_lease(1, holder)
+    result = await asyncio.wait_for(running, 5)
+
+    assert result["inserted"] == 30
+    assert beats
+    assert await acquire_lease(1) is not None
+
+
+async def test_interrupted_imports_are_failed_on_startup(db, tmp_path):
+    stale, fresh = tmp_path / "stale.zip", tmp_path / "fresh.zip"
+    stale.write_bytes(b"zip")
+    fresh.write_bytes(b"zip")
+    now = datetime.utcnow()
+    await import_jobs.insert_many([
+        {"_id": "stale", "athlete_id": 1, "status": "running", "path": str(stale), "heartbeat_at": now - timedelta(hours=1)},
+        {"_id": "fresh", "athlete_id": 1, "status": "running", "path": str(fresh), "heartbeat_at": now},
+        {"_id": "done", "athlete_id": 1, "status": "done", "path": None, "heartbeat_at": now - timedelta(hours=1)},
+    ])
+
+    assert await fail_stale_imports() == 1
+
+    statuses = {doc["_id"]: doc["status"] async for doc in import_jobs.find({})}
+    assert statuses == {"stale": "failed", "fresh": "running", "done": "done"}
+    assert not stale.exists() and fresh.exists()
+
+
+async def test_upload_endpoint_imports_in_the_background(api, seed):
+    await seed(1)
+    client = api(1)
+
+    resp = await client.post(
+        "/api/import/strava-export",
+        files={"file": ("export.zip", export_zip().getvalue(), "application/zip")},
+    )
+    assert resp.status_code == 202
+    job_id = resp.json()["job_id"]
+
+    for _ in range(200):
+        job = (await client.get(f"/api/import/{job_id}")).json()
+        if job["status"] != "running":
+            break
+        await asyncio.sleep(0.05)
+    assert job["status"] == "done", job
+    assert "path" not in job
+    assert (await api(2).get(f"/api/import/{job_id}")).status_code in (401, 404)
@@ -0,0 +1,95 @@
+from copy import deepcopy
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from app.database import personal_records, sync_state
+from app.records import activity_candidate, efforts_candidate, merge_candidate, stream_efforts
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+START = datetime(2025, 3, 3, 7)
+
+
+def activity(strava_id: int, distance: float, elevation: float = 50.0, days: int = 0, activity_type: str = "Run"):
+    return {
+        "athlete_id": 1, "strava_id": strava_id, "name": f"Activity {strava_id}", "type": activity_type,
+        "distance": distance, "moving_time": int(distance / 3), "elapsed_time": int(distance / 3),
+        "total_elevation_gain": elevation, "start_date": START + timedelta(days=days),
+        "average_speed": 3.0, "max_speed": 4.0, "cached_at": START,
+    }
+
+
+async def stored_records(activity_type: str = "Run"):
+    doc = await personal_records.find_one({"athlete_id": 1, "type": activity_type}) or {}
+    return {name: (entry["strava_id"], entry["value"]) for name, entry in (doc.get("records") or {}).items()}
+
+
+@pytest.fixture
+async def athlete(db):
+    await sync_state.insert_one({"athlete_id": 1, "rollups_built": True, "records_built": True})
+
+
+def test_better_values_take_the_record_and_ties_go_to_the_earlier_activity():
+    doc = {}
+    merge_candidate(doc, activity_candidate(activity(1, 10_000, days=5)))
+
+    changed, stale = merge_candidate(doc, activity_candidate(activity(2, 12_000, elevation=10, days=6)))
+    assert set(changed) == {"records.longest", "records.longest_time"} and not stale
+
+    merge_candidate(doc, activity_candidate(activity(3, 12_000, elevation=10, days=1)))
+    assert doc["records"]["longest"]["strava_id"] == 3
+    merge_candidate(doc, activity_candidate(activity(4, 12_000, elevation=10, days=9)))
+    assert doc["records"]["longest"]["strava_id"] == 3
+
+
+def test_holder_getting_worse_or_dropping_to_zero_goes_stale():
+    doc = {}
+    merge_candidate(doc, activity_candidate(activity(1, 10_000, elevation=200)))
+
+    assert merge_candidate(deepcopy(doc), activity_candidate(activity(1, 9_000, elevation=200)))[1]
+    assert merge_candidate(deepcopy(doc), activity_candidate(activity(1, 10_000, elevation=0)))[1]
+    # Only best efforts: says nothing about the summary records
+    assert not merge_candidate(deepcopy(doc), efforts_candidate(activity(1, 10_000), {"5k": 1500}))[1]
+    # A zero from another activity changes nothing
+    assert merge_candidate(deepcopy(doc), activity_candidate(activity(2, 5_000, elevation=0))) == ({}, False)
+
+
+def test_stream_efforts_interpolate_crossings_and_skip_nulls():
+    time = np.arange(2_000, dtype=np.float64)
+    distance = time * 4.0
+    time[100], distance[700] = np.nan, np.nan
+
+    efforts = stream_efforts(time, distance)
+
+    assert efforts["400m"] == 100.0
+    assert efforts["5k"] == 1250.0
+    assert "10k" not in efforts
+
+
+async def test_stored_activities_update_the_records(athlete):
+    await repository.store_activities(1, [activity(1, 10_000, 100), activity(2, 15_000, 20, days=1), activity(3, 30_000, activity_type="Ride")])
+
+    assert await stored_records() == {"longest": (2, 15_000), "longest_time": (2, 5_000), "biggest_climb": (1, 100)}
+    assert (await stored_records("Ride"))["longest"] == (3, 30_000)
+
+
+async def test_record_holder_edited_down_to_zero_hands_the_record_on(athlete):
+    docs = [activity(1, 10_000, 100), activity(2, 15_000, 20, days=1)]
+    await repository.store_activities(1, docs)
+
+    await repository.store_activities(1, [{**docs[0], "total_elevation_gain": 0}])
+
+    assert (await stored_records())["biggest_climb"] == (2, 20)
+
+
+async def test_deleted_or_retyped_holder_hands_the_record_on(athlete):
+    docs = [activity(1, 10_000), activity(2, 15_000, days=1), activity(3, 12_000, days=2)]
+    await repository.store_activities(1, docs)
+
+    await repository.remove_activity(1, 2)
+    assert (await stored_records())["longest"] == (3, 12_000)
+
+    await repository.store_activities(1, [{**docs[2], "type": "Walk"}])
+    assert (await stored_records())["longest"] == (1, 10_000)
+    assert (await stored_records("Walk"))["longest"] == (3, 12_000)
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+from app.aggregations import weekly_activity_pipeline, whole_weeks
+from app.database import cached_activities, daily_rollups, weekly_rollups
+from app.rollups import day_period, read_weekly_rollups, rollup_deltas, week_period
+from app.storage import repository
+
+pytestmark = pytest.mark.anyio
+
+
+async def pipeline_weeks(athlete_id: int, start=None, end=None):
+    """
+    weekly_activity_pipeline's totals. mongomock has no $isoWeekYear, so only
+    its $match stage runs there and the grouping is redone here.
+    """
+    match = weekly_activity_pipeline(athlete_id, "km", start, end)[0]
+    weeks = {}
+    async for doc in cached_activities.find(match["$match"]):
+        period = week_period(doc["start_date"])
+        week = weeks.setdefault(period["period"], {
+            "week": period["period"], "weekNumber": period["weekNumber"], "year": period["year"], "activities": {},
+        })
+        totals = week["activities"].setdefault(doc["type"], {"distance": 0, "moving_time": 0, "count": 0})
+        totals["distance"] += doc["distance"] / 1000
+        totals["moving_time"] += doc["moving_time"]
+        totals["count"] += 1
+    return [weeks[key] for key in sorted(weeks, key=lambda key: (weeks[key]["year"], weeks[key]["weekNumber"]))]
+
+
+def rounded(weeks):
+    return [
+        {**week, "activities": {t: {k: round(v, 6) for k, v in totals.items()} for t, totals in week["activities"].items()}}
+        for week in weeks
+    ]
+
+
+def test_whole_weeks():
+    wednesday, next_tuesday = datetime(2025, 3, 5, 15), datetime(2025, 3, 11)
+    monday = datetime(2025, 3, 17)
+
+    assert whole_weeks(wednesday, next_tuesday) == (datetime(2025, 3, 3), datetime(2025, 3, 17))
+    assert whole_weeks(None, monday) == (None, monday)
+    assert whole_weeks(None, None) == (None, None)
+
+
+async def test_rollups_and_pipeline_agree_on_a_range_starting_mid_week(seed):
+    docs = await seed(1)
+    middle = sorted(doc["start_date"] for doc in docs)[len(docs) // 2]
+    # A Thursday afternoon to the Wednesday after next
+    start = middle.replace(hour=15, minute=0, second=0, microsecond=0) + timedelta(days=(3 - middle.weekday()) % 7)
+    end = start.replace(hour=0) + timedelta(days=13)
+
+    rollups = await read_weekly_rollups(1, "km", start, end)
+
+    assert len(rollups) == 3
+    assert rounded(rollups) == rounded(await pipeline_weeks(1, start, end))
+
+
+async def test_weekly_endpoint_returns_whole_weeks(api, seed):
+    docs = await seed(1)
+    middle = sorted(doc["start_date"] for doc in docs)[len(docs) // 2].date()
+    wednesday = middle + timedelta(days=(2 - middle.weekday()) % 7)
+    to_date = wednesday + timedelta(days=13)
+
+    weeks = (await api(1).get("/api/activities/weekly", params={"from": wednesday.isoformat(), "to": to_date.isoformat()})).json()
+
+    assert len(weeks) == 3
+    expected = await pipeline_weeks(1, datetime.combine(wednesday, datetime.min.time()), datetime.combine(to_date + timedelta(days=1), datetime.min.time()))
+    assert rounded(weeks) == rounded(expected)
+
+
+async def pipeline_days(athlete_id: int):
+    days = {}
+    async for doc in cached_activities.find({"athlete_id": athlete_id}):
+        totals = days.setdefault((day_period(doc["start_date"])["period"], doc["type"]), {"distance": 0, "count": 0})
+        totals["distance"] += doc["distance"]
+        totals["count"] += 1
+    return days
+
+
+async def stored_days(athlete_id: int):
+    return {
+        (rollup["period"], rollup["type"]): {"distance": rollup["distance"], "count": rollup["count"]}
+        async for rollup in daily_rollups.find({"athlete_id": athlete_id})
+    }
+
+
+async def test_rollups_follow_inserts_edits_moves_and_deletes(seed):
+    docs = await seed(1)
+    edits = [
+        {**docs[10], "distance": docs[10]["distance"] + 1234},
+        {**docs[20], "start_date": docs[20]["start_date"] + timedelta(days=10)},
+        {**docs[30], "type": "Hike" if docs[30]["type"] != "Hike" else "Run"},
+        {**docs[40], "strava_id": 1, "start_date": docs[40]["start_date"] + timedelta(hours=1)},
+    ]
+
+    await repository.store_activities(1, edits)
+    await repository.remove_activity(1, docs[50]["strava_id"])
+    # The last activity of its week and day, so both rollups go away
+    await repository.store_activities(1, [{**docs[60], "start_date": datetime(2001, 1, 3, 8)}])
+    await repository.remove_activity(1, docs[60]["strava_id"])
+
+    assert rounded(await read_weekly_rollups(1, "km")) == rounded(await pipeline_weeks(1))
+    stored, expected = await stored_days(1), await pipeline_days(1)
+    assert stored.keys() == expected.keys()
+    for key, totals in expected.items():
+        assert stored[key]["count"] == totals["count"]
+        assert stored[key]["distance"] == pytest.approx(totals["distance"])
+    assert await weekly_rollups.count_documents({"count": {"$lte": 0}}) == 0
+
+
+def test_unchanged_or_reordered_changes_cancel_out():
+    doc = {"athlete_id": 1, "type": "Run", "start_date": datetime(2025, 3, 5, 7), "distance": 5000, "moving_time": 1500, "total_elevation_gain": 10}
+    moved = {**doc, "start_date": datetime(2025, 3, 12, 7)}
+
+    assert all(not any(delta["inc"].values()) for delta in rollup_deltas([(doc, doc)]).values())
+    deltas = rollup_deltas([(doc, moved), (moved, doc)])
+    assert all(not any(delta["inc"].values()) for delta in deltas.values())
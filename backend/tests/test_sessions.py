@@ -0,0 +1,76 @@
+import pytest
+from app.sessions import sign_session, read_session, SESSION_COOKIE
+
+pytestmark = pytest.mark.anyio
+
+GOAL = {"week": 10, "type": "Run", "goal_type": "distance", "target": 20, "unit": "km"}
+
+
+def test_session_cookie_round_trip_and_tampering():
+    value = sign_session(42)
+    assert read_session(value) == 42
+
+    payload, signature = value.rsplit(".", 1)
+    forged = sign_session(43).rsplit(".", 1)[0]
+    assert read_session(f"{forged}.{signature}") is None
+    assert read_session(f"{payload}.{signature[:-2]}") is None
+    assert read_session("garbage") is None
+
+
+def test_expired_session_is_rejected():
+    assert read_session(sign_session(42, issued_at=1)) is None
+
+
+@pytest.mark.parametrize("path", ["/api/activities", "/api/activities/weekly", "/api/goals", "/api/goals/progress"])
+async def test_data_endpoints_need_a_session(api, seed, path):
+    await seed(1)
+
+    assert (await api().get(path)).status_code == 401
+    forged = api()
+    forged.cookies.set(SESSION_COOKIE, "e30." + sign_session(1).rsplit(".", 1)[1])
+    assert (await forged.get(path)).status_code == 401
+
+
+async def test_session_without_a_connected_account_is_rejected(api, db):
+    resp = await api(99).get("/api/activities")
+
+    assert resp.status_code == 401
+
+
+async def test_each_athlete_only_sees_their_own_activities(api, seed):
+    first = {doc["strava_id"] for doc in await seed(1)}
+    second = {doc["strava_id"] for doc in await seed(2)}
+
+    for athlete_id, expected in ((1, first), (2, second)):
+        resp = await api(athlete_id).get("/api/activities", params={"limit": 200})
+        ids = {a["id"] for a in resp.json()}
+        assert ids and ids <= expected
+
+
+async def test_goals_are_scoped_to_their_owner(api, seed):
+    await seed(1)
+    await seed(2)
+    owner, other = api(1), api(2)
+    goal = (await owner.post("/api/goals", json=GOAL)).json()
+
+    assert (await other.get("/api/goals")).json() == []
+    assert (await other.put(f"/api/goals/{goal['id']}", json={**GOAL, "target": 1})).status_code == 404
+    assert (await other.delete(f"/api/goals/{goal['id']}")).status_code == 404
+    batch = (await other.post("/api/goals/batch", json={"delete": [goal["id"]]})).json()
+    assert batch["counts"] == {"not_found": 1}
+
+    goals = (await owner.get("/api/goals")).json()
+    assert [(g["id"], g["target"], g["user_id"]) for g in goals] == [(goal["id"], 20, 1)]
+
+
+async def test_logout_ends_the_session(api, seed):
+    await seed(1)
+    client = api(1)
+    cookie = client.cookies[SESSION_COOKIE]
+
+    resp = await client.post("/auth/logout")
+
+    assert resp.status_code == 200
+    assert "Max-Age=0" in resp.headers["set-cookie"]
+    client.cookies.set(SESSION_COOKIE, cookie)
+    assert (await client.get("/api/activities")).status_code == 401
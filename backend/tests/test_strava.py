@@ -0,0 +1,162 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.ratelimit import RateLimitBudget, INTERACTIVE, BACKGROUND
+from app.strava import StravaUnavailable, StravaRateLimited, MAX_RETRIES, BREAKER_FAILURE_THRESHOLD
+from bench.fake_strava import create_app
+
+pytestmark = pytest.mark.anyio
+
+
+class FailingTransport(httpx.AsyncBaseTransport):
+    """Raises the given transport errors for the first requests, then hands requests to the fake server."""
+
+    def __init__(self, app, errors):
+        self.transport = httpx.ASGITransport(app=app)
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)("injected", request=request)
+        return await self.transport.handle_async_request(request)
+
+
+def failing(client, fake, errors) -> FailingTransport:
+    transport = FailingTransport(create_app(fake), errors)
+    client._client = httpx.AsyncClient(base_url="http://fake-strava", transport=transport)
+    return transport
+
+
+def token(fake, athlete_id: int = 1) -> str:
+    return fake.tokens(athlete_id)["access_token"]
+
+
+def half_open(client):
+    client.breaker.failures = BREAKER_FAILURE_THRESHOLD
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout
+    assert client.breaker.state == "half_open"
+
+
+async def test_get_takes_usage_from_rate_limit_headers(strava_client, fake_strava, budget):
+    resp = await strava_client.get("/athlete", token(fake_strava, 7))
+
+    assert resp.status_code == 200
+    assert resp.json()["id"] == 7
+    assert (budget.short_limit, budget.short_usage) == (fake_strava.short_limit, 1)
+
+
+async def test_get_retries_server_errors_then_gives_up(strava_client, fake_strava):
+    fake_strava.error_rate = 1.0
+
+    with pytest.raises(StravaUnavailable):
+        await strava_client.get("/athlete", token(fake_strava))
+
+    assert fake_strava.requests == MAX_RETRIES + 1
+    assert strava_client.breaker.failures == 1
+
+
+async def test_post_is_not_retried_after_a_server_error(strava_client, fake_strava):
+    fake_strava.error_rate = 1.0
+
+    with pytest.raises(StravaUnavailable):
+        await strava_client.exchange_token({"grant_type": "authorization_code", "code": "1"})
+
+    assert fake_strava.requests == 1
+
+
+async def test_get_retries_dropped_connections(strava_client, fake_strava):
+    transport = failing(strava_client, fake_strava, [httpx.ReadError, httpx.RemoteProtocolError])
+
+    resp = await strava_client.get("/athlete", token(fake_strava))
+
+    assert resp.status_code == 200
+    assert transport.calls == 3
+    assert strava_client.breaker.failures == 0
+
+
+async def test_post_is_retried_only_when_the_connection_never_opened(strava_client, fake_strava):
+    transport = failing(strava_client, fake_strava, [httpx.ConnectError])
+    tokens = await strava_client.exchange_token({"grant_type": "authorization_code", "code": "3"})
+    assert tokens["athlete"]["id"] == 3
+    assert transport.calls == 2
+
+    transport = failing(strava_client, fake_strava, [httpx.ReadError])
+    with pytest.raises(StravaUnavailable):
+        await strava_client.exchange_token({"grant_type": "authorization_code", "code": "3"})
+    assert transport.calls == 1
+
+
+async def test_breaker_opens_after_consecutive_failures(strava_client, fake_strava):
+    fake_strava.error_rate = 1.0
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        with pytest.raises(StravaUnavailable):
+            await strava_client.get("/athlete", token(fake_strava))
+    assert strava_client.breaker.state == "open"
+
+    requests = fake_strava.requests
+    with pytest.raises(StravaUnavailable, match="circuit breaker is open"):
+        await strava_client.get("/athlete", token(fake_strava))
+    assert fake_strava.requests == requests
+
+
+async def test_successful_trial_closes_the_breaker(strava_client, fake_strava):
+    half_open(strava_client)
+
+    resp = await strava_client.get("/athlete", token(fake_strava))
+
+    assert resp.status_code == 200
+    assert strava_client.breaker.state == "closed"
+
+
+async def test_trial_failing_on_a_transport_error_reopens_the_breaker(strava_client, fake_strava):
+    half_open(strava_client)
+    failing(strava_client, fake_strava, [httpx.ReadError] * (MAX_RETRIES + 1))
+
+    with pytest.raises(StravaUnavailable):
+        await strava_client.get("/athlete", token(fake_strava))
+
+    assert strava_client.breaker.state == "open"
+    assert not strava_client.breaker.trial_in_flight
+    # Once the reset timeout passes again the next call is the trial
+    half_open(strava_client)
+    resp = await strava_client.get("/athlete", token(fake_strava))
+    assert resp.status_code == 200
+
+
+async def test_cancelled_trial_releases_the_breaker(strava_client, fake_strava, budget):
+    half_open(strava_client)
+    # The trial waits for the budget, and is cancelled there
+    budget.mark_exhausted()
+    trial = asyncio.create_task(strava_client.get("/athlete", token(fake_strava)))
+    await asyncio.sleep(0.01)
+    assert strava_client.breaker.trial_in_flight
+
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    assert not strava_client.breaker.trial_in_flight
+    assert strava_client.breaker.allow()
+
+
+async def test_429_raises_rate_limited_without_tripping_the_breaker(strava_client, fake_strava, budget):
+    # Another process used up the window; this one's budget hasn't seen it yet
+    fake_strava.short_usage = fake_strava.short_limit
+
+    with pytest.raises(StravaRateLimited) as raised:
+        await strava_client.get("/athlete", token(fake_strava))
+
+    assert raised.value.retry_after > 0
+    assert strava_client.breaker.state == "closed"
+    assert budget.remaining()[0] <= 0
+
+
+def test_background_work_leaves_a_reserve_for_interactive_calls():
+    budget = RateLimitBudget()
+    budget.update({"X-RateLimit-Limit": "100,1000", "X-RateLimit-Usage": "85,85"})
+
+    assert budget.delay(INTERACTIVE) == 0
+    assert budget.delay(BACKGROUND) > 0
@@ -0,0 +1,94 @@
+import zlib
+import numpy as np
+import pytest
+from app.streams import STREAM_SCALES, encode_stream, decode_stream, downsample_streams, lttb_indices
+from bench.data import athlete_history
+from bench.fake_strava import activity_streams
+
+
+@pytest.fixture(scope="module")
+def strava_streams():
+    activity = max(athlete_history(1, 0.25), key=lambda a: a["moving_time"])
+    return {key: stream["data"] for key, stream in activity_streams(activity).items()}
+
+
+def test_every_stream_type_round_trips_within_its_resolution(strava_streams):
+    for key, values in strava_streams.items():
+        scale = STREAM_SCALES[key]
+        encoded = encode_stream(values, scale)
+        decoded = decode_stream(encoded)
+
+        assert decoded.shape == np.asarray(values).shape
+        np.testing.assert_allclose(decoded, values, rtol=0, atol=0.5 / scale + 1e-9)
+        assert "nulls" not in encoded
+        assert len(encoded["data"]) < len(np.asarray(values, dtype=np.float64).tobytes())
+
+
+def test_large_jumps_switch_to_64_bit_deltas():
+    encoded = encode_stream([0, 3_000_000_000, 0], 1)
+
+    assert encoded["dtype"] == "<i8"
+    assert decode_stream(encoded).tolist() == [0, 3_000_000_000, 0]
+
+
+def test_null_samples_come_back_as_nan():
+    values = [None, None, 120, 121, None, None, 130, None]
+
+    decoded = decode_stream(encode_stream(values, 1))
+
+    expected = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    np.testing.assert_array_equal(decoded, expected)
+
+
+def test_null_latlng_pairs_come_back_as_nan_rows():
+    values = [[45.1, 7.2], None, [45.2, 7.3], [None, None]]
+
+    decoded = decode_stream(encode_stream(values, STREAM_SCALES["latlng"]))
+
+    np.testing.assert_allclose(decoded[[0, 2]], [[45.1, 7.2], [45.2, 7.3]])
+    assert np.isnan(decoded[[1, 3]]).all()
+
+
+def test_all_null_stream():
+    assert np.isnan(decode_stream(encode_stream([None, None, None], 1))).all()
+
+
+def test_nulls_do_not_inflate_the_deltas():
+    watts = [250] * 1000
+    watts[500:510] = [None] * 10
+
+    encoded = encode_stream(watts, 1)
+
+    assert encoded["dtype"] == "<i4"
+    deltas = np.frombuffer(zlib.decompress(encoded["data"]), dtype=encoded["dtype"])
+    assert np.abs(deltas[1:]).max() == 0
+
+
+def test_lttb_keeps_the_ends_and_the_peak():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.sin(x / 500)
+    y[7_321] = 5
+
+    kept = lttb_indices(x, y, 200)
+
+    assert len(kept) == 200
+    assert kept[0] == 0 and kept[-1] == len(x) - 1
+    assert 7_321 in kept
+    assert (np.diff(kept) > 0).all()
+
+
+def test_downsampled_series_keep_nulls_as_nan():
+    heartrate = [140.0] * 1000
+    heartrate[400:450] = [None] * 50
+    doc = {
+        "strava_id": 1,
+        "length": 1000,
+        "streams": {"time": encode_stream(list(range(1000)), 1), "heartrate": encode_stream(heartrate, 1)},
+    }
+
+    result = downsample_streams(doc, ["heartrate"], 100)
+
+    series = result["series"]["heartrate"]
+    assert len(series["x"]) == len(series["y"]) == 100
+    assert np.isnan(series["y"]).any()
+    assert np.nanmax(series["y"]) == 140
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import pytest
+from app import sync
+from app.database import cached_activities, personal_records, weekly_rollups, daily_rollups
+from app.storage import repository
+from app.sync import sync_activities
+
+pytestmark = pytest.mark.anyio
+
+
+async def rollup_totals(collection):
+    totals = {"count": 0, "distance": 0.0}
+    async for rollup in collection.find({"athlete_id": 1}):
+        totals["count"] += rollup["count"]
+        totals["distance"] += rollup["distance"]
+    return totals
+
+
+async def test_retention_removes_old_activities_with_their_rollups_and_records(seed, strava_api, monkeypatch):
+    docs = await seed(1)
+    monkeypatch.setattr(sync, "ACTIVITY_RETENTION_DAYS", "120")
+    cutoff = datetime.utcnow() - timedelta(days=120)
+    kept = [doc for doc in docs if doc["start_date"] >= cutoff]
+    assert len(kept) < len(docs)
+
+    result = await sync_activities(await repository.get_account(1), full=True)
+
+    assert result["expired"] == len(docs) - len(kept)
+    assert await cached_activities.count_documents({"athlete_id": 1}) == len(kept)
+    expected = {"count": len(kept), "distance": sum(doc["distance"] for doc in kept)}
+    for collection in (weekly_rollups, daily_rollups):
+        totals = await rollup_totals(collection)
+        assert totals["count"] == expected["count"]
+        assert totals["distance"] == pytest.approx(expected["distance"])
+    kept_ids = {doc["strava_id"] for doc in kept}
+    async for doc in personal_records.find({"athlete_id": 1}):
+        assert {entry["strava_id"] for entry in doc["records"].values()} <= kept_ids
+
+
+async def test_without_retention_nothing_expires(seed, strava_api):
+    docs = await seed(1)
+
+    result = await sync_activities(await repository.get_account(1))
+
+    assert result["expired"] == 0
+    assert await cached_activities.count_documents({"athlete_id": 1}) == len(docs)
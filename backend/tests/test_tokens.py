@@ -0,0 +1,98 @@
+import asyncio
+import time
+import pytest
+from app import tokens
+from app.models import StravaAccount
+from app.storage import repository
+from app.tokens import TokenManager, REFRESH_AHEAD_SECONDS, refresh_expiring_tokens, token_manager
+from app.utils.encryption import encryption
+from bench.seed import bench_account
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def decrypts(monkeypatch):
+    """Counts Fernet decryptions."""
+    calls = []
+    decrypt = encryption.decrypt
+
+    def counting(value):
+        calls.append(value)
+        return decrypt(value)
+
+    monkeypatch.setattr(encryption, "decrypt", counting)
+    return calls
+
+
+async def stored_token(athlete_id: int) -> StravaAccount:
+    return StravaAccount(**await repository.get_account(athlete_id))
+
+
+async def test_cached_tokens_are_served_without_decrypting(db, decrypts):
+    account = bench_account(1)
+    await repository.save_account(1, account)
+    manager = TokenManager()
+
+    first = await manager.get_access_token(account)
+    for _ in range(5):
+        assert await manager.get_access_token(account) == first
+
+    assert len(decrypts) == 1
+
+
+async def test_cache_is_bounded(db):
+    manager = TokenManager(max_size=2)
+    for athlete_id in (1, 2, 3):
+        await manager.get_access_token(bench_account(athlete_id))
+
+    assert list(manager._tokens) == [2, 3]
+
+
+async def test_expired_token_is_refreshed_once_and_written_back(db, strava_api):
+    account = bench_account(1, token_ttl=-60)
+    await repository.save_account(1, account)
+    requests = strava_api.requests
+
+    access_tokens = await asyncio.gather(*(token_manager.get_access_token(account) for _ in range(10)))
+
+    assert len(set(access_tokens)) == 1
+    assert strava_api.requests == requests + 1
+    stored = await stored_token(1)
+    assert stored.get_access_token() == access_tokens[0]
+    assert stored.expires_at > time.time() + REFRESH_AHEAD_SECONDS
+
+
+async def test_token_about_to_expire_is_served_while_it_refreshes(db, strava_api):
+    account = bench_account(1, token_ttl=REFRESH_AHEAD_SECONDS // 2)
+    await repository.save_account(1, account)
+    old = StravaAccount(**account).get_access_token()
+
+    assert await token_manager.get_access_token(account) == old
+    await asyncio.gather(*token_manager._refreshing.values())
+
+    new = await token_manager.get_access_token(account)
+    assert new != old
+    assert (await stored_token(1)).get_access_token() == new
+
+
+async def test_refused_refresh_reports_the_status(db, strava_api):
+    account = bench_account(1, token_ttl=-60)
+    await repository.save_account(1, account)
+    strava_api.revoked.add(1)
+
+    with pytest.raises(tokens.TokenRefreshError) as refused:
+        await token_manager.get_access_token(account)
+
+    assert refused.value.status_code == 401
+
+
+async def test_expiring_tokens_are_refreshed_in_the_background(db, strava_api):
+    fresh = bench_account(2)
+    await repository.save_account(1, bench_account(1, token_ttl=60))
+    await repository.save_account(2, fresh)
+
+    await refresh_expiring_tokens()
+
+    assert (await stored_token(1)).expires_at > time.time() + REFRESH_AHEAD_SECONDS
+    assert (await stored_token(2)).access_token == fresh["access_token"]
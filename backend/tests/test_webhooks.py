@@ -0,0 +1,107 @@
+import pytest
+import main
+from app import webhooks
+from app.database import sync_jobs
+from app.models import SyncJob
+from app.ratelimit import WEBHOOK
+from app.storage import repository
+from app.tokens import token_manager
+from app.webhooks import apply_event_job
+from bench.seed import bench_account
+
+pytestmark = pytest.mark.anyio
+
+SUBSCRIPTION_ID = 7
+
+
+def event(owner_id: int = 1, object_id: int = 10_000_000, **fields):
+    return {
+        "object_type": "activity", "object_id": object_id, "aspect_type": "create", "owner_id": owner_id,
+        "subscription_id": SUBSCRIPTION_ID, "event_time": 1_700_000_000, "updates": {}, **fields,
+    }
+
+
+def deauthorize_event(owner_id: int = 1):
+    return event(owner_id, owner_id, object_type="athlete", aspect_type="update", updates={"authorized": "false"})
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(main, "STRAVA_WEBHOOK_VERIFY_TOKEN", "verify-me")
+    monkeypatch.setattr(main, "WEBHOOKS_ENABLED", True)
+    monkeypatch.setattr(webhooks, "WEBHOOKS_ENABLED", True)
+    monkeypatch.setattr(webhooks, "STRAVA_WEBHOOK_SUBSCRIPTION_ID", str(SUBSCRIPTION_ID))
+
+
+async def test_handshake_echoes_the_challenge_for_the_verify_token(api, enabled):
+    params = {"hub.mode": "subscribe", "hub.challenge": "abc", "hub.verify_token": "verify-me"}
+
+    resp = await api().get("/webhooks/strava", params=params)
+    assert resp.json() == {"hub.challenge": "abc"}
+
+    resp = await api().get("/webhooks/strava", params={**params, "hub.verify_token": "guess"})
+    assert resp.status_code == 403
+
+
+async def test_events_are_rejected_while_webhooks_are_disabled(api, seed):
+    await seed(1)
+
+    resp = await api().post("/webhooks/strava", json=deauthorize_event())
+
+    assert resp.status_code == 404
+    assert await sync_jobs.count_documents({}) == 0
+
+
+async def test_events_from_another_subscription_are_dropped(api, seed, enabled):
+    await seed(1)
+
+    resp = await api().post("/webhooks/strava", json={**deauthorize_event(), "subscription_id": SUBSCRIPTION_ID + 1})
+
+    assert resp.status_code == 200
+    assert await sync_jobs.count_documents({}) == 0
+
+
+async def test_events_collapse_into_one_queued_job(api, db, enabled):
+    for aspect in ("create", "update", "delete"):
+        assert (await api().post("/webhooks/strava", json=event(aspect_type=aspect))).status_code == 200
+
+    jobs = await sync_jobs.find({}).to_list(length=None)
+    assert [(job["kind"], job["strava_id"], job["aspect"]) for job in jobs] == [("activity", 10_000_000, "delete")]
+
+
+async def test_delete_event_for_an_activity_still_on_strava_keeps_it(seed, strava_api):
+    docs = await seed(1)
+    account = await repository.get_account(1)
+    job = SyncJob(athlete_id=1, priority=WEBHOOK, kind="activity", strava_id=docs[0]["strava_id"], aspect="delete")
+
+    result = await apply_event_job(job, account)
+
+    assert "removed" not in result
+    page, _ = await repository.activity_page(1, "km", limit=1000)
+    assert docs[0]["strava_id"] in {a["id"] for a in page}
+
+    strava_api.deleted.add(docs[0]["strava_id"])
+    assert (await apply_event_job(job, account))["removed"]
+
+
+async def test_deauthorize_event_needs_strava_to_refuse_the_token(seed, strava_api):
+    await seed(1)
+    job = SyncJob(athlete_id=1, priority=WEBHOOK, kind="deauthorize")
+
+    assert not (await apply_event_job(job, await repository.get_account(1)))["deauthorized"]
+    assert await repository.get_account(1) is not None
+
+    strava_api.revoked.add(1)
+    assert (await apply_event_job(job, await repository.get_account(1)))["deauthorized"]
+    assert await repository.get_account(1) is None
+
+
+async def test_deauthorize_with_an_expired_token_is_confirmed_by_the_refresh(seed, strava_api):
+    await seed(1)
+    await repository.save_account(1, bench_account(1, token_ttl=-60))
+    token_manager.forget(1)
+    strava_api.revoked.add(1)
+    job = SyncJob(athlete_id=1, priority=WEBHOOK, kind="deauthorize")
+
+    assert (await apply_event_job(job, await repository.get_account(1)))["deauthorized"]
+    assert await repository.get_account(1) is None
@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+from app import worker
+from app.database import sync_jobs, sync_leases
+from app.leases import acquire_lease, WORKER_ID
+from app.ratelimit import INTERACTIVE
+from app.scheduler import scheduler
+from app.worker import SyncWorkerPool
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def job(seed):
+    await seed(1)
+    await scheduler.enqueue(1, INTERACTIVE)
+    return await scheduler.claim(WORKER_ID)
+
+
+def fake_sync(monkeypatch, seconds: float = 0.0, error: Exception = None):
+    """Replace the sync a job runs; returns the list of runs, each marking whether it finished."""
+    runs = []
+
+    async def sync_activities(account, full=False):
+        run = {"finished": False}
+        runs.append(run)
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+        run["finished"] = True
+        return {"athlete_id": account["athlete_id"], "inserted": 0, "updated": 0}
+
+    monkeypatch.setattr(worker, "sync_activities", sync_activities)
+    return runs
+
+
+async def test_finished_job_is_completed_and_releases_the_lease(job, monkeypatch):
+    runs = fake_sync(monkeypatch)
+
+    await SyncWorkerPool(warm=False).run_job(job)
+
+    assert runs == [{"finished": True}]
+    assert (await sync_jobs.find_one({"_id": job.id}))["status"] == "done"
+    assert await acquire_lease(1) is not None
+
+
+async def test_failed_job_is_retried_with_backoff(job, monkeypatch):
+    fake_sync(monkeypatch, error=RuntimeError("boom"))
+
+    await SyncWorkerPool(warm=False).run_job(job)
+
+    doc = await sync_jobs.find_one({"_id": job.id})
+    assert (doc["status"], doc["attempts"], doc["worker"]) == ("queued", 1, None)
+    assert "boom" in doc["error"]
+
+
+async def test_job_for_a_held_athlete_is_requeued_without_an_attempt(job, monkeypatch):
+    runs = fake_sync(monkeypatch)
+    assert await acquire_lease(1) is not None
+
+    await SyncWorkerPool(warm=False).run_job(job)
+
+    doc = await sync_jobs.find_one({"_id": job.id})
+    assert runs == []
+    assert (doc["status"], doc["attempts"]) == ("queued", 0)
+
+
+@pytest.mark.parametrize("taken", ["job", "lease"])
+async def test_taken_over_job_is_cancelled_and_left_to_its_new_owner(job, monkeypatch, taken):
+    monkeypatch.setattr(worker, "HEARTBEAT_SECONDS", 0.01)
+    runs = fake_sync(monkeypatch, seconds=5)
+    pool = SyncWorkerPool(warm=False)
+    running = asyncio.create_task(pool.run_job(job))
+    await asyncio.sleep(0.05)
+
+    # Another worker claims the job, or the athlete lease, after this one stalled
+    if taken == "job":
+        await sync_jobs.update_one({"_id": job.id}, {"$set": {"worker": "other-worker"}})
+    else:
+        await sync_leases.update_one({"_id": 1}, {"$set": {"holder": "other-worker"}})
+    await asyncio.wait_for(running, 1)
+
+    assert runs == [{"finished": False}]
+    doc = await sync_jobs.find_one({"_id": job.id})
+    assert doc["status"] == "running"
+    assert doc["finished_at"] is None
+
+
+async def test_worker_loop_survives_a_job_that_raises(db, monkeypatch):
+    calls = []
+    pool = SyncWorkerPool(concurrency=1, warm=False)
+
+    async def claim(worker_id):
+        calls.append(worker_id)
+        if len(calls) == 3:
+            pool._stopping.set()
+        return await scheduler.enqueue(len(calls), INTERACTIVE)
+
+    async def run_job(job):
+        raise RuntimeError("queue unreachable")
+
+    monkeypatch.setattr(scheduler, "claim", claim)
+    monkeypatch.setattr(pool, "run_job", run_job)
+
+    await asyncio.wait_for(pool._worker_loop(), 1)
+
+    assert len(calls) == 3
@@ -58,7 +58,7 @@ function App() {
       setRefreshing(true);
       const response = await fetch(
         `${API_BASE_URL}/api/activities?unit=${useMiles ? 'mi' : 'km'}`,
-        { method: forceRefresh ? 'POST' : 'GET' }
+        { method: forceRefresh ? 'POST' : 'GET', credentials: 'include' }
       );
       if (!response.ok) {
         throw new Error('Failed to fetch workouts');
@@ -75,7 +75,9 @@ function App() {
   useEffect(() => {
     const checkConnection = async () => {
       try {
-        const response = await fetch(`${API_BASE_URL}/api/activities?unit=${useMiles ? 'mi' : 'km'}`);
+        const response = await fetch(`${API_BASE_URL}/api/activities?unit=${useMiles ? 'mi' : 'km'}`, {
+          credentials: 'include',
+        });
         if (response.ok) {
           setIsConnected(true);
           const data = await response.json();
@@ -99,6 +101,7 @@ function App() {
     try {
       const response = await fetch(`${API_BASE_URL}/auth/logout`, {
         method: 'POST',
+        credentials: 'include',
       });
       if (response.ok) {
         setIsConnected(false);
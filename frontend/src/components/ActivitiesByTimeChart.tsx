@@ -102,7 +102,9 @@ export function ActivitiesByTimeChart({ workouts, loading }: ActivitiesByTimeCha
   useEffect(() => {
     const fetchWeeklyData = async () => {
       try {
-        const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/activities/weekly`);
+        const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/activities/weekly`, {
+          credentials: 'include',
+        });
         if (response.ok) {
           const data = await response.json();
           setWeeklyData(data);
@@ -103,7 +103,9 @@ export function DistanceByTypeChart({ workouts, loading, unit }: DistanceByTypeC
   useEffect(() => {
     const fetchWeeklyData = async () => {
       try {
-        const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/activities/weekly?unit=${unit}`);
+        const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/activities/weekly?unit=${unit}`, {
+          credentials: 'include',
+        });
         if (response.ok) {
           const data = await response.json();
           setWeeklyData(data);
@@ -99,7 +99,9 @@ export function WeeklyGoals({ loading, unit, workouts }: WeeklyGoalsProps) {
 
   const fetchGoals = async () => {
     try {
-      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/goals?unit=${unit}`);
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/goals?unit=${unit}`, {
+        credentials: 'include',
+      });
       if (response.ok) {
         const data = await response.json();
         // Ensure week is a number and handle any potential date objects
@@ -169,6 +171,7 @@ export function WeeklyGoals({ loading, unit, workouts }: WeeklyGoalsProps) {
       for (const goal of existingGoals) {
         await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/goals/${goal.id}`, {
           method: 'DELETE',
+          credentials: 'include',
         });
       }
 
@@ -179,6 +182,7 @@ export function WeeklyGoals({ loading, unit, workouts }: WeeklyGoalsProps) {
           const goalUnit = goalData.goalType === 'distance' ? unit : goalData.unit;
           await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/goals`, {
             method: 'POST',
+            credentials: 'include',
             headers: {
               'Content-Type': 'application/json',
             },
@@ -269,6 +273,7 @@ export function WeeklyGoals({ loading, unit, workouts }: WeeklyGoalsProps) {
       for (const goal of weekGoals) {
         await fetch(`${import.meta.env.VITE_API_BASE_URL}/api/goals/${goal.id}`, {
           method: 'DELETE',
+          credentials: 'include',
         });
       }
       await fetchGoals();